@@ -46,7 +46,9 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'graphene_django',
     'crm',
-    'django_filters'
+    'django_filters',
+    'django_crontab',
+    'django_celery_beat',
 
 ]
 
@@ -58,6 +60,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'crm.db_router.PrimaryPinningMiddleware',
+    # Logs repeated SQL per GraphQL request; disables itself unless DEBUG
+    'crm.querybudget.DuplicateQueryLoggingMiddleware',
 ]
 
 ROOT_URLCONF = 'alx_backend_graphql_crm.urls'
@@ -88,6 +93,53 @@ DATABASES = {
 
 }
 
+# Read replicas: REPLICA_DATABASE_URLS="postgres://...,postgres://..."
+# become the aliases replica1, replica2, ...
+for _index, _url in enumerate(env.list('REPLICA_DATABASE_URLS', default=[]), start=1):
+    DATABASES[f'replica{_index}'] = env.db_url_config(_url)
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['crm.db_router.PrimaryReplicaRouter']
+
+# SQLite: every connection is tuned on creation (WAL, synchronous=NORMAL,
+# cache, mmap, busy timeout; SQLITE_PRAGMAS overrides crm.sqlite_tuning's
+# defaults, None drops one). A read-only alias on the same file serves
+# replica_reads(); write transactions take the write lock up front so a
+# read-then-write transaction waits on busy_timeout instead of failing.
+from crm.sqlite_tuning import READ_ALIAS, SQLITE_ENGINE, read_only_config  # noqa: E402
+
+SQLITE_PRAGMAS = {}
+SQLITE_READ_ONLY_ALIASES = []
+if DATABASES['default']['ENGINE'] == SQLITE_ENGINE:
+    DATABASES['default'].setdefault('OPTIONS', {}).setdefault('transaction_mode', 'IMMEDIATE')
+    if env.bool('SQLITE_READ_ALIAS', default=True):
+        DATABASES[READ_ALIAS] = read_only_config(DATABASES['default'])
+        DATABASE_REPLICAS.append(READ_ALIAS)
+        SQLITE_READ_ONLY_ALIASES.append(READ_ALIAS)
+
+# Connection reuse. PostgreSQL uses Django's psycopg pool (min 2 up to
+# DATABASE_POOL_SIZES[process type] connections per process, waiting at
+# most DATABASE_POOL_TIMEOUT seconds for one); SQLite keeps a persistent,
+# health-checked connection per thread for DATABASE_CONN_MAX_AGE seconds.
+# The process type is CRM_PROCESS_TYPE (web, worker, scheduler) or is
+# guessed from the command line.
+from crm.db_pool import configure_connections, detect_process_type  # noqa: E402
+
+CRM_PROCESS_TYPE = detect_process_type()
+DATABASE_POOL_SIZES = {'web': 10, 'worker': 4, 'scheduler': 2}
+DATABASE_POOL_TIMEOUT = env.int('DATABASE_POOL_TIMEOUT', default=10)
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', default=600)
+configure_connections(DATABASES, CRM_PROCESS_TYPE, DATABASE_POOL_SIZES, DATABASE_POOL_TIMEOUT, DATABASE_CONN_MAX_AGE)
+
+
+# Reads stay on the primary this long after a write (read-your-writes);
+# replicas lagging more than REPLICA_MAX_LAG_SECONDS are skipped, as
+# measured every REPLICA_CHECK_INTERVAL seconds against the heartbeat that
+# Celery beat writes every REPLICA_HEARTBEAT_INTERVAL seconds
+REPLICA_PIN_SECONDS = 5
+REPLICA_MAX_LAG_SECONDS = 10
+REPLICA_CHECK_INTERVAL = 2
+REPLICA_HEARTBEAT_INTERVAL = 2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,4 +185,164 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 GRAPHENE = {
     "SCHEMA": "alx_backend_graphql_crm.schema.schema",
     "ATOMIC_MUTATIONS": True,
-}
\ No newline at end of file
+    "MIDDLEWARE": [
+        "crm.resolver_timing.ResolverTimingMiddleware",
+        "crm.tracing.TracingMiddleware",
+    ],
+}
+
+# Cron and Celery jobs run GraphQL operations in-process ("local");
+# set to "http" to go through GRAPHQL_ENDPOINT instead
+GRAPHQL_CLIENT_MODE = env('GRAPHQL_CLIENT_MODE', default='local')
+
+# Share of /graphql/ requests whose resolvers are timed, how many schema
+# fields (Type.field) get their own histogram, and the header (staff or DEBUG only)
+# that asks for an Apollo-tracing breakdown in the response extensions
+RESOLVER_TIMING_SAMPLE_RATE = 0.1
+RESOLVER_TIMING_MAX_PATHS = 500
+RESOLVER_TIMING_HEADER = "X-GraphQL-Tracing"
+
+# Add {dbTimeMs, dbQueries, resolverTimeMs, serializeTimeMs} to every
+# /graphql/ response under extensions.timing (always logged to crm.requests)
+GRAPHQL_TIMING_EXTENSIONS = True
+
+# Tracing of GraphQL requests (parse/validate/execute, resolvers, SQL),
+# crm.tasks and crm.cron jobs, with W3C traceparent propagation into
+# Celery headers. Exporters: "file" (JSON lines to TRACING_FILE) and
+# "memory" (last spans in crm.tracing.memory_exporter); none disables it.
+TRACING_EXPORTERS = ["file"]
+TRACING_FILE = "/tmp/crm_traces.jsonl"
+TRACING_SAMPLE_RATE = 0.1
+
+# /metrics: distinct GraphQL operation names labelled per process before
+# the rest are reported as "<other>". For multi-worker servers set the
+# PROMETHEUS_MULTIPROC_DIR environment variable to a shared, empty directory.
+METRICS_MAX_OPERATIONS = 200
+
+# Per-fingerprint GraphQL operation stats: operations kept per process,
+# latency samples per operation, how often each web process adds them to
+# the OperationStat table (None: never), and the slow-operation log
+# threshold with the variables that are logged unredacted
+OPERATION_STATS_MAX_OPERATIONS = 1000
+OPERATION_STATS_SAMPLES = 500
+OPERATION_STATS_FLUSH_SECONDS = 300
+SLOW_OPERATION_MS = 500
+SLOW_OPERATION_SAFE_VARIABLES = ["first", "last", "offset", "orderBy"]
+
+# Single-request profiling: staff send PROFILE_HEADER: 1, other clients a
+# single-use token from `manage.py profiles token` (used tokens are
+# remembered in the PROFILE_TOKEN_CACHE cache). The newest
+# PROFILE_MAX_PROFILES profiles are kept in PROFILE_DIR (default:
+# BASE_DIR/profiles).
+PROFILE_HEADER = "X-GraphQL-Profile"
+PROFILE_MAX_PROFILES = 50
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_TOKEN_CACHE = 'shared'
+
+CRONJOBS = [
+    ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
+    ('0 */12 * * *', 'crm.cron.update_low_stock'),
+    ('0 2 * * 0', 'django.core.management.call_command', ['cleanup_inactive_customers']),
+    ('30 * * * *', 'crm.cron.optimize_sqlite'),
+    ('0 3 1 * *', 'django.core.management.call_command', ['archive_orders']),
+    ('*/5 * * * *', 'crm.cron.compact_stock'),
+]
+
+# Stock changes are appended to the StockMovement ledger and folded into
+# Product.stock by crm.cron.compact_stock.
+
+# Sales and order totals are sharded counters (crm.counters): each order
+# adds to a random one of COUNTER_SHARDS rows per counter, and reads sum
+# the shards, cached per process for COUNTER_CACHE_TTL seconds (at most
+# COUNTER_CACHE_SIZE counters, least recently read dropped first).
+COUNTER_SHARDS = 16
+COUNTER_CACHE_TTL = 5
+COUNTER_CACHE_SIZE = 10000
+
+# archive_orders keeps this many whole months of orders in crm_order
+# (besides the current one) and moves older ones to crm_order_archive
+ORDER_ARCHIVE_MONTHS = 12
+
+# /readyz components and how long their results are cached (seconds)
+HEALTH_CHECKS = ["database", "migrations", "broker"]
+HEALTH_CACHE_TTL = 5
+
+# `manage.py run_scheduler` runs CRONJOBS in one long-lived process
+SCHEDULER_JITTER_SECONDS = 5
+SCHEDULER_MAX_WORKERS = 4
+
+CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
+CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_TASK_SERIALIZER = "json"
+CELERY_RESULT_SERIALIZER = "json"
+CELERY_TIMEZONE = "UTC"
+
+# Order reminder fan-out: orders per send_reminder_batch task, and the
+# send rate per delivery channel, shared by every worker through the
+# REMINDER_RATE_CACHE cache
+REMINDER_BATCH_SIZE = 500
+REMINDER_RATE_LIMITS = {
+    "log": "1000/s",
+}
+REMINDER_RATE_CACHE = 'shared'
+
+# "shared" must be one cache for all processes (rate limits)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('SHARED_CACHE_URL', default='redis://localhost:6379/1'),
+    },
+}
+
+from celery.schedules import crontab
+CELERY_BEAT_SCHEDULE = {
+    'generate-crm-report': {
+        'task': 'crm.tasks.generate_crm_report',
+        'schedule': crontab(day_of_week='mon', hour=6, minute=0),
+    },
+    'replica-heartbeat': {
+        'task': 'crm.tasks.replica_heartbeat',
+        'schedule': REPLICA_HEARTBEAT_INTERVAL,
+        'options': {'expires': REPLICA_HEARTBEAT_INTERVAL},
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{levelname} {asctime} {module} - {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'crm_file': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': '/tmp/crm_log.txt',  
+            'formatter': 'verbose',
+        },
+        'console': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'crm': {
+            'handlers': ['crm_file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'django': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
+    },
+}
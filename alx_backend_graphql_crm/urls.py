@@ -16,10 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm import views as crm_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('healthz', crm_views.healthz, name='healthz'),
+    path('readyz', crm_views.readyz, name='readyz'),
+    path('metrics', crm_views.metrics_view, name='metrics'),
+    path('graphql/schema.graphql', crm_views.schema_sdl, name='graphql-schema-sdl'),
+    path('graphql/schema.json', crm_views.schema_introspection, name='graphql-schema-json'),
+    path('graphql/resolver-stats.json', crm_views.resolver_stats, name='graphql-resolver-stats'),
+    path('graphql/', csrf_exempt(crm_views.CRMGraphQLView.as_view(graphiql=True))),
 ]
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        # Connects the tracing signal handlers (SQL spans, Celery propagation)
+        from crm import tracing  # noqa: F401
+        # Connects the connection and pool metric handlers
+        from crm import metrics  # noqa: F401
+        # Connects the SQLite pragma handler
+        from crm import sqlite_tuning  # noqa: F401
+        # Connects the order counter handlers
+        from crm import counters  # noqa: F401
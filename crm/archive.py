@@ -0,0 +1,88 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from crm.models import ArchivedOrder, Order
+
+DEFAULT_MONTHS = 12
+DEFAULT_BATCH_SIZE = 1000
+ARCHIVE_TABLE = "crm_order_archive"
+
+
+def month_start(moment):
+    """First instant of `moment`'s month, in UTC (partition bounds are UTC months)."""
+    moment = moment.astimezone(dt_timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment, months):
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1)
+
+
+def cutoff(months, now=None):
+    """Orders before this instant are archived: whole UTC months, `months` back from the current one."""
+    return add_months(month_start(now or timezone.now()), -months)
+
+
+def partition_name(month):
+    return f"{ARCHIVE_TABLE}_p{month:%Y%m}"
+
+
+def ensure_partitions(months, using=None):
+    """
+    Create the monthly archive partitions for `months` (month starts);
+    PostgreSQL only, where the archive is partitioned by order_date (see
+    migration 0007). Each must exist before rows are moved in: a month
+    whose rows already sit in the default partition can't be attached.
+    """
+    using = using or connection
+    if using.vendor != "postgresql":
+        return
+    with using.cursor() as cursor:
+        for month in sorted(set(months)):
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {ARCHIVE_TABLE} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+
+
+def archive_batch(before, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move up to `batch_size` of the oldest orders placed before `before`
+    into the archive, in one transaction. Deleting the orders also deletes
+    their product rows and reminders. Returns the number moved.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(order_date__lt=before)
+            .order_by("pk")
+            .select_for_update(skip_locked=True)
+            .values("pk", "customer_id", "order_date", "total_amount")[:batch_size]
+        )
+        if not orders:
+            return 0
+        ids = [order["pk"] for order in orders]
+        products = defaultdict(list)
+        for order_id, product_id in (
+            Order.products.through.objects.filter(order_id__in=ids)
+            .order_by("pk").values_list("order_id", "product_id")
+        ):
+            products[order_id].append(product_id)
+
+        ensure_partitions(month_start(order["order_date"]) for order in orders)
+        now = timezone.now()
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order["pk"],
+                customer_id=order["customer_id"],
+                order_date=order["order_date"],
+                total_amount=order["total_amount"],
+                product_ids=products[order["pk"]],
+                archived_at=now,
+            )
+            for order in orders
+        ])
+        Order.objects.filter(pk__in=ids).delete()
+    return len(orders)
@@ -0,0 +1,102 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from django.db import connections
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from crm.db_router import replica_reads
+from crm.models import OrderHistory
+from crm.reports import CENTS
+
+TRUNCATE = {
+    "month": TruncMonth,
+    "week": TruncWeek,
+}
+
+
+def split_range(low, high, parts):
+    """Split the closed range [low, high] into at most `parts` contiguous [lo, hi) pieces."""
+    if low is None or high is None:
+        return []
+    if low == high:
+        return [(low, None)]
+    span = (high - low) / parts
+    bounds = [low + span * i for i in range(parts)] + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def partitions(by="id", parts=4):
+    """
+    Partition live and archived orders into `parts` ranges of primary key ("id") or
+    order_date ("date"); the last range is open-ended.
+    """
+    field = "pk" if by == "id" else "order_date"
+    bounds = OrderHistory.objects.aggregate(low=Min(field), high=Max(field))
+    if by == "id" and bounds["low"] is not None:
+        span = max(1, -(-(bounds["high"] - bounds["low"] + 1) // parts))
+        return [
+            (lo, lo + span if lo + span <= bounds["high"] else None)
+            for lo in range(bounds["low"], bounds["high"] + 1, span)
+        ]
+    return split_range(bounds["low"], bounds["high"], parts)
+
+
+def aggregate_partition(by, low, high, period="month"):
+    """Orders and revenue per period for one partition (runs in a worker)."""
+    field = "pk" if by == "id" else "order_date"
+    orders = OrderHistory.objects.filter(**{f"{field}__gte": low})
+    if high is not None:
+        orders = orders.filter(**{f"{field}__lt": high})
+    rows = (
+        orders.annotate(period=TRUNCATE[period]("order_date"))
+        .values("period")
+        .annotate(orders=Count("id"), revenue=Sum("total_amount"))
+        .order_by()
+    )
+    with replica_reads():
+        # SQLite sums decimals as floats: round each partial back to cents
+        return [(row["period"], row["orders"], (row["revenue"] or Decimal("0")).quantize(CENTS)) for row in rows]
+
+
+def merge(partials):
+    """Sum partial per-period aggregates; returns [(period, orders, revenue)] sorted by period."""
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for partial in partials:
+        for period, orders, revenue in partial:
+            totals[period][0] += orders
+            totals[period][1] += Decimal(revenue).quantize(CENTS)
+    return [(period, orders, revenue) for period, (orders, revenue) in sorted(totals.items())]
+
+
+def init_worker(settings_module):
+    # Each worker process opens its own database connection; under the
+    # spawn start method it also needs Django set up from scratch.
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
+    connections.close_all()
+
+
+def _run_partition(args):
+    return aggregate_partition(*args)
+
+
+def run(by="id", parts=None, workers=1, period="month"):
+    """
+    Aggregate orders per `period` over all partitions, using `workers`
+    processes. With one worker everything runs in this process.
+    """
+    parts = parts or max(workers, 1)
+    jobs = [(by, low, high, period) for low, high in partitions(by, parts)]
+    if workers <= 1 or len(jobs) <= 1:
+        return merge(_run_partition(job) for job in jobs)
+
+    # Never share the parent's connection with forked children
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE"),),
+    ) as pool:
+        return merge(pool.map(_run_partition, jobs))
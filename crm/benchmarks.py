@@ -0,0 +1,428 @@
+import copy
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from io import StringIO
+from django.core.management import call_command
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.db.utils import load_backend
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import override_settings
+from crm import counters, inventory
+from crm.models import Customer, Order, Product
+from crm.sql_observers import capture_queries
+from crm.sqlite_tuning import SQLITE_DEFAULTS
+from crm.stats import percentile
+
+SIZES = {
+    "small": {"customers": 100, "products": 20, "orders": 1000},
+    "medium": {"customers": 1000, "products": 100, "orders": 10000},
+    "large": {"customers": 10000, "products": 500, "orders": 100000},
+}
+
+ENDPOINT = "/graphql/"
+RESTOCK = 100000
+
+
+class Operation:
+    """A GraphQL operation to time; `variables()` runs untimed before each call."""
+
+    name = None
+    query = None
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def variables(self):
+        return {}
+
+
+class AllOrdersFiltered(Operation):
+    name = "allOrders_filtered"
+    query = """
+    query ($min: Decimal) {
+        allOrders(first: 50, totalAmount_Gte: $min, orderBy: "-order_date") {
+            edges { node { id totalAmount orderDate customer { name email } } }
+        }
+    }
+    """
+
+    def variables(self):
+        return {"min": self.rng.randint(10, 500)}
+
+
+class AllOrdersDeepPage(Operation):
+    name = "allOrders_deep_page"
+    query = """
+    query ($offset: Int) {
+        allOrders(first: 50, offset: $offset) {
+            edges { node { id totalAmount } }
+        }
+    }
+    """
+
+    def variables(self):
+        return {"offset": max(0, int(Order.objects.count() * 0.9))}
+
+
+class BulkCreateCustomers(Operation):
+    name = "bulkCreateCustomers"
+    query = """
+    mutation ($input: [CustomerInput!]!) {
+        bulkCreateCustomers(input: $input) { customers { id } errors }
+    }
+    """
+
+    def variables(self):
+        start = (Customer.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+        return {"input": [
+            {"name": f"Bench {n}", "email": f"bench.{n}@example.com"} for n in range(start, start + 20)
+        ]}
+
+
+class CreateOrder(Operation):
+    name = "createOrder"
+    query = """
+    mutation ($customer: ID!, $products: [ID]!) {
+        createOrder(input: {customerId: $customer, productIds: $products}) { order { id totalAmount } }
+    }
+    """
+
+    def __init__(self, rng):
+        super().__init__(rng)
+        self.customers = list(Customer.objects.values_list("pk", flat=True)[:1000])
+        self.products = list(Product.objects.values_list("pk", flat=True))
+        # Orders reserve stock: keep every product orderable for the whole run
+        Product.objects.filter(stock__lt=RESTOCK).update(stock=RESTOCK)
+
+    def variables(self):
+        return {
+            "customer": str(self.rng.choice(self.customers)),
+            "products": [str(pk) for pk in self.rng.sample(self.products, k=min(3, len(self.products)))],
+        }
+
+
+class UpdateLowStockProducts(Operation):
+    name = "updateLowStockProducts"
+    query = """
+    mutation { updateLowStockProducts { success updatedProducts { id stock } } }
+    """
+
+    def variables(self):
+        products = list(Product.objects.values_list("pk", flat=True))
+        low = self.rng.sample(products, k=max(1, len(products) // 10))
+        Product.objects.filter(pk__in=low).update(stock=0)
+        return {}
+
+
+OPERATIONS = [AllOrdersFiltered, AllOrdersDeepPage, BulkCreateCustomers, CreateOrder, UpdateLowStockProducts]
+
+
+def _call(operation, client):
+    body = json.dumps({"query": operation.query, "variables": operation.variables()})
+    started = time.perf_counter()
+    response = client.post(ENDPOINT, body, content_type="application/json")
+    elapsed = (time.perf_counter() - started) * 1000
+    payload = response.json()
+    if response.status_code != 200 or payload.get("errors"):
+        raise RuntimeError(f"{operation.name} failed: {payload.get('errors') or response.status_code}")
+    return elapsed
+
+
+def time_operation(operation, iterations, client):
+    latencies, queries = [], []
+    for _ in range(iterations):
+        with capture_queries() as captured:
+            latencies.append(_call(operation, client))
+        queries.append(len(captured))
+
+    # Memory tracing slows Python down a lot, so it gets its own untimed call
+    tracemalloc.start()
+    try:
+        _call(operation, client)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "operation": operation.name,
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies), 3),
+        "queries": max(queries),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def run_size(label, counts, iterations=20, seed=0, operations=OPERATIONS):
+    """Seed `counts` rows into the current (empty) database and time every operation."""
+    call_command(
+        "seed_db",
+        "--customers", str(counts["customers"]),
+        "--products", str(counts["products"]),
+        "--orders", str(counts["orders"]),
+        "--seed", str(seed),
+        stdout=StringIO(),
+    )
+    rng = random.Random(seed)
+    client = Client()
+    results = []
+    for operation_class in operations:
+        result = time_operation(operation_class(rng), iterations, client)
+        result["size"] = label
+        result.update({f"rows_{k}": v for k, v in counts.items()})
+        results.append(result)
+    return results
+
+
+def _select_one(wrapper):
+    with wrapper.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def connection_setup(iterations=200, alias="default"):
+    """
+    Connection cost per unit of work (a request, task or cron run), each
+    being one SELECT 1. "unpooled" opens and closes a connection every
+    time, as CONN_MAX_AGE=0 without a pool does; "reused" brackets the
+    query with close_old_connections() like Django's request signals and
+    Celery do, so it measures the configured pool or persistent connection.
+    """
+    settings_dict = copy.deepcopy(connections[alias].settings_dict)
+    settings_dict["OPTIONS"].pop("pool", None)
+    settings_dict["CONN_MAX_AGE"] = 0
+    backend = load_backend(settings_dict["ENGINE"])
+
+    def fresh():
+        unpooled = backend.DatabaseWrapper(settings_dict, alias)
+        _select_one(unpooled)
+        # Directly: Django's close() keeps in-memory SQLite databases open
+        unpooled.connection.close()
+
+    def reused():
+        close_old_connections()
+        _select_one(connections[alias])
+        close_old_connections()
+
+    results = []
+    for mode, unit in (("unpooled", fresh), ("reused", reused)):
+        unit()  # warm-up: the reused connection is opened here
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            unit()
+            latencies.append((time.perf_counter() - started) * 1000)
+        results.append({
+            "operation": f"connection_{mode}",
+            "size": "connections",
+            "iterations": iterations,
+            "mean_ms": round(statistics.fmean(latencies), 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(max(latencies), 3),
+            "queries": 1,
+        })
+    return results
+
+
+def _mixed_load(operations, requests, latencies, errors):
+    client = Client()
+    try:
+        for n in range(requests):
+            try:
+                latencies.append(_call(operations[n % len(operations)], client))
+            except RuntimeError:
+                errors.append(n)
+    finally:
+        connection.close()
+
+
+def concurrent_orders(threads=4, requests=50, seed=0):
+    """
+    createOrder and allOrders_filtered alternating in `threads` threads at
+    once, `requests` each, against the seeded database. On SQLite it runs
+    twice: with SQLite's own defaults (rollback journal, synchronous=FULL)
+    and with the configured pragmas. Failed requests ("database is
+    locked") are counted, not raised.
+    """
+    if connection.vendor == "sqlite":
+        modes = [("sqlite_defaults", {"SQLITE_PRAGMAS": SQLITE_DEFAULTS}), ("tuned", {})]
+    else:
+        modes = [("configured", {})]
+    results = []
+    for mode, overrides in modes:
+        with override_settings(**overrides):
+            # New connections pick up the pragmas; the journal mode sticks to the file
+            connections.close_all()
+            connection.ensure_connection()
+            latencies, errors = [], []
+            workers = [
+                threading.Thread(target=_mixed_load, args=(
+                    [CreateOrder(random.Random(seed + n)), AllOrdersFiltered(random.Random(seed + n))],
+                    requests, latencies, errors,
+                ))
+                for n in range(threads)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+        connections.close_all()
+        results.append({
+            "operation": f"createOrder+allOrders_{mode}",
+            "size": "concurrent",
+            "threads": threads,
+            "iterations": threads * requests,
+            "errors": len(errors),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+            "queries": None,
+        })
+    return results
+
+
+def _order_hot_product(query, variables, orders, outcomes):
+    client = Client()
+    body = json.dumps({"query": query, "variables": variables})
+    try:
+        for _ in range(orders):
+            started = time.perf_counter()
+            payload = client.post(ENDPOINT, body, content_type="application/json").json()
+            elapsed = (time.perf_counter() - started) * 1000
+            errors = payload.get("errors") or []
+            if not errors:
+                outcomes.append(("ok", elapsed))
+            elif errors[0].get("extensions", {}).get("code") == "OUT_OF_STOCK":
+                outcomes.append(("out_of_stock", elapsed))
+            else:
+                outcomes.append(("error", elapsed))
+    finally:
+        connection.close()
+
+
+def hot_product_orders(threads=8, orders=25):
+    """
+    `threads` clients ordering the same product at once, `orders` each,
+    with stock for only half of them. Every order either reserves a unit
+    or fails as out of stock; `oversold` counts units sold beyond the
+    stock (must be 0) and `errors` any other failure (lock timeouts).
+    """
+    stock = threads * orders // 2
+    product = Product.objects.create(name="Hot product", price=1, stock=stock)
+    customer = Customer.objects.create(name="Hot buyer", email=f"hot.buyer.{product.pk}@example.com")
+    variables = {"customer": str(customer.pk), "products": [str(product.pk)]}
+    outcomes = []
+    workers = [
+        threading.Thread(target=_order_hot_product, args=(CreateOrder.query, variables, orders, outcomes))
+        for _ in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    left = inventory.current_stock([product.pk])[product.pk]
+    sold = sum(1 for outcome, _ in outcomes if outcome == "ok")
+    latencies = [ms for _, ms in outcomes]
+    return {
+        "operation": "createOrder_hot_product",
+        "size": "concurrent",
+        "threads": threads,
+        "iterations": len(outcomes),
+        "stock": stock,
+        "sold": sold,
+        "out_of_stock": sum(1 for outcome, _ in outcomes if outcome == "out_of_stock"),
+        "errors": sum(1 for outcome, _ in outcomes if outcome == "error"),
+        "oversold": max(0, sold - stock) + max(0, -left),
+        "throughput_rps": round(len(outcomes) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "queries": None,
+    }
+
+
+def _increment_counter(name, shards, increments, latencies, errors):
+    try:
+        for n in range(increments):
+            started = time.perf_counter()
+            try:
+                # Inside a transaction like createOrder's, which holds the
+                # shard's row lock until commit
+                with transaction.atomic():
+                    counters.increment({name: (1, 1)}, shards=shards)
+                latencies.append((time.perf_counter() - started) * 1000)
+            except DatabaseError:
+                errors.append(n)
+    finally:
+        connection.close()
+
+
+def counter_throughput(threads=8, increments=50):
+    """
+    `threads` clients incrementing one counter at once, `increments`
+    each: a single row (what a plain aggregate column amounts to) against
+    COUNTER_SHARDS shards. `lost` counts increments that succeeded but are
+    missing from the total (must be 0).
+    """
+    results = []
+    for mode, shards in [("single_row", 1), ("sharded", counters.get_shards())]:
+        name = f"benchmark:{mode}"
+        latencies, errors = [], []
+        workers = [
+            threading.Thread(target=_increment_counter, args=(name, shards, increments, latencies, errors))
+            for _ in range(threads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        count, _ = counters.read(name, cached=False)
+        results.append({
+            "operation": f"counter_increment_{mode}",
+            "size": "concurrent",
+            "threads": threads,
+            "shards": shards,
+            "iterations": threads * increments,
+            "errors": len(errors),
+            "lost": len(latencies) - count,
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+            "queries": None,
+        })
+    return results
+
+
+def compare(current, baseline):
+    """Pair up results by (size, operation); returns rows with p50/p95 and query ratios."""
+    previous = {(r["size"], r["operation"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get((result["size"], result["operation"]))
+        if before is None:
+            continue
+        rows.append({
+            "size": result["size"],
+            "operation": result["operation"],
+            "p50_ratio": round(result["p50_ms"] / before["p50_ms"], 2) if before["p50_ms"] else None,
+            "p95_ratio": round(result["p95_ms"] / before["p95_ms"], 2) if before["p95_ms"] else None,
+            "queries_before": before["queries"],
+            "queries_after": result["queries"],
+        })
+    return rows
@@ -2,7 +2,7 @@ import os
 from celery import Celery
 
 # Set default Django settings
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
 
 app = Celery("crm")
 
@@ -11,3 +11,8 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Discover tasks.py in all installed apps
 app.autodiscover_tasks()
+
+
+def is_crm_task(task):
+    """Whether a Celery signal's `task` is one of ours (crm.tasks), not a library's."""
+    return task is not None and (task.name or "").startswith("crm.tasks.")
@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection
+from django.db.models import Model, Sum
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from crm import metrics
+from crm.models import CounterShard, Order, Product
+
+DEFAULT_SHARDS = 16
+DEFAULT_CACHE_TTL = 5
+DEFAULT_CACHE_SIZE = 10000
+ORDERS = "orders"
+
+# {name: (expires, totals)}, least recently read first
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def product_sales(product_id):
+    """Units sold and revenue of one product."""
+    return f"product:{product_id}:sales"
+
+
+def customer_orders(customer_id):
+    """Orders placed and amount spent by one customer."""
+    return f"customer:{customer_id}:orders"
+
+
+def get_shards():
+    return getattr(settings, "COUNTER_SHARDS", DEFAULT_SHARDS)
+
+
+def get_ttl():
+    return getattr(settings, "COUNTER_CACHE_TTL", DEFAULT_CACHE_TTL)
+
+
+def get_cache_size():
+    return getattr(settings, "COUNTER_CACHE_SIZE", DEFAULT_CACHE_SIZE)
+
+
+def increment(amounts, shards=None):
+    """
+    Add to several counters in one statement: `amounts` maps a counter
+    name to (count, amount). Each counter gets a random one of `shards`
+    rows (COUNTER_SHARDS), created on first use. Rows are written in a
+    fixed order so concurrent transactions can't deadlock on them.
+    """
+    shards = shards or get_shards()
+    rows = sorted((name, random.randrange(shards), count, Decimal(amount)) for name, (count, amount) in amounts.items())
+    if not rows:
+        return
+    table = CounterShard._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, shard, count, amount) VALUES {', '.join(['(%s, %s, %s, %s)'] * len(rows))} "
+            f"ON CONFLICT (name, shard) DO UPDATE "
+            f"SET count = {table}.count + excluded.count, amount = {table}.amount + excluded.amount",
+            [value for row in rows for value in row],
+        )
+
+
+def read_many(names, cached=True):
+    """
+    {name: (count, amount)} summed over the shards; counters never written
+    read as (0, 0). Totals are cached per process for COUNTER_CACHE_TTL
+    seconds, so they may lag recent increments by that much; pass
+    cached=False for exact totals. The cache keeps the COUNTER_CACHE_SIZE
+    most recently read counters.
+    """
+    names = list(dict.fromkeys(names))
+    now = time.monotonic()
+    totals = {}
+    if cached:
+        with _lock:
+            for name in names:
+                hit = _cache.get(name)
+                if hit and hit[0] > now:
+                    _cache.move_to_end(name)
+                    totals[name] = hit[1]
+        for name in names:
+            metrics.record_cache("counters", hit=name in totals)
+    missing = [name for name in names if name not in totals]
+    if missing:
+        fetched = defaultdict(lambda: (0, Decimal("0")))
+        for name, count, amount in (
+            CounterShard.objects.filter(name__in=missing)
+            .values("name").annotate(count=Sum("count"), amount=Sum("amount"))
+            .values_list("name", "count", "amount")
+        ):
+            fetched[name] = (count, amount)
+        expires = now + get_ttl()
+        size = get_cache_size()
+        with _lock:
+            for name in missing:
+                totals[name] = fetched[name]
+                _cache[name] = (expires, fetched[name])
+                _cache.move_to_end(name)
+            while len(_cache) > size:
+                _cache.popitem(last=False)
+    return totals
+
+
+def read(name, cached=True):
+    return read_many([name], cached)[name]
+
+
+def attach(objects, name_for, count_attr, amount_attr, related=None):
+    if related:
+        objects = [getattr(obj, related, None) for obj in objects]
+    objects = [obj for obj in objects if isinstance(obj, Model)]
+    totals = read_many(name_for(obj.pk) for obj in objects)
+    for obj in objects:
+        count, amount = totals[name_for(obj.pk)]
+        setattr(obj, count_attr, count)
+        setattr(obj, amount_attr, amount)
+
+
+def read_attached(obj, name_for, count_attr, amount_attr):
+    """(count, amount) set by CountedQuerySet.with_counters(), or read for this object alone."""
+    if hasattr(obj, count_attr):
+        return getattr(obj, count_attr), getattr(obj, amount_attr)
+    return read(name_for(obj.pk))
+
+
+def delete(names):
+    """Drop counters, e.g. those of deleted customers."""
+    names = list(names)
+    CounterShard.objects.filter(name__in=names).delete()
+    with _lock:
+        for name in names:
+            _cache.pop(name, None)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+def order_amounts(customer_id, total_amount):
+    """What one order adds to the global totals and its customer's."""
+    return {ORDERS: (1, total_amount), customer_orders(customer_id): (1, total_amount)}
+
+
+# Every order created through the ORM is counted, whatever creates it;
+# seed_db, which bulk inserts, increments the counters itself. Orders
+# deleted later (archived, cleaned up) stay counted: these are totals of
+# orders placed.
+@receiver(post_save, sender=Order)
+def _count_order(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        increment(order_amounts(instance.customer_id, instance.total_amount))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def _count_sales(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        # product.product_orders.add(*orders)
+        increment({product_sales(instance.pk): (len(pk_set), instance.price * len(pk_set))})
+    else:
+        increment({
+            product_sales(pk): (1, price)
+            for pk, price in Product.objects.filter(pk__in=pk_set).values_list("pk", "price")
+        })
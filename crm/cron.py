@@ -1,9 +1,8 @@
 import logging
-import os
 from datetime import datetime
-from django.conf import settings
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from gql import gql
+from crm import health, inventory, sqlite_tuning, tracing
+from crm.graphql_client import get_client
 
 # Configure separate loggers for cron jobs
 heartbeat_logger = logging.getLogger("crm.heartbeat")
@@ -20,30 +19,25 @@ low_stock_logger.addHandler(low_stock_handler)
 low_stock_logger.setLevel(logging.INFO)
 
 
-def get_client():
-    graphql_endpoint = os.getenv(
-        "GRAPHQL_ENDPOINT",
-        getattr(settings, "GRAPHQL_ENDPOINT", "http://localhost:8000/graphql"),
-    )
-    transport = RequestsHTTPTransport(url=graphql_endpoint, verify=True, retries=3)
-    return Client(transport=transport, fetch_schema_from_transport=True)
-
-
+@tracing.traced("cron.log_crm_heartbeat")
 def log_crm_heartbeat():
     """
-    Cron job to log CRM heartbeat and check GraphQL hello.
+    Cron job to log CRM heartbeat using the cached readiness checks.
     """
-    client = get_client()
-    query = gql("""query { hello }""")
-
     try:
-        result = client.execute(query)
-        hello_value = result.get("hello", "No response")
-        heartbeat_logger.info(f"CRM is alive - GraphQL hello response: {hello_value}")
+        ready, components = health.readiness()
+        summary = ", ".join(
+            f"{name}={c['status']} ({c['latency_ms']}ms)" for name, c in components.items()
+        )
+        if ready:
+            heartbeat_logger.info(f"CRM is alive - {summary}")
+        else:
+            heartbeat_logger.warning(f"CRM is degraded - {summary}")
     except Exception as e:
-        heartbeat_logger.error(f"Error querying GraphQL hello: {e}", exc_info=True)
+        heartbeat_logger.error(f"Error checking CRM health: {e}", exc_info=True)
 
 
+@tracing.traced("cron.update_low_stock")
 def update_low_stock():
     """
     Cron job to update low-stock products via GraphQL mutation.
@@ -52,7 +46,7 @@ def update_low_stock():
     mutation = gql(
         """
         mutation {
-            updateLowStockProducts {
+            updateLowStockProducts(source: "cron.update_low_stock") {
                 success
                 updatedProducts {
                     name
@@ -76,3 +70,26 @@ def update_low_stock():
 
     except Exception as e:
         low_stock_logger.error(f"Error updating low-stock products: {e}", exc_info=True)
+
+
+@tracing.traced("cron.optimize_sqlite")
+def optimize_sqlite():
+    """
+    Cron job to refresh SQLite planner statistics and truncate the WAL file.
+    """
+    try:
+        sqlite_tuning.maintain()
+    except Exception as e:
+        heartbeat_logger.error(f"Error optimizing SQLite: {e}", exc_info=True)
+
+
+@tracing.traced("cron.compact_stock")
+def compact_stock():
+    """
+    Cron job to fold pending stock movements into product stock snapshots.
+    """
+    try:
+        while inventory.compact():
+            pass
+    except Exception as e:
+        low_stock_logger.error(f"Error compacting stock movements: {e}", exc_info=True)
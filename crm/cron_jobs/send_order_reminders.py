@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import argparse
 import datetime
 import logging
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import django
+from gql import gql, GraphQLRequest
+from graphql_relay import from_global_id
 
 # Detect project root (two directories up from this script)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Setup Django so the watermark and sent reminders can be persisted
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+django.setup()
+
+from django.utils import timezone
+from crm.graphql_client import get_client
+from crm.models import JobCheckpoint
+from crm.reminders import CHECKPOINT_NAME, advance_checkpoint, dispatch_reminders, send_batch
+
 # Configure standalone logger
 LOG_FILE = "/tmp/order_reminders_log.txt"
 logger = logging.getLogger("order_reminders")
@@ -18,45 +31,105 @@ file_handler = logging.FileHandler(LOG_FILE)
 file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 logger.addHandler(file_handler)
 
+PAGE_SIZE = int(os.getenv("ORDER_REMINDERS_PAGE_SIZE", "100"))
+INITIAL_WINDOW_DAYS = 7
 
-def main():
-    # GraphQL endpoint
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql",
-        verify=True,
-        retries=3,
-    )
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-
-    # Calculate cutoff date (7 days ago)
-    cutoff = (datetime.datetime.now() - datetime.timedelta(days=7)).date().isoformat()
-
-    # GraphQL query
-    query = gql("""
-    query GetRecentOrders($cutoff: Date!) {
-        orders(orderDate_Gte: $cutoff) {
-            id
-            customer {
-                email
+# Keyset pagination: each page asks for orders with an id above the last
+# one seen, so a page never costs more than PAGE_SIZE rows to produce
+# (graphene-django caps `first` at 100 by default).
+NEW_ORDERS_QUERY = gql("""
+query GetNewOrders($afterId: Decimal, $cutoff: Date, $first: Int!) {
+    allOrders(id_Gt: $afterId, orderDate_Gte: $cutoff, orderBy: "id", first: $first) {
+        edges {
+            node {
+                id
+                orderDate
+                customer {
+                    email
+                }
             }
         }
     }
-    """)
+}
+""")
+
+
+def fetch_new_orders(client, checkpoint, page_size=PAGE_SIZE):
+    """
+    Yield pages of orders newer than the checkpoint, oldest first.
+
+    On the very first run (no watermark yet) only the last week is fetched.
+    """
+    after_id = checkpoint.last_id
+    cutoff = None
+    if not after_id:
+        cutoff = (timezone.now() - datetime.timedelta(days=INITIAL_WINDOW_DAYS)).date().isoformat()
+
+    while True:
+        request = GraphQLRequest(
+            NEW_ORDERS_QUERY.document,
+            variable_values={"afterId": after_id, "cutoff": cutoff, "first": page_size},
+        )
+        result = client.execute(request)
+        page = [
+            {
+                "pk": int(from_global_id(edge["node"]["id"])[1]),
+                "email": edge["node"]["customer"]["email"],
+                "order_date": edge["node"]["orderDate"],
+            }
+            for edge in result["allOrders"]["edges"]
+        ]
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["pk"]
 
-    params = {"cutoff": cutoff}
+
+def process_new_orders(client, page_size=PAGE_SIZE, fan_out=False):
+    """
+    Send reminders for orders placed since the last run.
+
+    Serially, the watermark moves after every page and the count sent is
+    returned. With `fan_out` each page is handed to Celery workers as it is
+    fetched, one chord per page whose callback moves the watermark past it
+    once the pages below are done, and the count queued is returned.
+    """
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    if fan_out:
+        total = 0
+        after_id = checkpoint.last_id
+        for page in fetch_new_orders(client, checkpoint, page_size):
+            dispatch_reminders(page, after_id=after_id)
+            after_id = page[-1]["pk"]
+            total += len(page)
+        return total
+
+    total = 0
+    for page in fetch_new_orders(client, checkpoint, page_size):
+        total += len(send_batch(page))
+        advance_checkpoint(page[-1]["pk"], page[-1]["order_date"])
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send reminders for new orders")
+    parser.add_argument("--fan-out", action="store_true",
+                        help="Dispatch reminder batches to Celery workers instead of sending inline")
+    args = parser.parse_args()
 
     try:
-        result = client.execute(query, variable_values=params)
-        orders = result.get("orders", [])
+        total = process_new_orders(get_client(), fan_out=args.fan_out)
     except Exception as e:
-        logger.error(f"Error while fetching orders: {e}", exc_info=True)
+        logger.error(f"Error while processing order reminders: {e}", exc_info=True)
         print("Error while fetching orders.")
         return
 
-    # Log results
-    for order in orders:
-        logger.info(f"Reminder: Order {order['id']} for {order['customer']['email']}")
-
+    if args.fan_out:
+        logger.info(f"Queued {total} new orders for reminders")
+    else:
+        logger.info(f"Processed {total} new order reminders")
     print("Order reminders processed!")
 
 
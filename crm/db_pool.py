@@ -0,0 +1,42 @@
+"""
+Connection reuse settings per process type. Imported from the settings
+modules, so nothing here may touch django.conf.settings at import time.
+"""
+import os
+import sys
+
+PROCESS_TYPES = ("web", "worker", "scheduler")
+POSTGRES_ENGINE = "django.db.backends.postgresql"
+
+
+def detect_process_type(argv=None, environ=None):
+    """CRM_PROCESS_TYPE if set, else guessed from the command line (celery / run_scheduler / anything else)."""
+    environ = os.environ if environ is None else environ
+    if environ.get("CRM_PROCESS_TYPE"):
+        return environ["CRM_PROCESS_TYPE"]
+    argv = sys.argv if argv is None else argv
+    program = argv[0] if argv else ""
+    if os.path.basename(program) == "celery" or program.endswith(os.path.join("celery", "__main__.py")):
+        return "scheduler" if "beat" in argv else "worker"
+    if "run_scheduler" in argv or "crontab" in argv:
+        return "scheduler"
+    return "web"
+
+
+def configure_connections(databases, process_type, pool_sizes, pool_timeout=10, conn_max_age=600):
+    """
+    PostgreSQL aliases get Django's psycopg connection pool, sized for
+    `process_type`; persistent connections must then be off (CONN_MAX_AGE 0).
+    Other backends (SQLite) keep one connection per thread for
+    `conn_max_age` seconds, health-checked before each reuse.
+    """
+    max_size = pool_sizes.get(process_type, pool_sizes.get("web", 10))
+    for config in databases.values():
+        if config.get("ENGINE") == POSTGRES_ENGINE:
+            options = config.setdefault("OPTIONS", {})
+            options.setdefault("pool", {"min_size": min(2, max_size), "max_size": max_size, "timeout": pool_timeout})
+            config["CONN_MAX_AGE"] = 0
+        else:
+            config.setdefault("CONN_MAX_AGE", conn_max_age)
+            config.setdefault("CONN_HEALTH_CHECKS", True)
+    return databases
@@ -0,0 +1,222 @@
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+DEFAULT_PIN_SECONDS = 5
+DEFAULT_MAX_LAG_SECONDS = 10
+DEFAULT_CHECK_INTERVAL = 2
+HEARTBEAT_NAME = "replica_heartbeat"
+PIN_COOKIE = "crm_primary_until"
+
+# Reads go to a replica only inside replica_reads(); until this time
+# (epoch seconds) they stay on the primary to see the context's own writes.
+_replica_reads = contextvars.ContextVar("crm_replica_reads", default=None)
+_primary_until = contextvars.ContextVar("crm_primary_until", default=0.0)
+
+
+def replica_aliases():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", DEFAULT_PIN_SECONDS)
+
+
+@contextmanager
+def replica_reads(read_your_writes=True):
+    """
+    Let reads in the block go to a healthy replica. With
+    `read_your_writes=False` the primary pin after a write is ignored, for
+    batch jobs that re-check what they read on the primary anyway.
+    """
+    token = _replica_reads.set({"read_your_writes": read_your_writes})
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary():
+    """Force every read in the block onto the primary."""
+    token = _replica_reads.set(None)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def pin_to_primary(seconds=None):
+    until = time.time() + (pin_seconds() if seconds is None else seconds)
+    _primary_until.set(max(_primary_until.get(), until))
+
+
+def pinned_until():
+    return _primary_until.get()
+
+
+@contextmanager
+def pinned_session(until=0.0):
+    """Start a unit of work (request, task) pinned until `until`; restores the outer pin after."""
+    token = _primary_until.set(until)
+    try:
+        yield
+    finally:
+        _primary_until.reset(token)
+
+
+def write_heartbeat():
+    """
+    Stamp the heartbeat row on the primary. Run by the replica_heartbeat
+    task every REPLICA_HEARTBEAT_INTERVAL seconds, never from a read.
+    """
+    from crm.models import JobCheckpoint
+
+    JobCheckpoint.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        name=HEARTBEAT_NAME, defaults={"last_timestamp": timezone.now()},
+    )
+
+
+class ReplicaMonitor:
+    """
+    Replica health for this process, refreshed at most every
+    REPLICA_CHECK_INTERVAL seconds. A refresh only reads: the heartbeat
+    row (a JobCheckpoint written by the replica_heartbeat task) from the
+    primary and from every replica. Lag is how far the replica's copy is
+    behind the primary's. Replicas that fail or lag more than
+    REPLICA_MAX_LAG_SECONDS are skipped until a later refresh finds them
+    healthy again, and so is every replica while the heartbeat is stale.
+    SQLite read-only aliases open the primary's own file: always healthy.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._status = {}
+        self._checked_at = None
+        self._lock = threading.RLock()
+
+    def max_lag(self):
+        return getattr(settings, "REPLICA_MAX_LAG_SECONDS", DEFAULT_MAX_LAG_SECONDS)
+
+    def interval(self):
+        return getattr(settings, "REPLICA_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL)
+
+    def heartbeat(self, alias):
+        from crm.models import JobCheckpoint
+
+        return JobCheckpoint.objects.using(alias).filter(name=HEARTBEAT_NAME).values_list("last_timestamp", flat=True).first()
+
+    def measure(self, alias, primary_beat):
+        try:
+            beat = self.heartbeat(alias)
+        except Exception as e:
+            return {"healthy": False, "lag": None, "error": str(e)}
+        if beat is None:
+            return {"healthy": False, "lag": None, "error": "no heartbeat replicated yet"}
+        lag = max(0.0, (primary_beat - beat).total_seconds())
+        return {"healthy": lag <= self.max_lag(), "lag": round(lag, 3), "error": None}
+
+    def refresh(self):
+        from crm.sqlite_tuning import read_only_aliases
+
+        same_file = set(read_only_aliases())
+        measured = [alias for alias in replica_aliases() if alias not in same_file]
+        status = {alias: {"healthy": True, "lag": 0.0, "error": None} for alias in replica_aliases() if alias in same_file}
+        error = None
+        if measured:
+            try:
+                primary_beat = self.heartbeat(DEFAULT_DB_ALIAS)
+            except Exception as e:
+                primary_beat, error = None, str(e)
+            if primary_beat is None:
+                error = error or "no heartbeat written yet"
+            elif (timezone.now() - primary_beat).total_seconds() > self.max_lag():
+                # The heartbeat task isn't running: lag can't be told apart
+                # from an idle primary, so don't trust any replica
+                error = "heartbeat is stale"
+        for alias in measured:
+            status[alias] = {"healthy": False, "lag": None, "error": error} if error else self.measure(alias, primary_beat)
+        self._status = status
+        self._checked_at = self.clock()
+        return self._status
+
+    def status(self):
+        if self._checked_at is None or self.clock() - self._checked_at >= self.interval():
+            with self._lock:
+                if self._checked_at is None or self.clock() - self._checked_at >= self.interval():
+                    self.refresh()
+        return self._status
+
+    def healthy(self):
+        return [alias for alias, status in self.status().items() if status["healthy"]]
+
+    def choose(self):
+        """A random healthy replica, or None to fail over to the primary."""
+        aliases = self.healthy()
+        return random.choice(aliases) if aliases else None
+
+    def reset(self):
+        with self._lock:
+            self._status = {}
+            self._checked_at = None
+
+
+monitor = ReplicaMonitor()
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ("default"). Reads go to a healthy replica
+    (DATABASE_REPLICAS) only inside replica_reads(), never inside a
+    transaction on the primary, and not within REPLICA_PIN_SECONDS of a
+    write made in the same request, task or thread.
+    """
+
+    def db_for_read(self, model, **hints):
+        intent = _replica_reads.get()
+        if intent is None or not replica_aliases():
+            return DEFAULT_DB_ALIAS
+        if intent["read_your_writes"] and time.time() < _primary_until.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return monitor.choose() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class PrimaryPinningMiddleware:
+    """
+    Carries the read-your-writes pin across requests in a cookie: after a
+    request that wrote, the client's next requests read from the primary
+    until the pin expires.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            until = 0.0
+        with pinned_session(until):
+            response = self.get_response(request)
+            pinned = pinned_until()
+        now = time.time()
+        if pinned > max(until, now):
+            response.set_cookie(PIN_COOKIE, f"{pinned:.3f}", max_age=int(pinned - now) + 1, httponly=True, samesite="Lax")
+        return response
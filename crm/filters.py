@@ -1,8 +1,22 @@
 import django_filters
+from datetime import datetime, time
+from django.utils import timezone
 from .models import Customer, Product, Order
 from django.db.models import Q
 
 
+class DayStartFilter(django_filters.DateFilter):
+    """
+    A date compared against a DateTimeField as midnight in the current time
+    zone: an aware bound, which PostgreSQL can also prune partitions with.
+    """
+
+    def filter(self, qs, value):
+        if value and not isinstance(value, datetime):
+            value = timezone.make_aware(datetime.combine(value, time.min))
+        return super().filter(qs, value)
+
+
 class CustomerFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
     email = django_filters.CharFilter(field_name="email", lookup_expr="icontains")
@@ -25,8 +39,9 @@ class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
     price__gte = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     price__lte = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
-    stock__gte = django_filters.NumberFilter(field_name="stock", lookup_expr="gte")
-    stock__lte = django_filters.NumberFilter(field_name="stock", lookup_expr="lte")
+    # current_stock is annotated by ProductType.get_queryset
+    stock__gte = django_filters.NumberFilter(field_name="current_stock", lookup_expr="gte")
+    stock__lte = django_filters.NumberFilter(field_name="current_stock", lookup_expr="lte")
     
     # Optional: filter low stock products
     low_stock = django_filters.BooleanFilter(method="filter_low_stock")
@@ -37,22 +52,25 @@ class ProductFilter(django_filters.FilterSet):
 
     def filter_low_stock(self, queryset, name, value):
         if value:
-            return queryset.filter(stock__lt=10)
+            return queryset.filter(current_stock__lt=10)
         return queryset
 
 
 class OrderFilter(django_filters.FilterSet):
+    id__gt = django_filters.NumberFilter(field_name="id", lookup_expr="gt")
     total_amount__gte = django_filters.NumberFilter(field_name="total_amount", lookup_expr="gte")
     total_amount__lte = django_filters.NumberFilter(field_name="total_amount", lookup_expr="lte")
-    order_date__gte = django_filters.DateFilter(field_name="order_date", lookup_expr="gte")
-    order_date__lte = django_filters.DateFilter(field_name="order_date", lookup_expr="lte")
+    order_date__gte = DayStartFilter(field_name="order_date", lookup_expr="gte")
+    order_date__lte = DayStartFilter(field_name="order_date", lookup_expr="lte")
     customer_name = django_filters.CharFilter(field_name="customer__name", lookup_expr="icontains")
     product_name = django_filters.CharFilter(method="filter_product_name")
     product_id = django_filters.NumberFilter(method="filter_product_id")
+    order_by = django_filters.OrderingFilter(fields=("id", "order_date"))
 
     class Meta:
         model = Order
         fields = [
+            "id__gt",
             "total_amount__gte", "total_amount__lte",
             "order_date__gte", "order_date__lte",
             "customer_name", "product_name", "product_id"
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+from graphql import (
+    FragmentDefinitionNode,
+    NameNode,
+    OperationDefinitionNode,
+    Visitor,
+    VariableNode,
+    print_ast,
+    visit,
+)
+from crm.stats import percentile
+
+logger = logging.getLogger("crm.operation_stats")
+slow_logger = logging.getLogger("crm.slow_operations")
+
+DEFAULT_MAX_OPERATIONS = 1000
+DEFAULT_SAMPLES = 500
+DEFAULT_SLOW_MS = 500
+DEFAULT_SAFE_VARIABLES = ["first", "last", "offset", "orderBy"]
+REDACTED = "[redacted]"
+
+_PLACEHOLDER = VariableNode(name=NameNode(value="_"))
+
+
+def _copy(node, **changes):
+    fields = {key: getattr(node, key) for key in node.keys}
+    fields.update(changes)
+    return node.__class__(**fields)
+
+
+class _Normalizer(Visitor):
+    """Replace literals with $_, drop aliases and names, and sort fields and arguments."""
+
+    def _literal(self, node, *args):
+        return _PLACEHOLDER
+
+    leave_int_value = leave_float_value = leave_string_value = _literal
+    leave_boolean_value = leave_enum_value = leave_list_value = leave_object_value = _literal
+
+    def leave_field(self, node, *args):
+        return _copy(node, alias=None, arguments=tuple(sorted(node.arguments or (), key=lambda a: a.name.value)))
+
+    def leave_selection_set(self, node, *args):
+        return _copy(node, selections=tuple(sorted(node.selections, key=print_ast)))
+
+    def leave_operation_definition(self, node, *args):
+        return _copy(node, name=None)
+
+
+def normalize(document, operation_name=None):
+    """
+    Stable text of the operation to run (and of the fragments in the
+    document): same-shaped requests normalize identically whatever their
+    literals, aliases, field order or operation name.
+    """
+    normalized = visit(document, _Normalizer())
+    operations = [d for d in normalized.definitions if isinstance(d, OperationDefinitionNode)]
+    original = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    if operation_name:
+        operations = [n for n, o in zip(operations, original) if o.name and o.name.value == operation_name]
+    fragments = sorted(
+        (d for d in normalized.definitions if isinstance(d, FragmentDefinitionNode)),
+        key=lambda d: d.name.value,
+    )
+    text = " ".join(print_ast(d) for d in operations[:1] + fragments)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def count_rows(data):
+    """Objects in the response: every list item, at any depth."""
+    if isinstance(data, dict):
+        return sum(count_rows(value) for value in data.values())
+    if isinstance(data, list):
+        return len(data) + sum(count_rows(item) for item in data)
+    return 0
+
+
+def redact(variables, safe=None):
+    """Variables with every value replaced, except pagination-style keys in `safe`."""
+    if safe is None:
+        safe = getattr(settings, "SLOW_OPERATION_SAFE_VARIABLES", DEFAULT_SAFE_VARIABLES)
+
+    def scrub(value, key=None):
+        if key in safe:
+            return value
+        if isinstance(value, dict):
+            return {k: scrub(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [scrub(v) for v in value]
+        return REDACTED
+
+    return scrub(variables or {})
+
+
+class OperationStats:
+    def __init__(self, normalized, name, kind, samples):
+        self.normalized = normalized
+        self.name = name
+        self.kind = kind
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.sql_queries = 0
+        self.rows = 0
+        self.latencies = deque(maxlen=samples)
+        self.last_seen = timezone.now()
+
+    def add(self, ms, sql_queries, rows, error):
+        self.count += 1
+        self.errors += int(error)
+        self.total_ms += ms
+        self.sql_queries += sql_queries
+        self.rows += rows
+        self.latencies.append(ms)
+        self.last_seen = timezone.now()
+
+    def merge(self, later):
+        """Fold in the stats of a later window for the same operation."""
+        self.name = later.name or self.name
+        self.count += later.count
+        self.errors += later.errors
+        self.total_ms += later.total_ms
+        self.sql_queries += later.sql_queries
+        self.rows += later.rows
+        self.latencies.extend(later.latencies)
+        self.last_seen = later.last_seen
+
+    def summary(self):
+        latencies = list(self.latencies) or [0.0]
+        return {
+            "operation_name": self.name,
+            "operation_type": self.kind,
+            "normalized_query": self.normalized,
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "sql_queries": self.sql_queries,
+            "rows": self.rows,
+        }
+
+
+class OperationStore:
+    """
+    Per-process stats keyed by fingerprint, holding at most `max_operations`
+    entries (least recently seen evicted first). Latency percentiles come
+    from the last `samples` calls of each operation.
+    """
+
+    def __init__(self, max_operations=None, samples=None):
+        self.max_operations = max_operations
+        self.samples = samples
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._normalized = OrderedDict()
+        self.evicted = 0
+        self.last_flush = time.monotonic()
+
+    def get_max_operations(self):
+        if self.max_operations is not None:
+            return self.max_operations
+        return getattr(settings, "OPERATION_STATS_MAX_OPERATIONS", DEFAULT_MAX_OPERATIONS)
+
+    def fingerprint(self, query, document, operation_name):
+        """(fingerprint, normalized text), memoized by query text."""
+        key = (query, operation_name)
+        with self._lock:
+            cached = self._normalized.get(key)
+            if cached is not None:
+                self._normalized.move_to_end(key)
+                return cached
+        normalized = normalize(document, operation_name)
+        cached = (fingerprint(normalized), normalized)
+        with self._lock:
+            self._normalized[key] = cached
+            while len(self._normalized) > self.get_max_operations():
+                self._normalized.popitem(last=False)
+        return cached
+
+    def record(self, key, normalized, name, kind, ms, sql_queries=0, rows=0, error=False):
+        samples = self.samples or getattr(settings, "OPERATION_STATS_SAMPLES", DEFAULT_SAMPLES)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = OperationStats(normalized, name, kind, samples)
+                while len(self._entries) > self.get_max_operations():
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._entries.move_to_end(key)
+                entry.name = name or entry.name
+            entry.add(ms, sql_queries, rows, error)
+
+    def top(self, limit=20, by="total_ms"):
+        """[(fingerprint, summary)] ranked by `by`, highest first."""
+        with self._lock:
+            rows = [(key, entry.summary()) for key, entry in self._entries.items()]
+        rows.sort(key=lambda row: row[1][by], reverse=True)
+        return rows[:limit]
+
+    def drain(self):
+        with self._lock:
+            entries, self._entries = self._entries, OrderedDict()
+            self.last_flush = time.monotonic()
+        return entries
+
+    def restore(self, entries):
+        """Put a drained window back, merging in whatever was recorded since."""
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key in entries:
+                    entries[key].merge(entry)
+                else:
+                    entries[key] = entry
+                entries.move_to_end(key)
+            self._entries = entries
+            while len(self._entries) > self.get_max_operations():
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def flush(self):
+        """
+        Add the collected stats to OperationStat rows and start a new window.
+        If the database write fails the window is kept for the next flush.
+        """
+        from crm.models import OperationStat
+
+        entries = self.drain()
+        try:
+            with transaction.atomic():
+                for key, entry in entries.items():
+                    summary = entry.summary()
+                    row, created = OperationStat.objects.get_or_create(
+                        fingerprint=key,
+                        defaults={k: summary[k] for k in ("operation_type", "normalized_query")},
+                    )
+                    OperationStat.objects.filter(pk=row.pk).update(
+                        operation_name=summary["operation_name"] or row.operation_name,
+                        count=F("count") + entry.count,
+                        errors=F("errors") + entry.errors,
+                        total_ms=F("total_ms") + entry.total_ms,
+                        sql_queries=F("sql_queries") + entry.sql_queries,
+                        rows=F("rows") + entry.rows,
+                        p50_ms=summary["p50_ms"],
+                        p95_ms=summary["p95_ms"],
+                        p99_ms=summary["p99_ms"],
+                        last_seen=entry.last_seen,
+                    )
+        except Exception:
+            self.restore(entries)
+            raise
+        return len(entries)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._normalized.clear()
+            self.evicted = 0
+
+
+store = OperationStore()
+
+
+def record_request(request, tracker):
+    """
+    Record a finished /graphql/ request (see CRMGraphQLView), log it if
+    slower than SLOW_OPERATION_MS, and flush the store to the database
+    every OPERATION_STATS_FLUSH_SECONDS if that is set. A failed flush is
+    logged, never raised into the response.
+    """
+    document = getattr(request, "graphql_document", None)
+    if document is None:
+        return None
+    operation = request.graphql_operation
+    name = operation.name.value if operation is not None and operation.name else ""
+    kind = operation.operation.value if operation is not None else "unknown"
+    key, normalized = store.fingerprint(request.graphql_query, document, request.graphql_operation_name)
+    result = getattr(request, "graphql_result", None)
+    rows = count_rows(result.data) if result is not None and result.data else 0
+    ms = tracker.elapsed * 1000
+    store.record(key, normalized, name, kind, ms, tracker.db_queries, rows, error=request.graphql_errors)
+
+    if ms >= getattr(settings, "SLOW_OPERATION_MS", DEFAULT_SLOW_MS):
+        slow_logger.warning(json.dumps({
+            "fingerprint": key,
+            "operation": name or None,
+            "type": kind,
+            "duration_ms": round(ms, 3),
+            "sql_queries": tracker.db_queries,
+            "rows": rows,
+            "variables": redact(request.graphql_variables),
+            "query": normalized,
+        }))
+
+    interval = getattr(settings, "OPERATION_STATS_FLUSH_SECONDS", None)
+    if interval and time.monotonic() - store.last_flush >= interval:
+        try:
+            store.flush()
+        except DatabaseError:
+            logger.exception("Could not flush operation stats; keeping them for the next flush")
+    return key
@@ -0,0 +1,98 @@
+import os
+from contextlib import nullcontext
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.http import HttpRequest
+from gql import Client, GraphQLRequest
+from gql.transport.exceptions import TransportQueryError
+from gql.transport.requests import RequestsHTTPTransport
+from graphene_django.settings import graphene_settings
+from crm import tracing
+from crm.schema_artifacts import get_artifacts
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, parse, validate
+
+DEFAULT_ENDPOINT = "http://localhost:8000/graphql"
+
+
+class LocalClient:
+    """
+    Runs operations directly against `crm.schema.schema` in this process.
+
+    Mirrors the part of the gql `Client` API our jobs use (`execute(request)`
+    returning `data`, raising TransportQueryError on errors), so callers can
+    swap it in without a network hop, JSON round-trip or schema download.
+    """
+
+    def __init__(self, schema=None):
+        if schema is None:
+            from crm.schema import schema
+        self.schema = schema
+
+    def _context(self):
+        request = HttpRequest()
+        request.method = "POST"
+        request.path = "/graphql/"
+        request.user = AnonymousUser()
+        return request
+
+    def execute(self, request, variable_values=None, operation_name=None):
+        if not isinstance(request, GraphQLRequest):
+            request = GraphQLRequest(request, variable_values=variable_values, operation_name=operation_name)
+        document = request.document
+        if isinstance(document, str):
+            document = parse(document)
+
+        operation = get_operation_ast(document, request.operation_name)
+        atomic = (
+            operation is not None
+            and operation.operation == OperationType.MUTATION
+            and graphene_settings.ATOMIC_MUTATIONS
+        )
+
+        with tracing.span("graphql.local", attributes={
+            "graphql.operation.name": operation.name.value if operation is not None and operation.name else None,
+            "graphql.operation.type": operation.operation.value if operation is not None else None,
+        }):
+            errors = validate(self.schema.graphql_schema, document)
+            if errors:
+                result = ExecutionResult(data=None, errors=errors)
+            else:
+                with transaction.atomic() if atomic else nullcontext():
+                    result = execute(
+                        self.schema.graphql_schema,
+                        document,
+                        variable_values=request.variable_values,
+                        operation_name=request.operation_name,
+                        context_value=self._context(),
+                        middleware=[tracing.TracingMiddleware()],
+                    )
+                    if result.errors and atomic:
+                        transaction.set_rollback(True)
+
+        if result.errors:
+            raise TransportQueryError(
+                str(result.errors[0]),
+                errors=[error.formatted for error in result.errors],
+                data=result.data,
+            )
+        return result.data
+
+
+def get_endpoint():
+    return os.getenv(
+        "GRAPHQL_ENDPOINT",
+        getattr(settings, "GRAPHQL_ENDPOINT", DEFAULT_ENDPOINT),
+    )
+
+
+def get_client():
+    """
+    Client for scheduled jobs: in-process by default, HTTP when
+    GRAPHQL_CLIENT_MODE (env or setting) is "http".
+    """
+    mode = os.getenv("GRAPHQL_CLIENT_MODE", getattr(settings, "GRAPHQL_CLIENT_MODE", "local"))
+    if mode == "http":
+        transport = RequestsHTTPTransport(url=get_endpoint(), verify=True, retries=3)
+        return Client(transport=transport, schema=get_artifacts().sdl)
+    return LocalClient()
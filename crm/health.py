@@ -0,0 +1,101 @@
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from crm import metrics
+
+DEFAULT_TTL = 5.0
+BROKER_TIMEOUT = 1.0
+
+
+def check_database(alias="default"):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def check_migrations(alias="default"):
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        raise RuntimeError(f"{len(plan)} unapplied migrations")
+
+
+def check_broker():
+    from crm.celery import app
+
+    with app.connection_for_write() as conn:
+        conn.ensure_connection(max_retries=1, timeout=BROKER_TIMEOUT)
+
+
+CHECKS = {
+    "database": check_database,
+    "migrations": check_migrations,
+    "broker": check_broker,
+}
+
+
+def enabled_checks():
+    default = ["database", "migrations"]
+    if getattr(settings, "CELERY_BROKER_URL", None):
+        default.append("broker")
+    return getattr(settings, "HEALTH_CHECKS", default)
+
+
+class HealthCache:
+    """
+    Short-TTL cache of component results, so readiness can be polled at
+    high frequency while each probe runs at most once per TTL per process.
+    Applied migrations never become unapplied, so a passing migration check
+    is kept for the life of the process.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def get_ttl(self):
+        return self.ttl if self.ttl is not None else getattr(settings, "HEALTH_CACHE_TTL", DEFAULT_TTL)
+
+    def run(self, name):
+        now = time.monotonic()
+        cached = self._results.get(name)
+        if cached and cached["expires"] > now:
+            metrics.record_cache("health", hit=True)
+            return {**cached["result"], "cached": True}
+
+        with self._lock:
+            cached = self._results.get(name)
+            if cached and cached["expires"] > time.monotonic():
+                metrics.record_cache("health", hit=True)
+                return {**cached["result"], "cached": True}
+            metrics.record_cache("health", hit=False)
+
+            started = time.perf_counter()
+            result = {"status": "ok"}
+            try:
+                CHECKS[name]()
+            except Exception as e:
+                result = {"status": "error", "error": str(e)}
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+            permanent = name == "migrations" and result["status"] == "ok"
+            expires = float("inf") if permanent else time.monotonic() + self.get_ttl()
+            self._results[name] = {"result": result, "expires": expires}
+            return {**result, "cached": False}
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+cache = HealthCache()
+
+
+def readiness():
+    """Run (or reuse) every enabled check; returns (ready, components)."""
+    components = {name: cache.run(name) for name in enabled_checks()}
+    ready = all(c["status"] == "ok" for c in components.values())
+    return ready, components
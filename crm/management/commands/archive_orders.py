@@ -0,0 +1,55 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from crm import archive
+from crm.models import Order
+
+
+class Command(BaseCommand):
+    help = "Move orders older than N whole months into the compact, partitioned archive, in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int,
+                            default=getattr(settings, "ORDER_ARCHIVE_MONTHS", archive.DEFAULT_MONTHS),
+                            help="Months of orders to keep in crm_order besides the current one (default: %(default)s)")
+        parser.add_argument("--batch-size", type=int, default=archive.DEFAULT_BATCH_SIZE,
+                            help="Orders moved per transaction (default: %(default)s)")
+        parser.add_argument("--sleep", type=float, default=0,
+                            help="Seconds to pause between batches to let other writers in")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only report how many orders would be archived")
+
+    def handle(self, *args, **options):
+        months = options["months"]
+        batch_size = options["batch_size"]
+        if months < 1:
+            raise CommandError("--months must be at least 1")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        cutoff = archive.cutoff(months)
+        started = timezone.now()
+
+        if options["dry_run"]:
+            count = Order.objects.filter(order_date__lt=cutoff).count()
+            self.stdout.write(f"{started:%Y-%m-%d %H:%M:%S} - [dry run] {count} orders placed before {cutoff:%Y-%m-%d}")
+            return
+
+        total = 0
+        batch = 0
+        while True:
+            moved = archive.archive_batch(cutoff, batch_size)
+            if not moved:
+                break
+            batch += 1
+            total += moved
+            self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} - batch {batch}: archived {moved} orders, {total} so far")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{timezone.now():%Y-%m-%d %H:%M:%S} - Archived {total} orders placed before {cutoff:%Y-%m-%d} "
+            f"in {batch} batches ({elapsed:.1f}s)"
+        ))
@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from crm import counters
+from crm.db_router import replica_reads
+from crm.models import ArchivedOrder, Customer, Order
+
+DEFAULT_DAYS = 365
+DEFAULT_BATCH_SIZE = 500
+
+
+def inactive_customers(cutoff):
+    """
+    Customers without any order placed after `cutoff`.
+
+    Uses anti-joins (NOT EXISTS) so the database can answer it from the
+    (customer, order_date) indexes of live and archived orders instead of
+    materialising every order.
+    """
+    recent_orders = Order.objects.filter(
+        customer=OuterRef("pk"),
+        order_date__gt=cutoff,
+    )
+    recent_archived = ArchivedOrder.objects.filter(
+        customer=OuterRef("pk"),
+        order_date__gt=cutoff,
+    )
+    return Customer.objects.filter(~Exists(recent_orders), ~Exists(recent_archived))
+
+
+class Command(BaseCommand):
+    help = "Delete customers with no orders in the last N days, in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                            help="Inactivity window in days (default: %(default)s)")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Customers deleted per transaction (default: %(default)s)")
+        parser.add_argument("--sleep", type=float, default=0,
+                            help="Seconds to pause between batches to let other writers in")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only report how many customers would be deleted")
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        batch_size = options["batch_size"]
+        if days < 1:
+            raise CommandError("--days must be at least 1")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        candidates = inactive_customers(cutoff)
+        started = timezone.now()
+
+        if options["dry_run"]:
+            count = candidates.count()
+            self.stdout.write(f"{started:%Y-%m-%d %H:%M:%S} - [dry run] {count} customers inactive since {cutoff:%Y-%m-%d}")
+            return
+
+        total_customers = 0
+        total_orders = 0
+        last_pk = 0
+        batch = 0
+
+        while True:
+            # Keyset pagination on the primary key: every batch is a short
+            # index range scan, never an OFFSET over the whole table. The
+            # scan may use a replica; the re-check below runs on the primary.
+            with replica_reads(read_your_writes=False):
+                ids = list(
+                    candidates.filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+            if not ids:
+                break
+            last_pk = ids[-1]
+            batch += 1
+
+            with transaction.atomic():
+                # Re-check inside the transaction so a customer who ordered
+                # since the scan above is left alone.
+                still_inactive = inactive_customers(cutoff).filter(pk__in=ids)
+                locked_ids = list(
+                    still_inactive.select_for_update(skip_locked=True).values_list("pk", flat=True)
+                )
+                # delete() totals include cascaded rows (order products,
+                # reminders): count only the model itself
+                _, deleted = Order.objects.filter(customer_id__in=locked_ids).delete()
+                deleted_orders = deleted.get(Order._meta.label, 0)
+                _, deleted = ArchivedOrder.objects.filter(customer_id__in=locked_ids).delete()
+                deleted_orders += deleted.get(ArchivedOrder._meta.label, 0)
+                _, deleted = Customer.objects.filter(pk__in=locked_ids).delete()
+                deleted_customers = deleted.get(Customer._meta.label, 0)
+                counters.delete(counters.customer_orders(pk) for pk in locked_ids)
+
+            total_orders += deleted_orders
+            total_customers += deleted_customers
+            self.stdout.write(
+                f"{timezone.now():%Y-%m-%d %H:%M:%S} - batch {batch}: deleted {deleted_customers} customers "
+                f"({deleted_orders} old orders), {total_customers} so far"
+            )
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"{timezone.now():%Y-%m-%d %H:%M:%S} - Deleted {total_customers} inactive customers "
+            f"and {total_orders} orders in {batch} batches ({elapsed:.1f}s)"
+        ))
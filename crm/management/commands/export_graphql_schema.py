@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from crm.schema_artifacts import build_artifacts, reset_artifacts, write_artifacts
+
+
+class Command(BaseCommand):
+    help = "Precompute the GraphQL introspection result and SDL (run once per deploy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output-dir", help="Directory to write schema.graphql and schema.json to")
+
+    def handle(self, *args, **options):
+        artifacts = build_artifacts()
+        directory = write_artifacts(artifacts, options["output_dir"])
+        reset_artifacts()
+        self.stdout.write(self.style.SUCCESS(f"Wrote schema artifacts to {directory} (ETag {artifacts.etag})"))
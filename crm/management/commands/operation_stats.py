@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from crm.models import OperationStat
+
+RANKINGS = ["total_ms", "p95_ms", "p99_ms", "count", "sql_queries", "rows", "errors"]
+
+
+class Command(BaseCommand):
+    help = "Rank GraphQL operations by cost, from the OperationStat rows flushed by the web processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument("--by", choices=RANKINGS, default="total_ms")
+        parser.add_argument("--show-query", action="store_true", help="Print each normalized operation too")
+
+    def handle(self, *args, **options):
+        stats = OperationStat.objects.order_by(f"-{options['by']}")[:options["top"]]
+        self.stdout.write(f"{'fingerprint':16}  {'operation':24} {'calls':>8} {'total ms':>10} "
+                          f"{'p50':>8} {'p95':>8} {'p99':>8} {'sql/call':>8} {'rows/call':>9}")
+        for stat in stats:
+            calls = stat.count or 1
+            self.stdout.write(
+                f"{stat.fingerprint:16}  {(stat.operation_name or '<anonymous>')[:24]:24} {stat.count:>8} "
+                f"{stat.total_ms:>10.0f} {stat.p50_ms:>8.1f} {stat.p95_ms:>8.1f} {stat.p99_ms:>8.1f} "
+                f"{stat.sql_queries / calls:>8.1f} {stat.rows / calls:>9.1f}"
+            )
+            if options["show_query"]:
+                self.stdout.write(f"    {stat.normalized_query}")
@@ -0,0 +1,47 @@
+import os
+import shutil
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from crm import profiling
+
+
+class Command(BaseCommand):
+    help = "List and export profiles of single GraphQL requests, or issue a profiling token"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["list", "export", "token"])
+        parser.add_argument("profile_id", nargs="?", help="Profile to export (see `list`)")
+        parser.add_argument("--fingerprint", help="Only list profiles of this operation fingerprint")
+        parser.add_argument("--output", help="Export to this file instead of printing (.prof copies the raw pstats dump)")
+        parser.add_argument("--sort", default="cumulative", help="pstats sort key for text export (default: %(default)s)")
+        parser.add_argument("--limit", type=int, default=40, help="Functions shown in text export (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_token(self, options):
+        self.stdout.write(profiling.make_token())
+
+    def handle_list(self, options):
+        for profile in profiling.store.list(options["fingerprint"]):
+            created = datetime.fromtimestamp(profile["created"]).isoformat(timespec="seconds")
+            self.stdout.write(
+                f"{profile['id']}  {created}  {profile['operation'] or '<anonymous>'}  "
+                f"{profile['duration_ms']:.1f} ms  {profile['sql_queries']} queries"
+            )
+
+    def handle_export(self, options):
+        profile_id = options["profile_id"]
+        if not profile_id or profile_id not in profiling.store.ids():
+            raise CommandError("Give the id of a stored profile (see `profiles list`)")
+        output = options["output"]
+        if output and output.endswith(".prof"):
+            shutil.copyfile(profiling.store.path(profile_id, ".prof"), output)
+        else:
+            text = profiling.store.stats_text(profile_id, options["sort"], options["limit"])
+            if not output:
+                self.stdout.write(text)
+                return
+            with open(output, "w") as f:
+                f.write(text)
+        self.stdout.write(self.style.SUCCESS(f"Exported {profile_id} to {os.path.abspath(output)}"))
@@ -0,0 +1,122 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils import timezone
+from crm import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Seed throwaway databases at several sizes and benchmark representative GraphQL operations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="small,medium",
+                            help=f"Comma-separated sizes from {', '.join(benchmarks.SIZES)} (default: %(default)s)")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark_results.json",
+                            help="JSON results file (default: %(default)s)")
+        parser.add_argument("--compare", help="Earlier results file to compare against")
+        parser.add_argument("--connection-iterations", type=int, default=200,
+                            help="Connection setup samples, unpooled vs reused; 0 skips (default: %(default)s)")
+        parser.add_argument("--concurrency", type=int, default=0,
+                            help="Threads posting createOrder and allOrders, then ordering one product, then incrementing one counter, "
+                                 "at once after the last size; "
+                                 "SQLite then benchmarks in a database file instead of memory (default: off)")
+        parser.add_argument("--concurrent-requests", type=int, default=50,
+                            help="Requests per thread for --concurrency (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        sizes = [s.strip() for s in options["sizes"].split(",") if s.strip()]
+        unknown = set(sizes) - set(benchmarks.SIZES)
+        if unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(sorted(unknown))}")
+
+        # Benchmarks never touch the configured database: they run in a
+        # test database that is created and destroyed here.
+        old_name = connection.settings_dict["NAME"]
+        if options["concurrency"] and connection.vendor == "sqlite" and not connection.settings_dict["TEST"]["NAME"]:
+            # Threads sharing an in-memory database lock whole tables
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        for alias in connections:
+            # e.g. the SQLite read-only alias: reads the benchmark database too
+            if connections[alias].settings_dict["TEST"]["MIRROR"] == DEFAULT_DB_ALIAS:
+                connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        results = []
+        try:
+            for size in sizes:
+                call_command("flush", interactive=False, verbosity=0)
+                self.stdout.write(f"Benchmarking {size} dataset {benchmarks.SIZES[size]}...")
+                for result in benchmarks.run_size(size, benchmarks.SIZES[size], options["iterations"], options["seed"]):
+                    results.append(result)
+                    self.stdout.write(
+                        f"  {result['operation']:<24} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+                        f"{result['queries']:>4} queries  {result['peak_memory_kb']:>9.1f} KiB peak"
+                    )
+            if options["connection_iterations"]:
+                self.stdout.write("Benchmarking connection setup...")
+                for result in benchmarks.connection_setup(options["connection_iterations"]):
+                    results.append(result)
+                    self.stdout.write(
+                        f"  {result['operation']:<24} p50 {result['p50_ms']:>9.3f}ms  p95 {result['p95_ms']:>9.3f}ms"
+                    )
+            if options["concurrency"]:
+                self.stdout.write(f"Benchmarking {options['concurrency']} concurrent clients...")
+                for result in benchmarks.concurrent_orders(options["concurrency"], options["concurrent_requests"], options["seed"]):
+                    results.append(result)
+                    self.stdout.write(
+                        f"  {result['operation']:<40} {result['throughput_rps']:>8.1f} req/s  "
+                        f"p95 {result['p95_ms']}ms  {result['errors']} errors"
+                    )
+                result = benchmarks.hot_product_orders(options["concurrency"], options["concurrent_requests"])
+                results.append(result)
+                self.stdout.write(
+                    f"  {result['operation']:<40} {result['throughput_rps']:>8.1f} req/s  "
+                    f"sold {result['sold']}/{result['stock']}  {result['out_of_stock']} out of stock  "
+                    f"{result['errors']} errors  {result['oversold']} oversold"
+                )
+                for result in benchmarks.counter_throughput(options["concurrency"], options["concurrent_requests"]):
+                    results.append(result)
+                    self.stdout.write(
+                        f"  {result['operation']:<40} {result['throughput_rps']:>8.1f} req/s  "
+                        f"p95 {result['p95_ms']}ms  {result['shards']} shards  {result['errors']} errors  {result['lost']} lost"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {"meta": self.meta(options), "results": results}
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            for row in benchmarks.compare(report, baseline):
+                self.stdout.write(
+                    f"  {row['size']:<7} {row['operation']:<24} p50 x{row['p50_ratio']}  p95 x{row['p95_ratio']}  "
+                    f"queries {row['queries_before']} -> {row['queries_after']}"
+                )
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "seed": options["seed"],
+        }
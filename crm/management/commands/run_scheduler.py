@@ -0,0 +1,47 @@
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from crm.scheduler import Scheduler, jobs_from_cronjobs
+
+
+class Command(BaseCommand):
+    help = "Run the CRONJOBS callables on their crontab schedules in one long-lived process"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jitter", type=float,
+                            default=getattr(settings, "SCHEDULER_JITTER_SECONDS", 0),
+                            help="Random delay (seconds) added to each run to spread load")
+        parser.add_argument("--max-workers", type=int,
+                            default=getattr(settings, "SCHEDULER_MAX_WORKERS", 4),
+                            help="Jobs that may run at the same time")
+        parser.add_argument("--stats-interval", type=float, default=3600,
+                            help="Seconds between per-job timing stats in the log")
+        parser.add_argument("--list", action="store_true",
+                            help="Print the jobs and their next run, then exit")
+
+    def handle(self, *args, **options):
+        jobs = jobs_from_cronjobs(getattr(settings, "CRONJOBS", []))
+        if not jobs:
+            raise CommandError("No CRONJOBS configured")
+
+        scheduler = Scheduler(jobs, jitter=options["jitter"], max_workers=options["max_workers"])
+        if options["list"]:
+            for job in jobs:
+                self.stdout.write(f"{job.schedule.expression:<16} {job.name}  next: {job.next_run:%Y-%m-%d %H:%M:%S}")
+            scheduler.stop()
+            return
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping scheduler...")
+            scheduler.request_stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f"Scheduler running {len(jobs)} jobs")
+        try:
+            scheduler.run_forever(stats_interval=options["stats_interval"])
+        finally:
+            scheduler.stop()
+            scheduler.log_stats()
+            self.stdout.write(self.style.SUCCESS("Scheduler stopped"))
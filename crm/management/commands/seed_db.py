@@ -1,72 +1,213 @@
+import os
 import random
-from django.core.management.base import BaseCommand
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max
 from django.utils import timezone
-from faker import Faker
+from crm import counters
+from crm.backfill import init_worker
 from crm.models import Customer, Product, Order
-from decimal import Decimal
 
 NUM_CUSTOMERS = 20
 NUM_PRODUCTS = 10
 NUM_ORDERS = 15
+BATCH_SIZE = 5000
+
+FIRST_NAMES = [
+    "Ama", "Kofi", "Akosua", "Kwame", "Abena", "Yaw", "Efua", "Kojo", "Adwoa", "Kwabena",
+    "Alice", "Bob", "Carol", "Dave", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+]
+LAST_NAMES = [
+    "Mensah", "Owusu", "Boateng", "Asante", "Addo", "Appiah", "Osei", "Agyeman", "Darko", "Quaye",
+    "Smith", "Johnson", "Brown", "Taylor", "Wilson", "Davies", "Evans", "Thomas", "Roberts", "Walker",
+]
+PRODUCT_WORDS = [
+    "Laptop", "Phone", "Tablet", "Monitor", "Keyboard", "Mouse", "Headset", "Speaker", "Camera", "Charger",
+    "Router", "Printer", "Cable", "Adapter", "Drive", "Webcam", "Microphone", "Lamp", "Desk", "Chair",
+]
+PRODUCT_ADJECTIVES = ["Basic", "Pro", "Max", "Mini", "Ultra", "Lite", "Plus", "Air", "Eco", "Smart"]
+
+
+def rng_for(seed, kind, chunk):
+    # One generator per (kind, chunk): output is identical whatever the
+    # number of workers or the order in which chunks finish.
+    return random.Random(f"{seed}:{kind}:{chunk}")
+
+
+def chunks(total, size):
+    return [(index, start, min(size, total - start)) for index, start in enumerate(range(0, total, size))]
+
+
+def seed_customers(seed, chunk, start, count, base):
+    rng = rng_for(seed, "customers", chunk)
+    firsts = rng.choices(FIRST_NAMES, k=count)
+    lasts = rng.choices(LAST_NAMES, k=count)
+    with_phone = [rng.random() < 0.5 for _ in range(count)]
+    rows = []
+    for i in range(count):
+        n = base + start + i
+        rows.append(Customer(
+            name=f"{firsts[i]} {lasts[i]}",
+            email=f"{firsts[i].lower()}.{lasts[i].lower()}.{n}@example.com",
+            phone=f"+{n:011d}" if with_phone[i] else None,
+        ))
+    with transaction.atomic():
+        Customer.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return count
+
+
+def seed_products(seed, chunk, start, count, base):
+    rng = rng_for(seed, "products", chunk)
+    rows = [
+        Product(
+            name=f"{rng.choice(PRODUCT_ADJECTIVES)} {rng.choice(PRODUCT_WORDS)} {base + start + i}",
+            price=Decimal(rng.randint(500, 50000)) / 100,
+            stock=rng.randint(0, 100),
+        )
+        for i in range(count)
+    ]
+    with transaction.atomic():
+        Product.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return count
+
+
+_pools = {}
+
+
+def load_pools():
+    """Ids to draw from when generating orders; loaded once per process."""
+    if not _pools:
+        _pools["customers"] = list(Customer.objects.order_by("pk").values_list("pk", flat=True))
+        _pools["products"] = list(Product.objects.order_by("pk").values_list("pk", "price"))
+    return _pools
+
+
+def seed_orders(seed, chunk, start, count, now, days, max_items):
+    pools = load_pools()
+    rng = rng_for(seed, "orders", chunk)
+    customer_ids = rng.choices(pools["customers"], k=count)
+    offsets = [rng.random() * days * 86400 for _ in range(count)]
+    baskets = [rng.sample(pools["products"], k=rng.randint(1, max_items)) for _ in range(count)]
+
+    orders = [
+        Order(
+            customer_id=customer_ids[i],
+            order_date=now - timedelta(seconds=offsets[i]),
+            total_amount=sum(price for _, price in baskets[i]),
+        )
+        for i in range(count)
+    ]
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+        insert_order_products(
+            (order.pk, product_id)
+            for order, basket in zip(orders, baskets)
+            for product_id, _ in basket
+        )
+        # bulk_create sends no post_save, so count the chunk here
+        amounts = defaultdict(lambda: [0, 0])
+        for order, basket in zip(orders, baskets):
+            for name, (n, amount) in counters.order_amounts(order.customer_id, order.total_amount).items():
+                amounts[name][0] += n
+                amounts[name][1] += amount
+            for product_id, price in basket:
+                amounts[counters.product_sales(product_id)][0] += 1
+                amounts[counters.product_sales(product_id)][1] += price
+        counters.increment(amounts)
+    return count
+
+
+def insert_order_products(pairs):
+    """
+    Insert (order_id, product_id) through-rows with one executemany; the
+    ORM's per-object overhead dominates for these two-column rows.
+    """
+    through = Order.products.through._meta
+    connection = connections["default"]
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}, {}) VALUES (%s, %s)".format(
+        quote(through.db_table),
+        quote(through.get_field("order").column),
+        quote(through.get_field("product").column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, list(pairs))
+
+
+def _run(job):
+    func, args = job
+    return func(*args)
+
 
 class Command(BaseCommand):
-    help = "Seed the database with dummy data for Customers, Products, and Orders"
+    help = "Seed the database with reproducible dummy Customers, Products and Orders, at any volume"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=NUM_CUSTOMERS)
+        parser.add_argument("--products", type=int, default=NUM_PRODUCTS)
+        parser.add_argument("--orders", type=int, default=NUM_ORDERS)
+        parser.add_argument("--seed", type=int, default=None,
+                            help="Random seed; the same seed on the same database gives the same data")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help="Rows generated and inserted per chunk (default: %(default)s)")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Worker processes inserting chunks in parallel (default: %(default)s)")
+        parser.add_argument("--days", type=int, default=30,
+                            help="Spread order dates over this many past days (default: %(default)s)")
+        parser.add_argument("--max-items", type=int, default=5,
+                            help="Most products in one order (default: %(default)s)")
 
     def handle(self, *args, **options):
-        fake = Faker()
-        self.stdout.write("Seeding database...")
+        seed = options["seed"] if options["seed"] is not None else random.randrange(2 ** 32)
+        batch_size = options["batch_size"]
+        if batch_size < 1 or options["workers"] < 1:
+            raise CommandError("--batch-size and --workers must be at least 1")
+        self.stdout.write(f"Seeding database (seed {seed})...")
 
-        customers = self.create_customers(fake)
-        self.stdout.write(f"Created {len(customers)} customers")
+        # Unique columns continue after existing rows, so reseeding never collides
+        customer_base = (Customer.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+        product_base = (Product.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
 
-        products = self.create_products(fake)
-        self.stdout.write(f"Created {len(products)} products")
+        self.run_phase("customers", options, [
+            (seed_customers, (seed, index, start, count, customer_base))
+            for index, start, count in chunks(options["customers"], batch_size)
+        ])
+        self.run_phase("products", options, [
+            (seed_products, (seed, index, start, count, product_base))
+            for index, start, count in chunks(options["products"], batch_size)
+        ])
 
-        orders = self.create_orders(fake, customers, products)
-        self.stdout.write(f"Created {len(orders)} orders")
+        if options["orders"]:
+            if not Customer.objects.exists() or not Product.objects.exists():
+                raise CommandError("Orders need at least one customer and one product")
+            max_items = min(options["max_items"], Product.objects.count())
+            now = timezone.now()
+            _pools.clear()
+            self.run_phase("orders", options, [
+                (seed_orders, (seed, index, start, count, now, options["days"], max_items))
+                for index, start, count in chunks(options["orders"], batch_size)
+            ])
+            _pools.clear()
 
         self.stdout.write(self.style.SUCCESS("Database seeding complete!"))
 
-    def create_customers(self, fake):
-        customers = []
-        for _ in range(NUM_CUSTOMERS):
-            while True:
-                email = fake.unique.email()
-                phone = fake.phone_number()
-                if not Customer.objects.filter(email=email).exists():
-                    break
-            customer = Customer.objects.create(
-                name=fake.name(),
-                email=email,
-                phone=phone
-            )
-            customers.append(customer)
-        return customers
-
-    def create_products(self, fake):
-        products = []
-        for _ in range(NUM_PRODUCTS):
-            product = Product.objects.create(
-                name=fake.word().capitalize(),
-                price=round(random.uniform(5, 500), 2),
-                stock=random.randint(0, 100)
-            )
-            products.append(product)
-        return products
-
-    def create_orders(self, fake, customers, products):
-        orders = []
-        for _ in range(NUM_ORDERS):
-            customer = random.choice(customers)
-            selected_products = random.sample(products, k=random.randint(1, min(5, len(products))))
-            order_date = fake.date_time_between(start_date='-30d', end_date='now', tzinfo=timezone.get_current_timezone())
-            total_amount = sum(p.price for p in selected_products)
-
-            order = Order.objects.create(
-                customer=customer,
-                order_date=order_date,
-                total_amount=total_amount
-            )
-            order.products.set(selected_products)
-            orders.append(order)
-        return orders
+    def run_phase(self, label, options, jobs):
+        started = time.monotonic()
+        if options["workers"] == 1 or len(jobs) <= 1:
+            created = sum(_run(job) for job in jobs)
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options["workers"],
+                initializer=init_worker,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE"),),
+            ) as pool:
+                created = sum(pool.map(_run, jobs))
+        elapsed = time.monotonic() - started
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(f"Created {created} {label} in {elapsed:.1f}s ({rate:,.0f}/s)")
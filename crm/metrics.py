@@ -0,0 +1,258 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from crm import sql_observers
+from crm.celery import is_crm_task
+
+DEFAULT_MAX_OPERATIONS = 200
+ANONYMOUS = "<anonymous>"
+OTHER = "<other>"
+UNKNOWN = "unknown"
+
+_OPERATION_NAME = re.compile(r"^[_A-Za-z][_0-9A-Za-z]{0,63}$")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+GRAPHQL_REQUESTS = Counter(
+    "crm_graphql_requests_total", "GraphQL requests handled",
+    ["operation", "type", "status"],
+)
+GRAPHQL_DURATION = Histogram(
+    "crm_graphql_request_duration_seconds", "Wall time of a GraphQL request",
+    ["operation", "type"], buckets=LATENCY_BUCKETS,
+)
+GRAPHQL_DB_DURATION = Histogram(
+    "crm_graphql_db_duration_seconds", "Time spent in SQL during a GraphQL request",
+    ["operation", "type"], buckets=LATENCY_BUCKETS,
+)
+GRAPHQL_DB_QUERIES = Histogram(
+    "crm_graphql_db_queries", "SQL queries run by a GraphQL request",
+    ["operation", "type"], buckets=QUERY_COUNT_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "crm_cache_requests_total", "In-process cache lookups; hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+TASK_DURATION = Histogram(
+    "crm_celery_task_duration_seconds", "Run time of crm.tasks Celery tasks",
+    ["task", "state"], buckets=TASK_BUCKETS,
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "crm_db_connections_opened_total", "New database connections (pooled or not)",
+    ["alias", "vendor"],
+)
+DB_POOL_REQUESTS = Counter(
+    "crm_db_pool_requests_total", "Connections requested from the pool",
+    ["alias"],
+)
+DB_POOL_QUEUED = Counter(
+    "crm_db_pool_requests_queued_total", "Pool requests that had to wait for a free connection",
+    ["alias"],
+)
+DB_POOL_WAIT = Counter(
+    "crm_db_pool_wait_seconds_total", "Time spent waiting for a pooled connection",
+    ["alias"],
+)
+DB_POOL_ERRORS = Counter(
+    "crm_db_pool_errors_total", "Pool requests that timed out or failed",
+    ["alias"],
+)
+DB_POOL_SIZE = Gauge(
+    "crm_db_pool_size", "Connections held by the pool, busy or idle",
+    ["alias"], multiprocess_mode="livesum",
+)
+DB_POOL_MAX_SIZE = Gauge(
+    "crm_db_pool_max_size", "Configured pool maximum",
+    ["alias"], multiprocess_mode="livesum",
+)
+DB_POOL_AVAILABLE = Gauge(
+    "crm_db_pool_available", "Idle connections in the pool",
+    ["alias"], multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "crm_db_pool_waiting", "Requests currently waiting for a connection",
+    ["alias"], multiprocess_mode="livesum",
+)
+
+
+def multiprocess_enabled():
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render():
+    """
+    (body, content type) for a scrape. Under multi-worker servers every
+    process writes its samples to PROMETHEUS_MULTIPROC_DIR and the scrape
+    merges them, whichever worker answers it.
+    """
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class OperationLabels:
+    """
+    Operation names come from clients, so only well-formed names are used
+    as labels and at most METRICS_MAX_OPERATIONS of them per process;
+    the rest are reported as "<other>".
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def get_limit(self):
+        if self.limit is not None:
+            return self.limit
+        return getattr(settings, "METRICS_MAX_OPERATIONS", DEFAULT_MAX_OPERATIONS)
+
+    def label(self, name):
+        if not name:
+            return ANONYMOUS
+        if not _OPERATION_NAME.match(name):
+            return OTHER
+        with self._lock:
+            if name in self._seen:
+                return name
+            if len(self._seen) >= self.get_limit():
+                return OTHER
+            self._seen.add(name)
+            return name
+
+
+operation_labels = OperationLabels()
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+class GraphQLRequestTracker:
+    """Wall time, SQL time and query count of one GraphQL request."""
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.elapsed = 0.0
+        self.skip = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.db_queries += 1
+
+
+@contextmanager
+def track_graphql_request(request):
+    """
+    Wrap the handling of a /graphql/ request. The view stores the parsed
+    operation on `request.graphql_operation` and the outcome on
+    `request.graphql_errors`; both are read when the block exits.
+    """
+    tracker = GraphQLRequestTracker()
+    started = time.perf_counter()
+    try:
+        with sql_observers.observe(tracker):
+            yield tracker
+    finally:
+        tracker.elapsed = time.perf_counter() - started
+        if not tracker.skip:
+            record_graphql_request(request, tracker, tracker.elapsed)
+
+
+def record_graphql_request(request, tracker, elapsed):
+    operation = getattr(request, "graphql_operation", None)
+    if operation is None:
+        name, kind = None, UNKNOWN
+    else:
+        name = operation.name.value if operation.name else None
+        kind = operation.operation.value
+    labels = {"operation": operation_labels.label(name), "type": kind}
+    status = "error" if getattr(request, "graphql_errors", True) else "ok"
+    GRAPHQL_REQUESTS.labels(status=status, **labels).inc()
+    GRAPHQL_DURATION.labels(**labels).observe(elapsed)
+    GRAPHQL_DB_DURATION.labels(**labels).observe(tracker.db_seconds)
+    GRAPHQL_DB_QUERIES.labels(**labels).observe(tracker.db_queries)
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs):
+    if is_crm_task(task):
+        _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and is_crm_task(task):
+        TASK_DURATION.labels(task=task.name, state=state or UNKNOWN).observe(time.perf_counter() - started)
+        record_pool_stats()
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kwargs):
+    DB_CONNECTIONS_OPENED.labels(alias=connection.alias, vendor=connection.vendor).inc()
+
+
+def pool_stats():
+    """{alias: psycopg pool stats} for the aliases using a connection pool."""
+    stats = {}
+    for alias in connections:
+        # Only pools already opened: the backend's `pool` property opens one
+        pools = getattr(type(connections[alias]), "_connection_pools", {})
+        if alias in pools:
+            stats[alias] = pools[alias].pop_stats()
+    return stats
+
+
+def record_pool_stats(stats=None):
+    """
+    Export pool saturation: size against max_size, idle connections and
+    waiting requests as gauges; requests, queued requests, wait time and
+    errors as counters. psycopg resets its counters on every pop_stats(),
+    so each call adds what happened since the previous one.
+    """
+    for alias, values in (pool_stats() if stats is None else stats).items():
+        DB_POOL_REQUESTS.labels(alias=alias).inc(values.get("requests_num", 0))
+        DB_POOL_QUEUED.labels(alias=alias).inc(values.get("requests_queued", 0))
+        DB_POOL_WAIT.labels(alias=alias).inc(values.get("requests_wait_ms", 0) / 1000)
+        DB_POOL_ERRORS.labels(alias=alias).inc(values.get("requests_errors", 0))
+        DB_POOL_SIZE.labels(alias=alias).set(values.get("pool_size", 0))
+        DB_POOL_MAX_SIZE.labels(alias=alias).set(values.get("pool_max", 0))
+        DB_POOL_AVAILABLE.labels(alias=alias).set(values.get("pool_available", 0))
+        DB_POOL_WAITING.labels(alias=alias).set(values.get("requests_waiting", 0))
+
+
+@receiver(request_finished)
+def _request_finished(sender, **kwargs):
+    record_pool_stats()
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:40
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_jobcheckpoint_orderreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField(unique=True)),
+                ('total_customers', models.PositiveIntegerField(default=0)),
+                ('total_orders', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('period_orders', models.PositiveIntegerField(default=0)),
+                ('period_revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('new_customers', models.PositiveIntegerField(default=0)),
+                ('returning_customers', models.PositiveIntegerField(default=0)),
+                ('top_products', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-period_end'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date'], name='crm_order_date_idx'),
+        ),
+    ]
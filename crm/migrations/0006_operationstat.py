@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_order_date_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('operation_name', models.CharField(blank=True, max_length=255)),
+                ('operation_type', models.CharField(max_length=16)),
+                ('normalized_query', models.TextField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('errors', models.PositiveBigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('p50_ms', models.FloatField(default=0)),
+                ('p95_ms', models.FloatField(default=0)),
+                ('p99_ms', models.FloatField(default=0)),
+                ('sql_queries', models.PositiveBigIntegerField(default=0)),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,136 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# On PostgreSQL crm_order_archive is partitioned by month of order_date, so
+# a range filter on order_date (OrderFilter's order_date__gte/lte) only
+# scans the matching months. Monthly partitions are created by
+# archive_orders before it moves orders in; anything else lands in the
+# default partition. crm_order itself is not partitioned: every unique
+# constraint of a partitioned table must include the partition key, and
+# its id is referenced by foreign keys (order products, reminders).
+POSTGRES_ARCHIVE_TABLE = [
+    """
+    CREATE TABLE crm_order_archive (
+        id bigint NOT NULL,
+        customer_id bigint NOT NULL REFERENCES crm_customer (id) DEFERRABLE INITIALLY DEFERRED,
+        order_date timestamp with time zone NOT NULL,
+        total_amount numeric(12, 2) NOT NULL,
+        product_ids jsonb NOT NULL,
+        archived_at timestamp with time zone NOT NULL,
+        PRIMARY KEY (id, order_date)
+    ) PARTITION BY RANGE (order_date)
+    """,
+    "CREATE INDEX crm_archive_cust_date_idx ON crm_order_archive (customer_id, order_date)",
+    "CREATE INDEX crm_archive_date_idx ON crm_order_archive (order_date)",
+    "CREATE TABLE crm_order_archive_default PARTITION OF crm_order_archive DEFAULT",
+]
+
+HISTORY_VIEW = """
+CREATE VIEW crm_order_history AS
+SELECT id, customer_id, order_date, total_amount, {false} AS archived FROM crm_order
+UNION ALL
+SELECT id, customer_id, order_date, total_amount, {true} FROM crm_order_archive
+"""
+
+# Archived product rows get negative ids so they never clash with the M2M table's
+HISTORY_PRODUCTS_VIEW = {
+    "postgresql": """
+CREATE VIEW crm_order_history_products AS
+SELECT id, order_id, product_id FROM crm_order_products
+UNION ALL
+SELECT -(a.id * 1000 + p.position), a.id, p.product_id::bigint
+FROM crm_order_archive a
+CROSS JOIN LATERAL jsonb_array_elements_text(a.product_ids) WITH ORDINALITY AS p(product_id, position)
+""",
+    "sqlite": """
+CREATE VIEW crm_order_history_products AS
+SELECT id, order_id, product_id FROM crm_order_products
+UNION ALL
+SELECT -(a.id * 1000 + j.key), a.id, CAST(j.value AS INTEGER)
+FROM crm_order_archive a, json_each(a.product_ids) j
+""",
+}
+
+
+def create_archive_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in POSTGRES_ARCHIVE_TABLE:
+            schema_editor.execute(statement)
+    else:
+        schema_editor.create_model(apps.get_model("crm", "ArchivedOrder"))
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.execute("DROP TABLE crm_order_archive")
+
+
+def create_history_views(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(HISTORY_VIEW.format(false="FALSE", true="TRUE"))
+        schema_editor.execute(HISTORY_PRODUCTS_VIEW["postgresql"])
+    else:
+        schema_editor.execute(HISTORY_VIEW.format(false="0", true="1"))
+        schema_editor.execute(HISTORY_PRODUCTS_VIEW["sqlite"])
+
+
+def drop_history_views(apps, schema_editor):
+    schema_editor.execute("DROP VIEW crm_order_history_products")
+    schema_editor.execute("DROP VIEW crm_order_history")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_operationstat'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ArchivedOrder',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('order_date', models.DateTimeField()),
+                        ('total_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                        ('product_ids', models.JSONField(default=list)),
+                        ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('customer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_orders', to='crm.customer')),
+                    ],
+                    options={
+                        'db_table': 'crm_order_archive',
+                        'indexes': [models.Index(fields=['customer', 'order_date'], name='crm_archive_cust_date_idx'), models.Index(fields=['order_date'], name='crm_archive_date_idx')],
+                    },
+                ),
+            ],
+        ),
+        # Separately so the state above already has the model for create_model()
+        migrations.RunPython(create_archive_table, drop_archive_table),
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_date', models.DateTimeField()),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'crm_order_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderHistoryProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'db_table': 'crm_order_history_products',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_history_views, drop_history_views),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('order', 'Order'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=16)),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('compacted_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_movements', to='crm.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='crm.product')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('compacted_at__isnull', True)), fields=['product'], name='crm_stock_pending_idx')],
+            },
+        ),
+    ]
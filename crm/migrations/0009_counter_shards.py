@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:14
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Start the counters from the orders already placed, live and archived, in shard 0."""
+    Order = apps.get_model('crm', 'Order')
+    ArchivedOrder = apps.get_model('crm', 'ArchivedOrder')
+    Product = apps.get_model('crm', 'Product')
+    CounterShard = apps.get_model('crm', 'CounterShard')
+    using = schema_editor.connection.alias
+
+    prices = dict(Product.objects.using(using).values_list('pk', 'price'))
+    totals = defaultdict(lambda: [0, Decimal('0')])
+
+    def add(name, amount):
+        totals[name][0] += 1
+        totals[name][1] += amount
+
+    live = {
+        pk: (customer_id, total_amount, [])
+        for pk, customer_id, total_amount in Order.objects.using(using).values_list('pk', 'customer_id', 'total_amount').iterator()
+    }
+    for order_id, product_id in Order.products.through.objects.using(using).values_list('order_id', 'product_id').iterator():
+        live[order_id][2].append(product_id)
+    orders = list(live.values())
+    orders.extend(ArchivedOrder.objects.using(using).values_list('customer_id', 'total_amount', 'product_ids').iterator())
+
+    for customer_id, total_amount, product_ids in orders:
+        add('orders', total_amount)
+        add(f'customer:{customer_id}:orders', total_amount)
+        for product_id in product_ids:
+            if product_id in prices:
+                add(f'product:{product_id}:sales', prices[product_id])
+
+    CounterShard.objects.using(using).bulk_create(
+        [CounterShard(name=name, shard=0, count=count, amount=amount) for name, (count, amount) in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'shard'), name='crm_counter_shard_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,39 @@ from django.core.validators import MinValueValidator, RegexValidator
 from django.utils import timezone
 from decimal import Decimal
 
+
+class CountedQuerySet(models.QuerySet):
+    """
+    with_counters() sets sharded-counter totals (crm.counters) on the
+    fetched objects, or on their `related` object, with one read for the
+    whole result instead of one per object. Clones, slices and prefetches
+    keep doing so.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counters = ()
+
+    def with_counters(self, name_for, count_attr, amount_attr, related=None):
+        """Set `count_attr` and `amount_attr` from the counter `name_for(pk)`."""
+        clone = self._chain()
+        clone._counters += ((name_for, count_attr, amount_attr, related),)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._counters = self._counters
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._counters:
+            from crm import counters
+            for counter in self._counters:
+                counters.attach(self._result_cache, *counter)
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(unique=True)
@@ -18,6 +51,8 @@ class Customer(models.Model):
         )]
     )
 
+    objects = CountedQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -31,6 +66,8 @@ class Product(models.Model):
     )
     stock = models.PositiveIntegerField(default=0)
 
+    objects = CountedQuerySet.as_manager()
+
     def clean(self):
         if self.price is None or self.price <= 0:
             raise ValidationError("Price must be positive.")
@@ -51,21 +88,222 @@ class Order(models.Model):
         Product,
         related_name='product_orders'
     )
-    order_date = models.DateTimeField(auto_now_add=True)
+    order_date = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(
         max_digits=12,
         decimal_places=2,
         # default=0
     )
 
+    objects = CountedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'order_date'], name='crm_order_cust_date_idx'),
+            models.Index(fields=['order_date'], name='crm_order_date_idx'),
+        ]
+
     def update_total_amount(self):
         self.total_amount = sum(product.price for product in self.products.all())
         self.save(update_fields=['total_amount'])
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.update_total_amount()
-
     def __str__(self):
         product_names = ", ".join(self.products.values_list('name', flat=True))
         return f"Order {self.pk} by {self.customer.name} | Cart: [{product_names}] | Total: GH₵{self.total_amount}"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger. Reservations and restocks insert a row
+    instead of updating the product, so they never wait on each other.
+    Current stock is Product.stock (the snapshot) plus the deltas not yet
+    compacted into it; compacted rows stay as the audit trail.
+    """
+    ORDER = 'order'
+    RESTOCK = 'restock'
+    ADJUSTMENT = 'adjustment'
+    REASONS = [(ORDER, 'Order'), (RESTOCK, 'Restock'), (ADJUSTMENT, 'Adjustment')]
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_movements'
+    )
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=16, choices=REASONS)
+    source = models.CharField(max_length=100, blank=True)
+    # Not a constraint: archived orders keep their ids but leave crm_order
+    order = models.ForeignKey(
+        'Order',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='stock_movements'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    compacted_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['product'],
+                condition=models.Q(compacted_at__isnull=True),
+                name='crm_stock_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} {self.product_id} ({self.reason})"
+
+
+class ArchivedOrder(models.Model):
+    """
+    An order moved out of crm_order by `manage.py archive_orders`. One
+    compact row per order: the product ids replace the M2M rows. On
+    PostgreSQL the table is range partitioned by month of order_date.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.PROTECT,
+        related_name='archived_orders'
+    )
+    order_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    product_ids = models.JSONField(default=list)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'crm_order_archive'
+        indexes = [
+            models.Index(fields=['customer', 'order_date'], name='crm_archive_cust_date_idx'),
+            models.Index(fields=['order_date'], name='crm_archive_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.pk} ({self.order_date:%Y-%m-%d})"
+
+
+class OrderHistory(models.Model):
+    """
+    Read-only view over live and archived orders (crm_order UNION ALL
+    crm_order_archive), with the same field names as Order so the same
+    filters, ordering and prefetching apply.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    products = models.ManyToManyField(Product, through='OrderHistoryProduct', related_name='+')
+    order_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    archived = models.BooleanField()
+
+    objects = CountedQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = 'crm_order_history'
+
+
+class OrderHistoryProduct(models.Model):
+    """View over crm_order_products and the product ids of archived orders."""
+    order = models.ForeignKey(OrderHistory, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+
+    class Meta:
+        managed = False
+        db_table = 'crm_order_history_products'
+
+
+class CounterShard(models.Model):
+    """
+    One of up to COUNTER_SHARDS rows of a named counter (see crm.counters).
+    Writers add to a random shard, so a hot counter is spread over several
+    rows instead of serializing on one; readers sum the shards.
+    """
+    name = models.CharField(max_length=100)
+    shard = models.PositiveSmallIntegerField()
+    count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'shard'], name='crm_counter_shard_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}[{self.shard}] = {self.count} / {self.amount}"
+
+
+class JobCheckpoint(models.Model):
+    """High-water mark for incremental jobs (last processed id/date)."""
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    last_timestamp = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+class OrderReminder(models.Model):
+    """One row per order a reminder was sent for; makes reruns idempotent."""
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='reminder'
+    )
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Reminder for order {self.order_id} sent {self.sent_at:%Y-%m-%d %H:%M}"
+
+
+class ReportSnapshot(models.Model):
+    """
+    Weekly CRM report. Cumulative totals are carried forward from the
+    previous snapshot plus the week's delta.
+    """
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField(unique=True)
+    total_customers = models.PositiveIntegerField(default=0)
+    total_orders = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    period_orders = models.PositiveIntegerField(default=0)
+    period_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    new_customers = models.PositiveIntegerField(default=0)
+    returning_customers = models.PositiveIntegerField(default=0)
+    top_products = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-period_end']
+
+    def __str__(self):
+        return f"Report {self.period_start:%Y-%m-%d} - {self.period_end:%Y-%m-%d}: {self.total_orders} orders, GH₵{self.total_revenue}"
+
+
+class OperationStat(models.Model):
+    """
+    Accumulated cost of one normalized GraphQL operation, flushed from the
+    in-memory store of each web process. Percentiles are those of the most
+    recent flush window.
+    """
+    fingerprint = models.CharField(max_length=64, unique=True)
+    operation_name = models.CharField(max_length=255, blank=True)
+    operation_type = models.CharField(max_length=16)
+    normalized_query = models.TextField()
+    count = models.PositiveBigIntegerField(default=0)
+    errors = models.PositiveBigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    p50_ms = models.FloatField(default=0)
+    p95_ms = models.FloatField(default=0)
+    p99_ms = models.FloatField(default=0)
+    sql_queries = models.PositiveBigIntegerField(default=0)
+    rows = models.PositiveBigIntegerField(default=0)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.operation_name or self.fingerprint}: {self.count} calls, {self.total_ms:.0f} ms"
@@ -0,0 +1,159 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import secrets
+import tempfile
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+DEFAULT_HEADER = "X-GraphQL-Profile"
+DEFAULT_MAX_PROFILES = 50
+DEFAULT_TOKEN_MAX_AGE = 3600
+DEFAULT_TOKEN_CACHE = "default"
+TOKEN_SALT = "crm.profiling"
+TOKEN_VALUE = "profile"
+
+
+def get_profile_dir():
+    return getattr(settings, "PROFILE_DIR", os.path.join(settings.BASE_DIR, "profiles"))
+
+
+def make_token():
+    """A token that lets any client profile one request within PROFILE_TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(f"{TOKEN_VALUE}.{secrets.token_urlsafe(16)}")
+
+
+def redeem_token(token):
+    """
+    Whether `token` is validly signed, unexpired and not used before. Its
+    nonce is recorded in the PROFILE_TOKEN_CACHE cache (shared by every
+    process) until it would have expired anyway.
+    """
+    max_age = getattr(settings, "PROFILE_TOKEN_MAX_AGE", DEFAULT_TOKEN_MAX_AGE)
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    kind, _, nonce = value.partition(".")
+    if kind != TOKEN_VALUE or not nonce:
+        return False
+    cache = caches[getattr(settings, "PROFILE_TOKEN_CACHE", DEFAULT_TOKEN_CACHE)]
+    return cache.add(f"crm:profile-token:{nonce}", True, timeout=max_age)
+
+
+def profiling_requested(request):
+    """The profile header is set to "1" by a staff user, or to an unused signed token."""
+    value = request.headers.get(getattr(settings, "PROFILE_HEADER", DEFAULT_HEADER))
+    if not value:
+        return False
+    user = getattr(request, "user", None)
+    if value == "1":
+        return bool(user is not None and user.is_staff)
+    return redeem_token(value)
+
+
+class ProfileStore:
+    """
+    On-disk ring buffer of profiles: `<id>.prof` (pstats dump, loadable by
+    snakeviz, gprof2dot or flameprof) next to `<id>.json` metadata. Ids
+    sort by creation time; beyond `max_profiles` the oldest are deleted.
+    """
+
+    def __init__(self, directory=None, max_profiles=None):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def get_directory(self):
+        return self.directory or get_profile_dir()
+
+    def get_max_profiles(self):
+        if self.max_profiles is not None:
+            return self.max_profiles
+        return getattr(settings, "PROFILE_MAX_PROFILES", DEFAULT_MAX_PROFILES)
+
+    def path(self, profile_id, suffix):
+        return os.path.join(self.get_directory(), f"{profile_id}{suffix}")
+
+    def save(self, profiler, fingerprint, metadata):
+        directory = self.get_directory()
+        os.makedirs(directory, exist_ok=True)
+        profile_id = f"{time.time_ns()}-{fingerprint}"
+        metadata = {"id": profile_id, "fingerprint": fingerprint, **metadata}
+
+        # Write to temporary names first so a listing never sees half a profile
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+            pass
+        profiler.dump_stats(tmp.name)
+        os.replace(tmp.name, self.path(profile_id, ".prof"))
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as tmp:
+            json.dump(metadata, tmp)
+        os.replace(tmp.name, self.path(profile_id, ".json"))
+
+        self.evict()
+        return profile_id
+
+    def ids(self):
+        directory = self.get_directory()
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
+
+    def evict(self):
+        for profile_id in self.ids()[:-self.get_max_profiles() or None]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(self.path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, fingerprint=None):
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for profile_id in reversed(self.ids()):
+            try:
+                with open(self.path(profile_id, ".json")) as f:
+                    metadata = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            if fingerprint is None or metadata["fingerprint"] == fingerprint:
+                profiles.append(metadata)
+        return profiles
+
+    def stats_text(self, profile_id, sort="cumulative", limit=40):
+        out = io.StringIO()
+        stats = pstats.Stats(self.path(profile_id, ".prof"), stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+store = ProfileStore()
+
+
+class RequestProfiler:
+    """cProfile (deterministic) around one request; only the request's thread is profiled."""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.disable()
+        self.elapsed = time.perf_counter() - self.started
+        return False
+
+    def save(self, request, fingerprint, tracker=None):
+        operation = getattr(request, "graphql_operation", None)
+        return store.save(self.profiler, fingerprint or "invalid", {
+            "operation": operation.name.value if operation is not None and operation.name else None,
+            "created": time.time(),
+            "duration_ms": round(self.elapsed * 1000, 3),
+            "sql_queries": tracker.db_queries if tracker is not None else None,
+        })
@@ -0,0 +1,138 @@
+import json
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from crm.sql_observers import capture_queries, observe
+
+logger = logging.getLogger("crm.querybudget")
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\bIN \((?:\s*(?:\?|%s)\s*,?)+\)", re.IGNORECASE), "IN (...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_sql(sql):
+    """SQL with literals replaced, so repeats of one query shape compare equal."""
+    for pattern, replacement in _LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def duplicate_patterns(queries):
+    """[(pattern, count)] for query shapes executed more than once, most frequent first."""
+    counts = Counter(normalize_sql(q["sql"]) for q in queries)
+    return [(pattern, n) for pattern, n in counts.most_common() if n > 1]
+
+
+def describe(queries, limit=5):
+    lines = [f"{len(queries)} queries executed"]
+    for pattern, n in duplicate_patterns(queries)[:limit]:
+        lines.append(f"  {n}x {pattern[:300]}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, label="block"):
+    """
+    Fail with QueryBudgetExceeded if the block runs more than `max_queries`
+    SQL queries, on any database alias; the message lists the repeated
+    query shapes.
+    """
+    with capture_queries() as captured:
+        yield captured
+    if len(captured) > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label} exceeded its budget of {max_queries} queries: " + describe(captured.captured_queries)
+        )
+
+
+class QueryBudgetMixin:
+    """TestCase helpers for GraphQL operations against `crm.schema.schema`."""
+
+    def execute_graphql(self, query, variables=None):
+        from crm.schema import schema
+
+        result = schema.execute(query, variable_values=variables)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def assertGraphQLQueryBudget(self, query, budget, variables=None):
+        with query_budget(budget, label="GraphQL operation"):
+            return self.execute_graphql(query, variables)
+
+    def assertQueryCountConstant(self, query, grow, variables=None):
+        """
+        Run `query`, call `grow()` to add more matching rows, and run it
+        again; the number of SQL queries must not change (no N+1).
+        """
+        with capture_queries() as before:
+            self.execute_graphql(query, variables)
+        grow()
+        with capture_queries() as after:
+            self.execute_graphql(query, variables)
+        if len(after) != len(before):
+            raise QueryBudgetExceeded(
+                f"Query count grew with result size ({len(before)} -> {len(after)}): "
+                + describe(after.captured_queries)
+            )
+
+
+class DuplicateQueryLoggingMiddleware:
+    """
+    DEBUG only: log repeated SQL shapes for every /graphql/ request,
+    labelled with the GraphQL operation name.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path_prefix = getattr(settings, "QUERY_BUDGET_PATH_PREFIX", "/graphql")
+        self.threshold = getattr(settings, "QUERY_BUDGET_DUPLICATE_THRESHOLD", 2)
+
+    def __call__(self, request):
+        if not request.path.startswith(self.path_prefix):
+            return self.get_response(request)
+
+        sqls = []
+
+        def record(execute, sql, params, many, context):
+            sqls.append({"sql": sql})
+            return execute(sql, params, many, context)
+
+        with observe(record):
+            response = self.get_response(request)
+
+        repeated = [(p, n) for p, n in duplicate_patterns(sqls) if n >= self.threshold]
+        if repeated:
+            logger.warning(
+                "Operation %s ran %s queries with repeated shapes:\n%s",
+                operation_name(request),
+                len(sqls),
+                "\n".join(f"  {n}x {pattern[:300]}" for pattern, n in repeated),
+            )
+        return response
+
+
+def operation_name(request):
+    name = request.GET.get("operationName")
+    if name:
+        return name
+    if request.content_type == "application/json":
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return "<invalid>"
+        if isinstance(body, dict):
+            return body.get("operationName") or "<anonymous>"
+    return request.POST.get("operationName") or "<anonymous>"
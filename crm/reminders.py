@@ -0,0 +1,149 @@
+import logging
+import time
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from crm.models import JobCheckpoint, OrderReminder
+
+logger = logging.getLogger("order_reminders")
+
+CHECKPOINT_NAME = "order_reminders"
+DEFAULT_CHANNEL = "log"
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_RATE_LIMITS = {
+    "log": "1000/s",
+}
+DEFAULT_RATE_CACHE = "default"
+
+_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_rate(rate):
+    """Turn a Celery-style rate ("10/s", "600/m", "5000/h") into tokens per second."""
+    count, _, unit = str(rate).partition("/")
+    return float(count) / _UNITS[unit or "s"]
+
+
+class SharedRateLimit:
+    """
+    A rate shared by every process that uses the same cache (e.g. Redis).
+
+    Time is cut into fixed windows of at least a second, each allowing
+    `rate` times its length; acquire() counts against the current window's
+    cache key and sleeps into the next window once it is full.
+    """
+
+    def __init__(self, key, rate, cache, clock=time.time, sleep=time.sleep):
+        self.key = key
+        self.window = max(1.0, 1 / rate)
+        self.limit = max(1, int(rate * self.window))
+        self.cache = cache
+        self._clock = clock
+        self._sleep = sleep
+
+    def acquire(self):
+        """Take one send from the shared rate, sleeping as needed; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            now = self._clock()
+            window = int(now // self.window)
+            key = f"{self.key}:{window}"
+            self.cache.add(key, 0, timeout=int(self.window) + 1)
+            try:
+                if self.cache.incr(key) <= self.limit:
+                    return waited
+            except ValueError:
+                # The window's key expired between add() and incr()
+                continue
+            delay = (window + 1) * self.window - now
+            self._sleep(delay)
+            waited += delay
+
+
+def get_limiter(channel):
+    """
+    Rate limit of a delivery channel from REMINDER_RATE_LIMITS, shared by all
+    workers through the REMINDER_RATE_CACHE cache.
+    """
+    limits = {**DEFAULT_RATE_LIMITS, **getattr(settings, "REMINDER_RATE_LIMITS", {})}
+    cache = caches[getattr(settings, "REMINDER_RATE_CACHE", DEFAULT_RATE_CACHE)]
+    return SharedRateLimit(f"crm:reminders:{channel}", parse_rate(limits[channel]), cache)
+
+
+def _send_via_log(order):
+    logger.info(f"Reminder: Order {order['pk']} for {order['email']}")
+
+
+CHANNELS = {
+    "log": _send_via_log,
+}
+
+
+def send_batch(orders, channel=DEFAULT_CHANNEL):
+    """
+    Deliver reminders for `orders` that have none recorded yet.
+
+    Every delivered reminder is recorded even if a later one fails, so a
+    retry of the same batch never sends a reminder twice.
+    """
+    send = CHANNELS[channel]
+    limiter = get_limiter(channel)
+    already_sent = set(
+        OrderReminder.objects.filter(order_id__in=[o["pk"] for o in orders]).values_list("order_id", flat=True)
+    )
+    delivered = []
+    try:
+        for order in orders:
+            if order["pk"] in already_sent:
+                continue
+            limiter.acquire()
+            send(order)
+            delivered.append(order["pk"])
+    finally:
+        OrderReminder.objects.bulk_create(
+            [OrderReminder(order_id=pk) for pk in delivered],
+            ignore_conflicts=True,
+        )
+    return delivered
+
+
+def advance_checkpoint(last_id, last_timestamp, name=CHECKPOINT_NAME, after_id=None):
+    """
+    Move the watermark forward (never backwards) to `last_id`. With
+    `after_id`, only if the watermark already reached it, so a page that
+    finishes before the pages below it can't skip them.
+    """
+    if isinstance(last_timestamp, str):
+        last_timestamp = datetime.fromisoformat(last_timestamp)
+    with transaction.atomic():
+        checkpoint, _ = JobCheckpoint.objects.select_for_update().get_or_create(name=name)
+        if after_id is not None and checkpoint.last_id < after_id:
+            return checkpoint
+        if last_id > checkpoint.last_id:
+            checkpoint.last_id = last_id
+            checkpoint.last_timestamp = last_timestamp
+            checkpoint.save(update_fields=["last_id", "last_timestamp", "updated_at"])
+    return checkpoint
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def dispatch_reminders(orders, channel=DEFAULT_CHANNEL, batch_size=None, after_id=None):
+    """
+    Fan `orders` out to workers as a chord of send_reminder_batch tasks.
+
+    The chord callback advances the watermark once every batch succeeded
+    (and, with `after_id`, the orders up to it are done); returns the
+    AsyncResult of that callback.
+    """
+    from celery import chord
+    from crm.tasks import send_reminder_batch, finalize_reminders
+
+    batch_size = batch_size or getattr(settings, "REMINDER_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    last = max(orders, key=lambda o: o["pk"])
+    header = [send_reminder_batch.s(batch, channel) for batch in chunked(orders, batch_size)]
+    return chord(header)(finalize_reminders.s(last["pk"], last["order_date"], after_id))
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+from crm.db_router import replica_reads
+from crm.models import Customer, OrderHistory, OrderHistoryProduct, ReportSnapshot
+
+TOP_PRODUCTS = 5
+CENTS = Decimal("0.01")
+
+
+def week_bounds(moment=None):
+    """The last complete Monday-to-Monday week before `moment`."""
+    moment = timezone.localtime(moment or timezone.now())
+    this_monday = (moment - timedelta(days=moment.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return this_monday - timedelta(days=7), this_monday
+
+
+def order_totals(start=None, end=None):
+    """Order count and revenue for orders placed in [start, end), archived ones included, in one query."""
+    orders = OrderHistory.objects.all()
+    if start is not None:
+        orders = orders.filter(order_date__gte=start)
+    if end is not None:
+        orders = orders.filter(order_date__lt=end)
+    totals = orders.aggregate(orders=Count("id"), revenue=Sum("total_amount"))
+    return totals["orders"], totals["revenue"] or Decimal("0")
+
+
+def customer_activity(start, end):
+    """How many customers ordering in [start, end) had ordered before `start`."""
+    in_period = OrderHistory.objects.filter(customer=OuterRef("pk"), order_date__gte=start, order_date__lt=end)
+    before = OrderHistory.objects.filter(customer=OuterRef("pk"), order_date__lt=start)
+    activity = Customer.objects.filter(Exists(in_period)).aggregate(
+        active=Count("pk"),
+        returning=Count("pk", filter=Q(Exists(before))),
+    )
+    return activity["active"] - activity["returning"], activity["returning"]
+
+
+def top_products(start, end, limit=TOP_PRODUCTS):
+    """
+    The most ordered products in [start, end). Revenue comes from the
+    amounts stored with the orders, each order's total split evenly over
+    its products, so a snapshot doesn't change when prices are edited.
+    """
+    lines_per_order = Subquery(
+        OrderHistoryProduct.objects.filter(order=OuterRef("order"))
+        .values("order").annotate(lines=Count("id")).values("lines")
+    )
+    lines = (
+        OrderHistoryProduct.objects
+        .filter(order__order_date__gte=start, order__order_date__lt=end)
+        .values("product_id", "product__name")
+        .annotate(
+            quantity=Count("id"),
+            # Cast: SQLite would divide whole-number totals as integers
+            revenue=Sum(F("order__total_amount") / Cast(lines_per_order, FloatField()), output_field=FloatField()),
+        )
+        .order_by("-quantity", "-revenue", "product_id")[:limit]
+    )
+    return [
+        {
+            "product_id": line["product_id"],
+            "name": line["product__name"],
+            "quantity": line["quantity"],
+            "revenue": str(Decimal(line["revenue"]).quantize(CENTS)),
+        }
+        for line in lines
+    ]
+
+
+def build_snapshot(period_start, period_end):
+    """
+    Compute (or recompute) the snapshot for [period_start, period_end).
+
+    When the previous week's snapshot exists the cumulative totals are that
+    snapshot plus this week's delta; otherwise they are aggregated once
+    from all orders before `period_end`.
+    """
+    with replica_reads():
+        period_orders, period_revenue = order_totals(period_start, period_end)
+        previous = ReportSnapshot.objects.filter(period_end=period_start).first()
+        if previous is not None:
+            total_orders = previous.total_orders + period_orders
+            total_revenue = previous.total_revenue + period_revenue
+        else:
+            total_orders, total_revenue = order_totals(end=period_end)
+        new_customers, returning_customers = customer_activity(period_start, period_end)
+        total_customers = Customer.objects.count()
+        products = top_products(period_start, period_end)
+
+    snapshot, _ = ReportSnapshot.objects.update_or_create(
+        period_end=period_end,
+        defaults={
+            "period_start": period_start,
+            "total_customers": total_customers,
+            "total_orders": total_orders,
+            "total_revenue": total_revenue,
+            "period_orders": period_orders,
+            "period_revenue": period_revenue,
+            "new_customers": new_customers,
+            "returning_customers": returning_customers,
+            "top_products": products,
+        },
+    )
+    return snapshot
+
+
+def build_weekly_snapshot(moment=None):
+    return build_snapshot(*week_bounds(moment))
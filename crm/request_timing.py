@@ -0,0 +1,49 @@
+import json
+import logging
+from django.conf import settings
+
+logger = logging.getLogger("crm.requests")
+
+
+def breakdown(request):
+    """
+    Where a /graphql/ request spent its time, in milliseconds:
+
+    dbTimeMs         SQL, measured by the request's execute_wrapper
+    resolverTimeMs   graphql execution (resolvers and value completion)
+                     minus the SQL run from inside it
+    serializeTimeMs  JSON encoding of the response body
+    """
+    tracker = getattr(request, "graphql_tracker", None)
+    timings = getattr(request, "graphql_timings", {})
+    db_seconds = tracker.db_seconds if tracker is not None else 0.0
+    execute_db_seconds = timings.get("execute_db", 0.0)
+    return {
+        "dbTimeMs": round(db_seconds * 1000, 3),
+        "dbQueries": tracker.db_queries if tracker is not None else 0,
+        "resolverTimeMs": round(max(0.0, timings.get("execute", 0.0) - execute_db_seconds) * 1000, 3),
+        "serializeTimeMs": round(timings.get("serialize", 0.0) * 1000, 3),
+    }
+
+
+def extensions(request):
+    if not getattr(settings, "GRAPHQL_TIMING_EXTENSIONS", True) or not hasattr(request, "graphql_tracker"):
+        return {}
+    return {"timing": breakdown(request)}
+
+
+def log_request(request, fingerprint=None):
+    """One JSON line per request on the crm.requests logger."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    operation = getattr(request, "graphql_operation", None)
+    tracker = request.graphql_tracker
+    logger.info(json.dumps({
+        "event": "graphql_request",
+        "operation": operation.name.value if operation is not None and operation.name else None,
+        "type": operation.operation.value if operation is not None else None,
+        "fingerprint": fingerprint,
+        "errors": getattr(request, "graphql_errors", True),
+        "totalMs": round(tracker.elapsed * 1000, 3),
+        **breakdown(request),
+    }))
@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_MAX_PATHS = 500
+DEFAULT_HEADER = "X-GraphQL-Tracing"
+OVERFLOW_PATH = "<other>"
+
+# Upper bounds of the latency buckets, in milliseconds; the last bucket is +Inf
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; not thread-safe on its own."""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+        }
+
+
+class ResolverStats:
+    """
+    Per-field histograms for this process, keyed by field_path(). At most
+    `max_paths` fields are tracked; fields first seen after that are counted
+    under "<other>".
+    """
+
+    def __init__(self, max_paths=None):
+        self.max_paths = max_paths
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def get_max_paths(self):
+        if self.max_paths is not None:
+            return self.max_paths
+        return getattr(settings, "RESOLVER_TIMING_MAX_PATHS", DEFAULT_MAX_PATHS)
+
+    def observe(self, path, ms):
+        with self._lock:
+            histogram = self._histograms.get(path)
+            if histogram is None:
+                if len(self._histograms) >= self.get_max_paths():
+                    path = OVERFLOW_PATH
+                histogram = self._histograms.setdefault(path, Histogram())
+            histogram.observe(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {path: h.snapshot() for path, h in self._histograms.items()}
+
+    def top(self, limit=10, by="sum_ms"):
+        """The `limit` slowest paths, by total time spent unless `by` says otherwise."""
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1][by], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+stats = ResolverStats()
+
+
+def field_path(info):
+    """
+    Schema field being resolved: OrderType.customer. Aliases and the position
+    in the response are ignored, so `a: allOrders` and `b: allOrders` (and
+    `customer` under any parent path) share one histogram.
+    """
+    return f"{info.parent_type.name}.{info.field_name}"
+
+
+def tracing_requested(request):
+    # Timings reveal something about the data, so only staff get them in production
+    header = getattr(settings, "RESOLVER_TIMING_HEADER", DEFAULT_HEADER)
+    if not request.headers.get(header):
+        return False
+    user = getattr(request, "user", None)
+    return settings.DEBUG or bool(user is not None and user.is_staff)
+
+
+class RequestTrace:
+    """Timing state for one GraphQL request, stored on the HttpRequest."""
+
+    def __init__(self, sampled, tracing):
+        self.sampled = sampled
+        self.tracing = tracing
+        self.started_at = datetime.now(dt_timezone.utc)
+        self.started_ns = time.perf_counter_ns()
+        self.resolvers = []
+
+
+def get_trace(request):
+    trace = getattr(request, "_resolver_trace", None)
+    if trace is None:
+        tracing = request is not None and hasattr(request, "headers") and tracing_requested(request)
+        rate = getattr(settings, "RESOLVER_TIMING_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+        trace = RequestTrace(sampled=tracing or random.random() < rate, tracing=tracing)
+        if request is not None:
+            request._resolver_trace = trace
+    return trace
+
+
+class ResolverTimingMiddleware:
+    """
+    Graphene middleware timing every resolver of a sampled request
+    (RESOLVER_TIMING_SAMPLE_RATE) into `stats`. Requests carrying the
+    RESOLVER_TIMING_HEADER from staff (or under DEBUG) are always sampled
+    and also get an Apollo-tracing breakdown in the response `extensions`.
+
+    Resolvers returning lazy querysets are timed until they return, not
+    until the rows are fetched; that time shows up on the list field.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = get_trace(info.context)
+        if not trace.sampled:
+            return next(root, info, **args)
+
+        started = time.perf_counter_ns()
+        try:
+            return next(root, info, **args)
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            stats.observe(field_path(info), elapsed / 1e6)
+            if trace.tracing:
+                trace.resolvers.append({
+                    "path": info.path.as_list(),
+                    "parentType": info.parent_type.name,
+                    "fieldName": info.field_name,
+                    "returnType": str(info.return_type),
+                    "startOffset": started - trace.started_ns,
+                    "duration": elapsed,
+                })
+
+
+def _iso(moment):
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def extensions(request):
+    """{"tracing": ...} in the Apollo tracing format, or {} if not requested."""
+    trace = getattr(request, "_resolver_trace", None)
+    if trace is None or not trace.tracing:
+        return {}
+    duration = time.perf_counter_ns() - trace.started_ns
+    ended_at = datetime.now(dt_timezone.utc)
+    return {
+        "tracing": {
+            "version": 1,
+            "startTime": _iso(trace.started_at),
+            "endTime": _iso(ended_at),
+            "duration": duration,
+            "execution": {"resolvers": trace.resolvers},
+        }
+    }
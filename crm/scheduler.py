@@ -0,0 +1,186 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from celery.schedules import crontab_parser
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger("crm.scheduler")
+
+
+class CronSchedule:
+    """A five-field crontab expression ("*/5 * * * *")."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid crontab expression: {expression!r}")
+        self.expression = expression
+        self.minutes = crontab_parser(60).parse(fields[0])
+        self.hours = crontab_parser(24).parse(fields[1])
+        self.days_of_month = crontab_parser(31, 1).parse(fields[2])
+        self.months = crontab_parser(12, 1).parse(fields[3])
+        self.days_of_week = crontab_parser(7).parse(fields[4])
+
+    def _day_matches(self, moment):
+        dom = moment.day in self.days_of_month
+        dow = (moment.weekday() + 1) % 7 in self.days_of_week
+        # cron semantics: when both day fields are restricted, either may match
+        if len(self.days_of_month) < 31 and len(self.days_of_week) < 7:
+            return dom or dow
+        return dom and dow
+
+    def next_after(self, moment):
+        """First matching minute strictly after `moment`."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                month_start = candidate.replace(day=1, hour=0, minute=0)
+                candidate = (month_start + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Crontab expression never fires: {self.expression!r}")
+
+
+class ScheduledJob:
+    def __init__(self, expression, path, args=(), kwargs=None):
+        self.schedule = CronSchedule(expression)
+        self.path = path
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.name = path if not args else f"{path}{self.args}"
+        self.next_run = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = None
+        self._func = None
+        self._running = threading.Lock()
+
+    @property
+    def func(self):
+        if self._func is None:
+            self._func = import_string(self.path)
+        return self._func
+
+    def plan(self, now, jitter=0):
+        self.next_run = self.schedule.next_after(now)
+        if jitter:
+            self.next_run += timedelta(seconds=random.uniform(0, jitter))
+
+    def run(self):
+        """Run once unless the previous run is still going; returns False when skipped."""
+        if not self._running.acquire(blocking=False):
+            self.skipped += 1
+            logger.warning("Skipping %s: previous run still in progress", self.name)
+            return False
+        close_old_connections()
+        started = time.monotonic()
+        try:
+            self.func(*self.args, **self.kwargs)
+        except Exception:
+            self.failures += 1
+            logger.exception("Job %s failed", self.name)
+        finally:
+            elapsed = time.monotonic() - started
+            self.runs += 1
+            self.last_seconds = elapsed
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            close_old_connections()
+            self._running.release()
+        logger.info("Job %s finished in %.3fs", self.name, elapsed)
+        return True
+
+    def stats(self):
+        return {
+            "job": self.name,
+            "schedule": self.schedule.expression,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_seconds": self.last_seconds,
+            "avg_seconds": self.total_seconds / self.runs if self.runs else None,
+            "max_seconds": self.max_seconds,
+            "next_run": self.next_run,
+        }
+
+
+def jobs_from_cronjobs(cronjobs):
+    """Build jobs from django-crontab style entries: (schedule, path[, args[, kwargs]])."""
+    jobs = []
+    for entry in cronjobs:
+        expression, path, *rest = entry
+        args = rest[0] if len(rest) > 0 else ()
+        kwargs = rest[1] if len(rest) > 1 else {}
+        jobs.append(ScheduledJob(expression, path, args, kwargs))
+    return jobs
+
+
+class Scheduler:
+    """
+    Runs crontab-scheduled callables inside one long-lived process.
+
+    Each job runs on a worker thread so a slow job never delays the others,
+    and a job is never started while its previous run is still going.
+    """
+
+    def __init__(self, jobs, jitter=0, max_workers=4, clock=timezone.localtime):
+        self.jobs = jobs
+        self.jitter = jitter
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crm-scheduler")
+        self._stop = threading.Event()
+        now = clock()
+        for job in jobs:
+            job.plan(now, jitter)
+
+    def tick(self, now=None):
+        """Submit every job that is due at `now`; returns the futures."""
+        now = now or self.clock()
+        futures = []
+        for job in self.jobs:
+            if job.next_run <= now:
+                futures.append(self.executor.submit(job.run))
+                job.plan(now, self.jitter)
+        return futures
+
+    def seconds_until_next(self, now=None):
+        now = now or self.clock()
+        upcoming = min(job.next_run for job in self.jobs)
+        return max(0.0, (upcoming - now).total_seconds())
+
+    def run_forever(self, stats_interval=3600):
+        last_stats = time.monotonic()
+        while not self._stop.is_set():
+            self.tick()
+            if time.monotonic() - last_stats >= stats_interval:
+                self.log_stats()
+                last_stats = time.monotonic()
+            # Wake at least once a minute so clock jumps are noticed
+            self._stop.wait(min(self.seconds_until_next(), 60))
+
+    def request_stop(self):
+        """Ask run_forever() to return after the current tick (signal-safe)."""
+        self._stop.set()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self.executor.shutdown(wait=wait)
+
+    def log_stats(self):
+        for job in self.jobs:
+            logger.info("Job stats: %s", job.stats())
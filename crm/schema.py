@@ -1,33 +1,131 @@
 import re
 import graphene
+from graphene.types.generic import GenericScalar
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
-from crm.models import Product, Customer, Order
+from crm import counters, inventory
+from crm.models import Product, Customer, Order, OrderHistory, ReportSnapshot
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from decimal import Decimal
 from crm.filters import CustomerFilter, ProductFilter, OrderFilter
-from graphql import GraphQLError
+from graphql import FieldNode, FragmentSpreadNode, GraphQLError
+
+def selects(info, *names):
+    """Whether the selection below the current field asks for any of `names`."""
+    pending = [node.selection_set for node in info.field_nodes]
+    while pending:
+        selection_set = pending.pop()
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FragmentSpreadNode):
+                pending.append(info.fragments[selection.name.value].selection_set)
+                continue
+            if isinstance(selection, FieldNode) and selection.name.value in names:
+                return True
+            pending.append(selection.selection_set)
+    return False
+
+
+CUSTOMER_COUNTERS = (counters.customer_orders, "order_count", "total_spent")
+PRODUCT_COUNTERS = (counters.product_sales, "times_ordered", "revenue")
+
+
+def with_customer_counters(queryset, info, related=None):
+    """Read the customer counters of a whole list at once, if the query asks for them."""
+    if selects(info, "orderCount", "totalSpent"):
+        queryset = queryset.with_counters(*CUSTOMER_COUNTERS, related=related)
+    return queryset
+
 
 class CustomerType(DjangoObjectType):
+    # From sharded counters, cached for a few seconds (crm.counters). Not
+    # via get_queryset: graphene-django would then refetch every order's
+    # customer through it
+    order_count = graphene.Int()
+    total_spent = graphene.Float()
+
+    def resolve_order_count(parent, info):
+        return counters.read_attached(parent, *CUSTOMER_COUNTERS)[0]
+
+    def resolve_total_spent(parent, info):
+        return counters.read_attached(parent, *CUSTOMER_COUNTERS)[1]
+
     class Meta:
         model = Customer
         fields = "__all__"
+        interfaces = (graphene.relay.Node,)
 
 class ProductType(DjangoObjectType):
+    stock = graphene.Int()
+    times_ordered = graphene.Int()
+    revenue = graphene.Float()
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        queryset = inventory.with_current_stock(queryset)
+        if selects(info, "timesOrdered", "revenue"):
+            queryset = queryset.with_counters(*PRODUCT_COUNTERS)
+        return queryset
+
+    def resolve_stock(parent, info):
+        # Current stock: the snapshot plus movements not yet compacted
+        current = getattr(parent, "current_stock", None)
+        return current if current is not None else inventory.current_stock([parent.pk])[parent.pk]
+
+    def resolve_times_ordered(parent, info):
+        return counters.read_attached(parent, *PRODUCT_COUNTERS)[0]
+
+    def resolve_revenue(parent, info):
+        return counters.read_attached(parent, *PRODUCT_COUNTERS)[1]
+
     class Meta:
         model = Product
         fields = "__all__"
+        interfaces = (graphene.relay.Node,)
 
 class OrderType(DjangoObjectType):
     orderDate = graphene.DateTime(source="order_date")
-    
-    def resolve_product(parent, info):
-        return self.products.first()
-    
+    products = graphene.List(ProductType)
+    total_amount = graphene.Float()
+    archived = graphene.Boolean()
+
+    @classmethod
+    def is_type_of(cls, root, info):
+        # allOrders(includeArchived: true) lists OrderHistory rows
+        return isinstance(root, OrderHistory) or super().is_type_of(root, info)
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        # Customer and products are read for almost every order listed;
+        # fetch them up front instead of once per order (N+1).
+        queryset = queryset.select_related("customer").prefetch_related(
+            Prefetch("products", queryset=ProductType.get_queryset(Product.objects.all(), info)),
+        )
+        return with_customer_counters(queryset, info, related="customer")
+
+    def resolve_products(parent, info):
+        return parent.products.all()
+
+    def resolve_archived(parent, info):
+        return getattr(parent, "archived", False)
+
     class Meta:
         model = Order
         fields = "__all__"
+        interfaces = (graphene.relay.Node,)
+
+class ReportSnapshotType(DjangoObjectType):
+    top_products = GenericScalar()
+    total_revenue = graphene.Float()
+    period_revenue = graphene.Float()
+
+    class Meta:
+        model = ReportSnapshot
+        fields = "__all__"
 
 class CustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -108,7 +206,7 @@ class CreateProduct(graphene.Mutation):
         try:
             product = Product(
                 name=input.name,
-                price=Decimal(input.price),
+                price=Decimal(str(input.price)),
                 stock=input.stock if input.stock is not None else 0
             )
             product.full_clean()
@@ -134,15 +232,22 @@ class CreateOrder(graphene.Mutation):
             raise GraphQLError("Invalid product ID")
 
         try:
-            order = Order(
-                customer=customer,
-                order_date=input.order_date or timezone.now(),
-                total_amount=sum(p.price for p in products)
-            )
-            order.full_clean()
-            order.save()
-            order.products.set(products)
+            with transaction.atomic():
+                order = Order(
+                    customer=customer,
+                    order_date=input.order_date or timezone.now(),
+                    total_amount=sum(p.price for p in products)
+                )
+                order.full_clean()
+                order.save()
+                order.products.set(products)
+                inventory.reserve((p.pk for p in products), order=order, source="createOrder")
             return CreateOrder(order=order)
+        except inventory.OutOfStock as e:
+            raise GraphQLError(str(e), extensions={
+                "code": "OUT_OF_STOCK",
+                "productIds": [str(p.pk) for p in e.products],
+            }) from None
         except ValidationError as e:
             raise GraphQLError(str(e)) from None
         except Exception as e:
@@ -150,20 +255,17 @@ class CreateOrder(graphene.Mutation):
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass 
+        source = graphene.String(description="Who restocks, recorded on the stock movements")
 
     success = graphene.String()
     updated_products = graphene.List(ProductType)
 
     @classmethod
-    def mutate(cls, root, info):
-        updated = []
-        low_stock_products = Product.objects.filter(stock__lt=10)
-
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated.append(product)
+    def mutate(cls, root, info, source=""):
+        updated = list(inventory.with_current_stock(Product.objects.all()).filter(current_stock__lt=10))
+        stock = inventory.restock(updated, 10, source=source or "updateLowStockProducts")
+        for product in updated:
+            product.current_stock = stock[product.pk]
 
         return UpdateLowStockProducts(
             success=f"Restocked {len(updated)} products",
@@ -173,19 +275,41 @@ class UpdateLowStockProducts(graphene.Mutation):
 class Query(graphene.ObjectType):
     all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
     all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+    all_orders = DjangoFilterConnectionField(
+        OrderType, filterset_class=OrderFilter, include_archived=graphene.Boolean(default_value=False),
+    )
     customers = graphene.List(CustomerType)
     products = graphene.List(ProductType)
     orders = graphene.List(OrderType)
+    report_snapshots = graphene.List(ReportSnapshotType, last=graphene.Int())
+    latest_report = graphene.Field(ReportSnapshotType)
+
+    def resolve_all_customers(self, info, **kwargs):
+        return with_customer_counters(Customer.objects.all(), info)
 
     def resolve_customers(self, info):
-        return Customer.objects.all()
+        return with_customer_counters(Customer.objects.all(), info)
 
     def resolve_products(self, info):
-        return Product.objects.all()
+        return ProductType.get_queryset(Product.objects.all(), info)
+
+    def resolve_all_orders(self, info, include_archived=False, **kwargs):
+        # Archived orders are read only when asked for: the union costs more
+        return OrderHistory.objects.all() if include_archived else Order.objects.all()
 
     def resolve_orders(self, info):
-        return Order.objects.all()
+        return OrderType.get_queryset(Order.objects.all(), info)
+
+    def resolve_report_snapshots(self, info, last=None):
+        snapshots = ReportSnapshot.objects.all()
+        if last is None:
+            return snapshots
+        if last < 1:
+            raise GraphQLError("last must be a positive number")
+        return snapshots[:last]
+
+    def resolve_latest_report(self, info):
+        return ReportSnapshot.objects.first()
 
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+from collections import namedtuple
+from django.conf import settings
+from graphql import get_introspection_query, graphql_sync, print_schema
+from crm import metrics
+
+logger = logging.getLogger("crm.schema_artifacts")
+
+SDL_FILENAME = "schema.graphql"
+INTROSPECTION_FILENAME = "schema.json"
+
+SchemaArtifacts = namedtuple("SchemaArtifacts", ["sdl", "introspection", "etag"])
+
+_artifacts = None
+
+
+def get_artifact_dir():
+    return getattr(
+        settings,
+        "GRAPHQL_SCHEMA_ARTIFACT_DIR",
+        os.path.join(settings.BASE_DIR, "graphql_schema"),
+    )
+
+
+def build_artifacts(schema=None):
+    """Run the introspection query and print the SDL for `schema` once."""
+    if schema is None:
+        from crm.schema import schema
+    result = graphql_sync(schema.graphql_schema, get_introspection_query(descriptions=True))
+    if result.errors:
+        raise RuntimeError(f"Introspection failed: {result.errors[0]}")
+    sdl = print_schema(schema.graphql_schema)
+    return SchemaArtifacts(sdl, result.data, _etag(sdl))
+
+
+def _etag(sdl):
+    return '"%s"' % hashlib.sha256(sdl.encode()).hexdigest()[:32]
+
+
+def write_artifacts(artifacts, directory=None):
+    directory = directory or get_artifact_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SDL_FILENAME), "w") as f:
+        f.write(artifacts.sdl)
+    with open(os.path.join(directory, INTROSPECTION_FILENAME), "w") as f:
+        json.dump({"data": artifacts.introspection}, f, separators=(",", ":"))
+    return directory
+
+
+def read_artifacts(directory=None):
+    """Artifacts written by `export_graphql_schema`, or None if there are none."""
+    directory = directory or get_artifact_dir()
+    try:
+        with open(os.path.join(directory, SDL_FILENAME)) as f:
+            sdl = f.read()
+        with open(os.path.join(directory, INTROSPECTION_FILENAME)) as f:
+            introspection = json.load(f)["data"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return SchemaArtifacts(sdl, introspection, _etag(sdl))
+
+
+def load_artifacts(schema=None):
+    """
+    The deployed files if their ETag matches `schema`'s SDL, otherwise
+    artifacts built from `schema`. Printing the SDL is cheap; only the
+    introspection query is worth skipping.
+    """
+    if schema is None:
+        from crm.schema import schema
+    deployed = read_artifacts()
+    if deployed is None:
+        return build_artifacts(schema)
+    current = _etag(print_schema(schema.graphql_schema))
+    if deployed.etag != current:
+        logger.warning(
+            "Schema artifacts in %s are stale (ETag %s, schema %s): serving a rebuilt schema, "
+            "run export_graphql_schema to refresh them",
+            get_artifact_dir(), deployed.etag, current,
+        )
+        return build_artifacts(schema)
+    return deployed
+
+
+def get_artifacts():
+    """
+    Process-wide cached artifacts, checked against `crm.schema.schema` and
+    loaded on first use.
+    """
+    global _artifacts
+    metrics.record_cache("schema_artifacts", hit=_artifacts is not None)
+    if _artifacts is None:
+        _artifacts = load_artifacts()
+    return _artifacts
+
+
+def reset_artifacts():
+    global _artifacts
+    _artifacts = None
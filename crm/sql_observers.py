@@ -0,0 +1,85 @@
+"""
+Observe the SQL of a block of code on every database alias. GraphQL reads
+run on replicas (e.g. the SQLite read-only alias) as well as on default,
+so wrapping connections["default"] alone misses most of a query's SQL.
+
+One execute_wrapper is installed on each connection as it is created,
+like crm.tracing's; it hands every query to the observers of the current
+context, so observing never touches other threads' queries.
+"""
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_observers = contextvars.ContextVar("crm_sql_observers", default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    # The first observer entered is the outermost
+    for observer in reversed(observers):
+        execute = functools.partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def _install(connection):
+    # At the front, for the same reason as tracing.sql_wrapper
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    _install(connection)
+
+
+@contextmanager
+def observe(wrapper):
+    """Call `wrapper` (an execute_wrapper) for every query the block runs, on any alias."""
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    token = _observers.set(_observers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
+
+
+class CapturedQueries:
+    """Queries run inside capture_queries(), like CaptureQueriesContext's but for all aliases."""
+
+    def __init__(self):
+        self.captured_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.captured_queries.append({
+                "sql": sql,
+                "time": f"{time.perf_counter() - started:.3f}",
+                "alias": context["connection"].alias,
+            })
+
+    def __len__(self):
+        return len(self.captured_queries)
+
+    def __iter__(self):
+        return iter(self.captured_queries)
+
+    def __getitem__(self, index):
+        return self.captured_queries[index]
+
+
+@contextmanager
+def capture_queries():
+    captured = CapturedQueries()
+    with observe(captured):
+        yield captured
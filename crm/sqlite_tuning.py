@@ -0,0 +1,107 @@
+"""
+SQLite connection tuning. `read_only_config` is called from the settings
+modules, so nothing here may touch django.conf.settings at import time.
+"""
+import logging
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger("crm.sqlite")
+
+SQLITE_ENGINE = "django.db.backends.sqlite3"
+READ_ALIAS = "sqlite_read"
+
+# WAL lets readers run alongside the single writer; NORMAL only fsyncs at
+# checkpoints, which in WAL mode is still safe against corruption (a power
+# cut may lose the last transactions, an application crash loses nothing).
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,          # ms to wait for the write lock
+    "cache_size": -20000,          # negative: KiB, so 20 MB per connection
+    "mmap_size": 268435456,        # 256 MB of the file read through mmap
+    "temp_store": "MEMORY",
+}
+
+# What SQLite does without tuning, for benchmarks
+SQLITE_DEFAULTS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "busy_timeout": 5000,
+    "cache_size": -2000,
+    "mmap_size": 0,
+    "temp_store": "DEFAULT",
+}
+
+
+def read_only_config(config):
+    """
+    A second alias on the same SQLite file that can only read (mode=ro,
+    plus PRAGMA query_only). In WAL mode its queries never wait for
+    the writer, so it serves replica_reads() as a replica with no lag.
+    Tests read from default's test database instead.
+    """
+    options = {name: value for name, value in config.get("OPTIONS", {}).items() if name != "transaction_mode"}
+    return {
+        **config,
+        "NAME": f"file:{config['NAME']}?mode=ro",
+        "OPTIONS": options,
+        "TEST": {**config.get("TEST", {}), "MIRROR": "default"},
+    }
+
+
+def read_only_aliases():
+    return list(getattr(settings, "SQLITE_READ_ONLY_ALIASES", []))
+
+
+def pragmas_for(connection):
+    """SQLITE_PRAGMAS over DEFAULT_PRAGMAS (None drops one), adjusted for the alias."""
+    pragmas = {**DEFAULT_PRAGMAS, **getattr(settings, "SQLITE_PRAGMAS", {})}
+    pragmas = {name: value for name, value in pragmas.items() if value is not None}
+    read_only = connection.alias in read_only_aliases()
+    if read_only or connection.is_in_memory_db():
+        # The journal mode is stored in the file and set by the writer
+        pragmas.pop("journal_mode", None)
+    if read_only:
+        pragmas["query_only"] = 1
+    return pragmas
+
+
+def apply_pragmas(connection):
+    # On the raw connection: these are not the application's queries
+    cursor = connection.connection.cursor()
+    try:
+        for name, value in pragmas_for(connection).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+@receiver(connection_created)
+def _tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        apply_pragmas(connection)
+        if connection.alias in read_only_aliases():
+            # BEGIN IMMEDIATE takes the write lock, which a read-only
+            # connection can't; a test mirror copies default's options
+            connection.transaction_mode = None
+
+
+def maintain(connection=None):
+    """
+    PRAGMA optimize (refreshes the statistics the planner needs after the
+    data changed) and a WAL checkpoint that truncates the -wal file, which
+    otherwise only grows while readers keep it busy. Returns
+    (busy, wal pages, checkpointed pages) from the checkpoint.
+    """
+    connection = connection or connections["default"]
+    if connection.vendor != "sqlite" or connection.alias in read_only_aliases() or connection.is_in_memory_db():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA optimize")
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        result = cursor.fetchone()
+    logger.info("SQLite maintenance on %s: checkpoint busy=%s log=%s checkpointed=%s", connection.alias, *result)
+    return result
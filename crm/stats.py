@@ -0,0 +1,5 @@
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -1,7 +1,19 @@
-from django.test import TestCase
+import os
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from unittest import mock, skipUnless
+from crm.celery import app as celery_app
+from crm.tasks import send_reminder_batch
 from graphene.test import Client
+from graphql import print_ast
 from crm.schema import schema
-from crm.models import Customer, Product
+from crm.querybudget import QueryBudgetExceeded, QueryBudgetMixin, normalize_sql, query_budget
+from crm.models import Customer, Product, Order, OrderReminder, JobCheckpoint, ReportSnapshot
 from django.utils import timezone
 
 class GraphQLMutationTests(TestCase):
@@ -118,3 +130,1617 @@ class GraphQLMutationTests(TestCase):
         self.assertEqual(order_data["customer"]["name"], "Dave")
         self.assertEqual(len(order_data["products"]), 2)
         self.assertEqual(order_data["totalAmount"], product1.price + product2.price)
+
+
+class CleanupInactiveCustomersCommandTests(TestCase):
+
+    def setUp(self):
+        product = Product.objects.create(name="Item", price=10, stock=5)
+        self.active = Customer.objects.create(name="Active", email="active@example.com")
+        self.stale = Customer.objects.create(name="Stale", email="stale@example.com")
+        self.never = Customer.objects.create(name="Never", email="never@example.com")
+
+        recent = Order.objects.create(customer=self.active, total_amount=10)
+        recent.products.set([product])
+        old = Order.objects.create(customer=self.stale, total_amount=10)
+        old.products.set([product])
+        Order.objects.filter(pk=old.pk).update(order_date=timezone.now() - timedelta(days=400))
+
+    def test_dry_run_deletes_nothing(self):
+        out = StringIO()
+        call_command("cleanup_inactive_customers", "--dry-run", stdout=out)
+        self.assertIn("2 customers inactive", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_deletes_inactive_customers_in_batches(self):
+        out = StringIO()
+        call_command("cleanup_inactive_customers", "--batch-size", "1", stdout=out)
+        self.assertEqual(list(Customer.objects.values_list("name", flat=True)), ["Active"])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertIn("batch 2", out.getvalue())
+        self.assertIn("Deleted 2 inactive customers and 1 orders", out.getvalue())
+
+
+class SchemaClient:
+    """Minimal stand-in for gql.Client that executes against the local schema."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute(self, request):
+        self.calls += 1
+        result = schema.execute(print_ast(request.document), variable_values=request.variable_values)
+        assert not result.errors, result.errors
+        return result.data
+
+
+@override_settings(REMINDER_RATE_CACHE="default")
+class OrderRemindersTests(TestCase):
+
+    def setUp(self):
+        from crm.cron_jobs import send_order_reminders
+        self.job = send_order_reminders
+        self.customer = Customer.objects.create(name="Eve", email="eve@example.com")
+        self.product = Product.objects.create(name="Item", price=10, stock=5)
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(customer=self.customer, total_amount=10)
+            order.products.set([self.product])
+
+    def test_only_new_orders_are_reminded(self):
+        self.create_orders(5)
+        client = SchemaClient()
+        self.assertEqual(self.job.process_new_orders(client, page_size=2), 5)
+        self.assertEqual(OrderReminder.objects.count(), 5)
+        checkpoint = JobCheckpoint.objects.get(name=self.job.CHECKPOINT_NAME)
+        self.assertEqual(checkpoint.last_id, Order.objects.latest("pk").pk)
+
+        # A rerun with nothing new is a single empty page
+        client = SchemaClient()
+        self.assertEqual(self.job.process_new_orders(client, page_size=2), 0)
+        self.assertEqual(client.calls, 1)
+
+        self.create_orders(1)
+        self.assertEqual(self.job.process_new_orders(SchemaClient(), page_size=2), 1)
+        self.assertEqual(OrderReminder.objects.count(), 6)
+
+    def test_runs_in_process_by_default(self):
+        from crm.graphql_client import LocalClient
+
+        self.create_orders(2)
+        self.assertIsInstance(self.job.get_client(), LocalClient)
+        self.assertEqual(self.job.process_new_orders(self.job.get_client()), 2)
+
+    def test_already_reminded_orders_are_skipped(self):
+        self.create_orders(2)
+        OrderReminder.objects.create(order=Order.objects.earliest("pk"))
+        self.assertEqual(self.job.process_new_orders(SchemaClient()), 1)
+
+    def test_fan_out_dispatches_a_chord_per_page(self):
+        self.create_orders(5)
+        with mock.patch.object(self.job, "dispatch_reminders") as dispatch:
+            self.assertEqual(self.job.process_new_orders(SchemaClient(), page_size=2, fan_out=True), 5)
+        pages = [[o["pk"] for o in c.args[0]] for c in dispatch.call_args_list]
+        ids = list(Order.objects.order_by("pk").values_list("pk", flat=True))
+        self.assertEqual(pages, [ids[:2], ids[2:4], ids[4:]])
+        self.assertEqual([c.kwargs["after_id"] for c in dispatch.call_args_list], [0, ids[1], ids[3]])
+        # Nothing is sent or recorded until the workers run
+        self.assertEqual(OrderReminder.objects.count(), 0)
+
+
+class ReminderPipelineTests(TestCase):
+
+    def setUp(self):
+        self.celery_conf = dict(celery_app.conf)
+        rate_cache = self.settings(REMINDER_RATE_CACHE="default")
+        rate_cache.enable()
+        self.addCleanup(rate_cache.disable)
+        celery_app.conf.update(
+            broker_url="memory://",
+            result_backend="cache+memory://",
+            task_always_eager=True,
+            task_eager_propagates=True,
+        )
+        customer = Customer.objects.create(name="Eve", email="eve@example.com")
+        self.orders = []
+        for _ in range(7):
+            order = Order.objects.create(customer=customer, total_amount=10)
+            self.orders.append({"pk": order.pk, "email": customer.email, "order_date": order.order_date.isoformat()})
+
+    def tearDown(self):
+        celery_app.conf.update(self.celery_conf)
+
+    def test_chord_sends_every_batch_once(self):
+        from crm.reminders import dispatch_reminders
+
+        result = dispatch_reminders(self.orders, batch_size=3)
+        self.assertEqual(result.get(), 7)
+        self.assertEqual(OrderReminder.objects.count(), 7)
+        self.assertEqual(JobCheckpoint.objects.get(name="order_reminders").last_id, self.orders[-1]["pk"])
+
+        # Replaying the same orders is a no-op
+        self.assertEqual(dispatch_reminders(self.orders, batch_size=3).get(), 0)
+
+    def test_watermark_waits_for_the_pages_below(self):
+        from crm.reminders import dispatch_reminders
+
+        first, second = self.orders[:3], self.orders[3:]
+        dispatch_reminders(second, after_id=first[-1]["pk"]).get()
+        self.assertEqual(JobCheckpoint.objects.get(name="order_reminders").last_id, 0)
+        dispatch_reminders(first, after_id=0).get()
+        self.assertEqual(JobCheckpoint.objects.get(name="order_reminders").last_id, first[-1]["pk"])
+        self.assertEqual(OrderReminder.objects.count(), 7)
+
+    def test_failed_batch_is_retried_without_resending(self):
+        from crm import reminders
+
+        calls = []
+
+        def flaky(order):
+            calls.append(order["pk"])
+            if len(calls) == 2:
+                raise ConnectionError("channel down")
+
+        # Eager retries re-run the task inline; the outer attempt ends in RETRY
+        celery_app.conf.task_eager_propagates = False
+        with mock.patch.dict(reminders.CHANNELS, {"log": flaky}):
+            send_reminder_batch.apply((self.orders[:3], "log"))
+        self.assertEqual(sorted(set(calls)), [o["pk"] for o in self.orders[:3]])
+        self.assertEqual(calls.count(self.orders[0]["pk"]), 1)
+        self.assertEqual(OrderReminder.objects.count(), 3)
+
+
+class SharedRateLimitTests(TestCase):
+
+    def test_limiters_share_the_rate_through_the_cache(self):
+        from django.core.cache import caches
+        from crm.reminders import SharedRateLimit, parse_rate
+
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        cache = caches["default"]
+        cache.clear()
+        # Two workers with their own limiter on the same cache
+        workers = [SharedRateLimit("test", parse_rate("2/s"), cache, clock=lambda: now[0], sleep=sleep) for _ in range(2)]
+        for _ in range(3):
+            for worker in workers:
+                worker.acquire()
+        self.assertEqual(parse_rate("600/m"), 10)
+        self.assertAlmostEqual(sum(sleeps), 2.0)
+
+
+class LocalGraphQLClientTests(TestCase):
+
+    def test_executes_query_in_process(self):
+        from crm.graphql_client import LocalClient
+        from gql import gql
+
+        Product.objects.create(name="Low", price=5, stock=3)
+        data = LocalClient().execute(gql("query { products { name stock } }"))
+        self.assertEqual(data, {"products": [{"name": "Low", "stock": 3}]})
+
+    def test_update_low_stock_cron_runs_without_http(self):
+        from crm import cron
+
+        product = Product.objects.create(name="Low", price=5, stock=3)
+        with mock.patch("gql.transport.requests.RequestsHTTPTransport.execute") as http:
+            cron.update_low_stock()
+        http.assert_not_called()
+        from crm import inventory
+        from crm.models import StockMovement
+
+        self.assertEqual(inventory.current_stock([product.pk]), {product.pk: 13})
+        movement = StockMovement.objects.get(product=product)
+        self.assertEqual((movement.delta, movement.reason, movement.source), (10, "restock", "cron.update_low_stock"))
+
+    def test_errors_raise_and_roll_back_mutations(self):
+        from crm.graphql_client import LocalClient
+        from gql import gql
+        from gql.transport.exceptions import TransportQueryError
+
+        with self.assertRaises(TransportQueryError):
+            LocalClient().execute(gql("query { hello }"))
+        with self.assertRaises(TransportQueryError):
+            LocalClient().execute(gql('mutation { createOrder(input: {customerId: "999", productIds: []}) { order { id } } }'))
+
+    def test_http_mode_is_configurable(self):
+        from crm.graphql_client import LocalClient, get_client
+
+        self.assertIsInstance(get_client(), LocalClient)
+        with self.settings(GRAPHQL_CLIENT_MODE="http"):
+            self.assertNotIsInstance(get_client(), LocalClient)
+
+
+class SchemaArtifactTests(TestCase):
+
+    def setUp(self):
+        from crm import schema_artifacts
+        self.artifacts = schema_artifacts
+        schema_artifacts.reset_artifacts()
+        self.addCleanup(schema_artifacts.reset_artifacts)
+
+    def test_schema_endpoints_honour_etag(self):
+        response = self.client.get("/graphql/schema.graphql")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("allOrders", response.content.decode())
+        etag = response["ETag"]
+
+        response = self.client.get("/graphql/schema.graphql", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/graphql/schema.json")
+        self.assertEqual(response["ETag"], etag)
+        self.assertIn("__schema", response.json()["data"])
+
+    def test_export_command_writes_loadable_artifacts(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command("export_graphql_schema", "--output-dir", directory, stdout=StringIO())
+            loaded = self.artifacts.read_artifacts(directory)
+        self.assertEqual(loaded.etag, self.artifacts.build_artifacts().etag)
+
+    def test_stale_artifacts_are_rebuilt(self):
+        import tempfile
+
+        built = self.artifacts.build_artifacts()
+        with tempfile.TemporaryDirectory() as directory:
+            stale = self.artifacts.SchemaArtifacts("type Query { stale: String }", built.introspection, None)
+            self.artifacts.write_artifacts(stale, directory)
+            with self.settings(GRAPHQL_SCHEMA_ARTIFACT_DIR=directory), \
+                    self.assertLogs("crm.schema_artifacts", "WARNING"):
+                served = self.artifacts.get_artifacts()
+        self.assertEqual(served.etag, built.etag)
+        self.assertNotIn("stale", served.sdl)
+
+    def test_current_artifacts_are_served_from_disk(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.artifacts.write_artifacts(self.artifacts.build_artifacts(), directory)
+            with self.settings(GRAPHQL_SCHEMA_ARTIFACT_DIR=directory), \
+                    mock.patch.object(self.artifacts, "graphql_sync") as introspect:
+                served = self.artifacts.get_artifacts()
+        introspect.assert_not_called()
+        self.assertEqual(served.etag, self.artifacts.build_artifacts().etag)
+
+    def test_http_client_uses_local_schema(self):
+        from crm.graphql_client import get_client
+
+        with self.settings(GRAPHQL_CLIENT_MODE="http"):
+            client = get_client()
+        self.assertFalse(client.fetch_schema_from_transport)
+        self.assertIsNotNone(client.schema)
+
+
+class SchedulerTests(TestCase):
+
+    def test_crontab_next_run(self):
+        from datetime import datetime
+        from crm.scheduler import CronSchedule
+
+        start = datetime(2025, 1, 1, 10, 7, 30)
+        self.assertEqual(CronSchedule("*/5 * * * *").next_after(start), datetime(2025, 1, 1, 10, 10))
+        self.assertEqual(CronSchedule("0 */12 * * *").next_after(start), datetime(2025, 1, 1, 12, 0))
+        # 2025-01-01 is a Wednesday; next Sunday 02:00 is the 5th
+        self.assertEqual(CronSchedule("0 2 * * 0").next_after(start), datetime(2025, 1, 5, 2, 0))
+        self.assertEqual(CronSchedule("30 6 1 3 *").next_after(start), datetime(2025, 3, 1, 6, 30))
+
+    def test_due_jobs_run_once_and_record_stats(self):
+        from datetime import datetime
+        from crm.scheduler import Scheduler, jobs_from_cronjobs
+
+        calls = []
+        now = datetime(2025, 1, 1, 10, 0)
+        jobs = jobs_from_cronjobs([("*/5 * * * *", "builtins.print")])
+        jobs[0]._func = lambda: calls.append(1)
+        scheduler = Scheduler(jobs, clock=lambda: now)
+        self.addCleanup(scheduler.stop)
+
+        self.assertEqual(scheduler.tick(now), [])
+        for future in scheduler.tick(datetime(2025, 1, 1, 10, 5)):
+            future.result()
+        self.assertEqual(calls, [1])
+        self.assertEqual(jobs[0].next_run, datetime(2025, 1, 1, 10, 10))
+        self.assertEqual(jobs[0].stats()["runs"], 1)
+
+    def test_overlapping_run_is_skipped(self):
+        import threading
+        from crm.scheduler import ScheduledJob
+
+        release = threading.Event()
+        job = ScheduledJob("* * * * *", "builtins.print")
+        job._func = release.wait
+        worker = threading.Thread(target=job.run)
+        worker.start()
+        try:
+            self.assertFalse(job.run())
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual((job.runs, job.skipped), (1, 1))
+
+    def test_configured_cronjobs_resolve_and_list(self):
+        from django.conf import settings
+        from crm.scheduler import jobs_from_cronjobs
+
+        jobs = jobs_from_cronjobs(settings.CRONJOBS)
+        self.assertTrue(jobs)
+        for job in jobs:
+            self.assertTrue(callable(job.func), job.name)
+
+        out = StringIO()
+        call_command("run_scheduler", "--list", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), len(jobs))
+        self.assertIn("crm.cron.compact_stock", out.getvalue())
+
+
+class SettingsTests(TestCase):
+
+    def test_celery_and_crm_settings_use_the_project_settings(self):
+        import importlib
+        from django.conf import settings
+        from crm.celery import app
+
+        crm_settings = importlib.import_module("crm.settings")
+        for name in ("TRACING_EXPORTERS", "OPERATION_STATS_FLUSH_SECONDS", "COUNTER_SHARDS", "REPLICA_PIN_SECONDS"):
+            self.assertEqual(getattr(crm_settings, name), getattr(settings, name))
+        self.assertIn("replica-heartbeat", app.conf.beat_schedule)
+
+
+class HealthTests(TestCase):
+
+    def setUp(self):
+        from crm import health
+        health.cache.clear()
+        self.addCleanup(health.cache.clear)
+
+    def test_liveness_never_touches_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get("/healthz")
+        self.assertEqual(response.json(), {"status": "ok"})
+
+    def test_readiness_reports_components_and_caches(self):
+        with self.settings(HEALTH_CHECKS=["database", "migrations"]):
+            response = self.client.get("/readyz")
+            self.assertEqual(response.status_code, 200)
+            components = response.json()["components"]
+            self.assertEqual(set(components), {"database", "migrations"})
+            self.assertIn("latency_ms", components["database"])
+
+            with self.assertNumQueries(0):
+                response = self.client.get("/readyz")
+            self.assertTrue(response.json()["components"]["database"]["cached"])
+
+    def test_failing_component_returns_503(self):
+        from crm import health
+
+        with self.settings(HEALTH_CHECKS=["broker"]), \
+                mock.patch.dict(health.CHECKS, {"broker": mock.Mock(side_effect=ConnectionError("down"))}):
+            response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["components"]["broker"]["error"], "down")
+
+    def test_heartbeat_logs_health(self):
+        from crm import cron
+
+        with self.settings(HEALTH_CHECKS=["database"]), self.assertLogs("crm.heartbeat") as logs:
+            cron.log_crm_heartbeat()
+        self.assertIn("CRM is alive - database=ok", logs.output[0])
+
+
+class ReportSnapshotTests(TestCase):
+
+    def setUp(self):
+        from crm import reports
+        self.reports = reports
+        self.week1 = reports.week_bounds(timezone.now() - timedelta(days=7))
+        self.week2 = reports.week_bounds()
+        self.ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.ben = Customer.objects.create(name="Ben", email="ben@example.com")
+        self.pen = Product.objects.create(name="Pen", price=2, stock=100)
+        self.ink = Product.objects.create(name="Ink", price=5, stock=100)
+
+    def order(self, customer, products, when):
+        order = Order.objects.create(customer=customer, total_amount=sum(p.price for p in products))
+        order.products.set(products)
+        Order.objects.filter(pk=order.pk).update(order_date=when)
+        return order
+
+    def test_weekly_snapshots_are_incremental(self):
+        self.order(self.ann, [self.pen], self.week1[0] + timedelta(hours=1))
+        first = self.reports.build_snapshot(*self.week1)
+        self.assertEqual((first.total_orders, first.total_revenue), (1, 2))
+
+        self.order(self.ann, [self.pen, self.ink], self.week2[0] + timedelta(hours=1))
+        self.order(self.ben, [self.pen], self.week2[0] + timedelta(hours=2))
+        second = self.reports.build_snapshot(*self.week2)
+        self.assertEqual((second.total_orders, second.total_revenue), (3, 11))
+        self.assertEqual((second.period_orders, second.period_revenue), (2, 9))
+        self.assertEqual((second.new_customers, second.returning_customers), (1, 1))
+        # Each order's stored total is split over its products: 7 / 2 + 2
+        self.assertEqual(second.top_products[0], {"product_id": self.pen.pk, "name": "Pen", "quantity": 2, "revenue": "5.50"})
+
+        # Totals are carried forward, not recomputed from all orders
+        ReportSnapshot.objects.filter(pk=first.pk).update(total_orders=100)
+        self.assertEqual(self.reports.build_snapshot(*self.week2).total_orders, 102)
+
+    def test_price_edits_do_not_change_top_products(self):
+        self.order(self.ann, [self.pen, self.ink], self.week2[0] + timedelta(hours=1))
+        before = self.reports.top_products(*self.week2)
+        Product.objects.filter(pk=self.pen.pk).update(price=50)
+        self.assertEqual(self.reports.top_products(*self.week2), before)
+        self.assertEqual(sorted(p["revenue"] for p in before), ["3.50", "3.50"])
+
+    def test_report_snapshots_reject_non_positive_last(self):
+        self.reports.build_weekly_snapshot()
+        result = schema.execute("{ reportSnapshots(last: -1) { totalOrders } }")
+        self.assertEqual(result.errors[0].message, "last must be a positive number")
+        result = schema.execute("{ reportSnapshots(last: 1) { totalOrders } }")
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data["reportSnapshots"]), 1)
+
+    def test_latest_report_query(self):
+        self.order(self.ben, [self.ink], self.week2[0] + timedelta(hours=1))
+        self.reports.build_weekly_snapshot()
+        result = schema.execute("{ latestReport { totalOrders totalRevenue newCustomers topProducts } }")
+        self.assertIsNone(result.errors)
+        report = result.data["latestReport"]
+        self.assertEqual((report["totalOrders"], report["totalRevenue"], report["newCustomers"]), (1, 5.0, 1))
+        self.assertEqual(report["topProducts"][0]["name"], "Ink")
+
+
+class BackfillTests(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        start = timezone.now().replace(day=1, hour=12) - timedelta(days=80)
+        for i in range(10):
+            order = Order.objects.create(customer=customer, total_amount=10 + i)
+            Order.objects.filter(pk=order.pk).update(order_date=start + timedelta(days=9 * i))
+
+    def test_partitions_cover_every_order(self):
+        from crm import backfill
+
+        for by in ("id", "date"):
+            parts = backfill.partitions(by, 3)
+            self.assertLessEqual(len(parts), 3)
+            self.assertIsNone(parts[-1][1])
+            counted = sum(row[1] for lo, hi in parts for row in backfill.aggregate_partition(by, lo, hi))
+            self.assertEqual(counted, 10)
+
+    def test_partitioned_run_matches_single_query(self):
+        from crm import backfill
+
+        single = backfill.run(parts=1)
+        for by in ("id", "date"):
+            self.assertEqual(backfill.run(by=by, parts=4), single)
+        self.assertEqual(sum(row[1] for row in single), 10)
+        self.assertEqual(sum(row[2] for row in single), sum(10 + i for i in range(10)))
+
+    def test_command_reconciles_with_snapshot(self):
+        from crm.reports import build_weekly_snapshot
+
+        build_weekly_snapshot()
+        out = StringIO()
+        call_command("backfill_reports", "--period", "week", "--partitions", "3", "--reconcile", stdout=out)
+        self.assertIn("reconciles", out.getvalue())
+
+
+class ParallelBackfillTests(TransactionTestCase):
+    """Worker processes need a database file: they can't see an in-memory one."""
+
+    def setUp(self):
+        import tempfile
+
+        connection = connections["default"]
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            directory = tempfile.TemporaryDirectory()
+            old_name = connection.settings_dict["NAME"]
+            # close() keeps in-memory databases open: set the test database aside
+            connection.ensure_connection()
+            memory, connection.connection = connection.connection, None
+            connection.settings_dict["NAME"] = os.path.join(directory.name, "backfill.sqlite3")
+
+            def restore():
+                connection.close()
+                connection.settings_dict["NAME"] = old_name
+                connection.connection = memory
+                directory.cleanup()
+
+            self.addCleanup(restore)
+            call_command("migrate", verbosity=0)
+            # Workers open the read alias from its settings, not as a test
+            # mirror, so keep their reads on the file above
+            replicas = self.settings(DATABASE_REPLICAS=[])
+            replicas.enable()
+            self.addCleanup(replicas.disable)
+
+        import random
+
+        rng = random.Random(3)
+        customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        last_week = timezone.now() - timedelta(days=10)
+        # Enough large amounts in one week for float sums to drift
+        Order.objects.bulk_create([
+            Order(customer=customer, order_date=last_week, total_amount=Decimal(rng.randint(1, 9999999)) / 100)
+            for _ in range(300)
+        ])
+
+    def test_parallel_backfill_reconciles_to_the_cent(self):
+        from crm import backfill
+        from crm.reports import build_weekly_snapshot
+
+        build_weekly_snapshot()
+        single = backfill.run(period="week")
+        self.assertEqual(backfill.run(period="week", workers=4), single)
+        for _, _, revenue in single:
+            self.assertEqual(revenue.as_tuple().exponent, -2)
+
+        out = StringIO()
+        call_command("backfill_reports", "--period", "week", "--workers", "4", "--reconcile", stdout=out)
+        self.assertIn("reconciles", out.getvalue())
+
+
+class SeedDbCommandTests(TestCase):
+
+    def seed(self, *args):
+        call_command("seed_db", *args, stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by("pk").values_list("name", "phone")),
+            list(Product.objects.order_by("pk").values_list("name", "price", "stock")),
+            sorted(Order.objects.values_list("total_amount", flat=True)),
+        )
+
+    def test_counts_and_through_rows(self):
+        self.seed("--customers", "30", "--products", "7", "--orders", "50", "--batch-size", "8", "--seed", "1")
+        self.assertEqual((Customer.objects.count(), Product.objects.count(), Order.objects.count()), (30, 7, 50))
+        for order in Order.objects.prefetch_related("products"):
+            products = list(order.products.all())
+            self.assertTrue(1 <= len(products) <= 5)
+            self.assertEqual(order.total_amount, sum(p.price for p in products))
+
+    def test_same_seed_is_reproducible(self):
+        self.seed("--customers", "20", "--products", "5", "--orders", "20", "--batch-size", "6", "--seed", "42")
+        first = self.snapshot()
+        Order.objects.all().delete()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        self.seed("--customers", "20", "--products", "5", "--orders", "20", "--batch-size", "6", "--seed", "42")
+        self.assertEqual(self.snapshot()[1], first[1])
+        self.assertEqual([c[0] for c in self.snapshot()[0]], [c[0] for c in first[0]])
+
+    def test_reseeding_does_not_collide(self):
+        self.seed("--customers", "10", "--products", "2", "--orders", "0", "--seed", "3")
+        self.seed("--customers", "10", "--products", "2", "--orders", "0", "--seed", "3")
+        self.assertEqual(Customer.objects.count(), 20)
+
+
+class BenchmarkSuiteTests(TestCase):
+
+    def test_every_operation_runs_and_reports(self):
+        from crm import benchmarks
+
+        counts = {"customers": 10, "products": 5, "orders": 20}
+        results = benchmarks.run_size("tiny", counts, iterations=2)
+        self.assertEqual([r["operation"] for r in results], [op.name for op in benchmarks.OPERATIONS])
+        for result in results:
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["queries"], 0)
+            self.assertGreater(result["peak_memory_kb"], 0)
+
+        rows = benchmarks.compare({"results": results}, {"results": results})
+        self.assertEqual({row["p50_ratio"] for row in rows}, {1.0})
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    ORDERS = """
+    { allOrders(first: 50) { edges { node { id customer { name } products { name } } } } }
+    """
+
+    def add_orders(self, count):
+        product = Product.objects.create(name="Pen", price=1, stock=5)
+        for n in range(count):
+            customer = Customer.objects.create(name=f"C{n}", email=f"qb{n}.{Customer.objects.count()}@example.com")
+            order = Order.objects.create(customer=customer, total_amount=1)
+            order.products.add(product)
+
+    def test_all_orders_query_count_does_not_grow(self):
+        self.add_orders(2)
+        self.assertQueryCountConstant(self.ORDERS, lambda: self.add_orders(10))
+        self.assertGraphQLQueryBudget(self.ORDERS, 3)
+        self.assertGraphQLQueryBudget("{ orders { customer { name } products { name } } }", 3)
+
+    def test_counter_fields_are_read_once_per_list(self):
+        query = """
+        { allOrders(first: 50) { edges { node {
+            customer { orderCount totalSpent } products { timesOrdered revenue } } } }
+          allProducts { edges { node { timesOrdered revenue } } }
+          customers { orderCount } }
+        """
+        self.add_orders(2)
+        # Always read the shards, so both runs miss the cache alike
+        with self.settings(COUNTER_CACHE_TTL=0):
+            self.assertQueryCountConstant(query, lambda: self.add_orders(10))
+            # allOrders 3 + allProducts 2 + customers 1, plus one counter
+            # read per list (orders' customers and products, products, customers)
+            self.assertGraphQLQueryBudget(query, 10)
+
+    def test_budget_failure_lists_repeated_queries(self):
+        self.add_orders(3)
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with query_budget(2):
+                for order in Order.objects.all():
+                    order.customer.name
+        self.assertIn("3x SELECT", str(raised.exception))
+
+    def test_normalize_sql_strips_literals(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id = 42 AND name = 'x' AND pk IN (1, 2, 3)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND pk IN (...)",
+        )
+
+    def test_debug_middleware_logs_repeated_shapes(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory, override_settings
+        from crm.querybudget import DuplicateQueryLoggingMiddleware
+
+        self.add_orders(3)
+
+        def n_plus_one(request):
+            for order in Order.objects.all():
+                order.customer.name
+            return HttpResponse()
+
+        request = RequestFactory().post("/graphql/", {"operationName": "Slow"})
+        with override_settings(DEBUG=True), self.assertLogs("crm.querybudget", "WARNING") as logs:
+            DuplicateQueryLoggingMiddleware(n_plus_one)(request)
+        self.assertIn("Operation Slow", logs.output[0])
+
+
+class ResolverTimingTests(TestCase):
+
+    def setUp(self):
+        from crm import resolver_timing
+
+        self.timing = resolver_timing
+        resolver_timing.stats.reset()
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        order = Order.objects.create(customer=customer, total_amount=5)
+        order.products.add(Product.objects.create(name="Pen", price=5, stock=1))
+
+    def post(self, query="{ allOrders { edges { node { id customer { name } } } } }", **headers):
+        import json
+        from django.test import Client as HttpClient
+
+        body = json.dumps({"query": query})
+        return HttpClient().post("/graphql/", body, content_type="application/json", headers=headers).json()
+
+    def test_sampled_requests_fill_per_path_histograms(self):
+        with self.settings(RESOLVER_TIMING_SAMPLE_RATE=1.0):
+            payload = self.post()
+        self.assertNotIn("tracing", payload["extensions"])
+        fields = self.timing.stats.snapshot()
+        self.assertEqual(fields["CustomerType.name"]["count"], 1)
+        self.assertIn("Query.allOrders", fields)
+
+    def test_aliases_share_the_field_histogram(self):
+        with self.settings(RESOLVER_TIMING_SAMPLE_RATE=1.0):
+            self.post("{ a: allOrders { edges { node { id } } } b: allOrders { edges { node { id } } } }")
+        fields = self.timing.stats.snapshot()
+        self.assertEqual(fields["Query.allOrders"]["count"], 2)
+        self.assertFalse([path for path in fields if path.startswith(("a", "b"))])
+
+    def test_unsampled_requests_are_not_timed(self):
+        with self.settings(RESOLVER_TIMING_SAMPLE_RATE=0):
+            self.post()
+        self.assertEqual(self.timing.stats.snapshot(), {})
+
+    def test_debug_header_returns_apollo_tracing(self):
+        with self.settings(RESOLVER_TIMING_SAMPLE_RATE=0, DEBUG=True):
+            payload = self.post(**{"X-GraphQL-Tracing": "1"})
+        tracing = payload["extensions"]["tracing"]
+        self.assertEqual(tracing["version"], 1)
+        paths = [r["path"] for r in tracing["execution"]["resolvers"]]
+        self.assertIn(["allOrders", "edges", 0, "node", "customer", "name"], paths)
+        self.assertTrue(all(r["duration"] <= tracing["duration"] for r in tracing["execution"]["resolvers"]))
+
+    def test_debug_header_is_ignored_for_anonymous_users_in_production(self):
+        with self.settings(RESOLVER_TIMING_SAMPLE_RATE=0, DEBUG=False):
+            payload = self.post(**{"X-GraphQL-Tracing": "1"})
+        self.assertNotIn("tracing", payload["extensions"])
+
+    def test_path_cardinality_is_bounded(self):
+        stats = self.timing.ResolverStats(max_paths=2)
+        for n in range(5):
+            stats.observe(f"field{n}", 1.0)
+        self.assertEqual(set(stats.snapshot()), {"field0", "field1", self.timing.OVERFLOW_PATH})
+        self.assertEqual(stats.snapshot()[self.timing.OVERFLOW_PATH]["count"], 3)
+
+    def test_histogram_quantiles(self):
+        histogram = self.timing.Histogram()
+        for ms in [0.3] * 90 + [40] * 10:
+            histogram.observe(ms)
+        self.assertEqual(histogram.quantile(0.5), 0.5)
+        self.assertEqual(histogram.quantile(0.99), 40)
+
+
+class MetricsTests(TestCase):
+
+    def sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def scrape(self):
+        from django.test import Client as HttpClient
+
+        response = HttpClient().get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def post(self, query):
+        import json
+        from django.test import Client as HttpClient
+
+        return HttpClient().post("/graphql/", json.dumps({"query": query}), content_type="application/json")
+
+    def test_graphql_requests_are_labelled_by_operation(self):
+        labels = {"operation": "RecentOrders", "type": "query"}
+        before = self.sample("crm_graphql_requests_total", status="ok", **labels)
+        queries_before = self.sample("crm_graphql_db_queries_sum", **labels)
+        self.post("query RecentOrders { allOrders(first: 5) { edges { node { id } } } }")
+        self.post("query RecentOrders { allOrders(first: 5) { edges { node { id } } } }")
+        self.assertEqual(self.sample("crm_graphql_requests_total", status="ok", **labels), before + 2)
+        self.assertGreater(self.sample("crm_graphql_db_queries_sum", **labels), queries_before)
+        self.assertIn('crm_graphql_request_duration_seconds_bucket{le="0.005",operation="RecentOrders",type="query"}', self.scrape())
+
+    def test_errors_and_mutations(self):
+        before = self.sample("crm_graphql_requests_total", operation="<anonymous>", type="mutation", status="error")
+        self.post('mutation { createOrder(input: {customerId: "999", productIds: ["1"]}) { order { id } } }')
+        after = self.sample("crm_graphql_requests_total", operation="<anonymous>", type="mutation", status="error")
+        self.assertEqual(after, before + 1)
+
+    def test_operation_label_cardinality_is_bounded(self):
+        from crm.metrics import OTHER, OperationLabels
+
+        labels = OperationLabels(limit=2)
+        self.assertEqual([labels.label(n) for n in ["A", "B", "C", "A", "bad name!"]], ["A", "B", OTHER, "A", OTHER])
+
+    def test_cache_hits_and_celery_task_durations(self):
+        from crm.schema_artifacts import get_artifacts
+
+        hits = self.sample("crm_cache_requests_total", cache="schema_artifacts", result="hit")
+        get_artifacts()
+        get_artifacts()
+        self.assertGreaterEqual(self.sample("crm_cache_requests_total", cache="schema_artifacts", result="hit"), hits + 1)
+
+        runs = self.sample("crm_celery_task_duration_seconds_count", task="crm.tasks.send_reminder_batch", state="SUCCESS")
+        send_reminder_batch.apply(args=([], "log"))
+        self.assertEqual(
+            self.sample("crm_celery_task_duration_seconds_count", task="crm.tasks.send_reminder_batch", state="SUCCESS"),
+            runs + 1,
+        )
+
+
+class OperationFingerprintTests(TestCase):
+
+    def setUp(self):
+        from crm import fingerprints
+
+        self.fp = fingerprints
+        fingerprints.store.reset()
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        Order.objects.create(customer=customer, total_amount=5)
+        Order.objects.create(customer=customer, total_amount=7)
+
+    def post(self, query, variables=None):
+        import json
+        from django.test import Client as HttpClient
+
+        body = json.dumps({"query": query, "variables": variables or {}})
+        return HttpClient().post("/graphql/", body, content_type="application/json")
+
+    def normalized(self, query):
+        from graphql import parse
+
+        return self.fp.normalize(parse(query))
+
+    def test_literals_aliases_and_field_order_do_not_change_the_fingerprint(self):
+        a = self.normalized('query A { allOrders(first: 5, orderBy: "id") { edges { node { id totalAmount } } } }')
+        b = self.normalized('query B { o: allOrders(orderBy: "-id", first: 50) { edges { node { totalAmount id } } } }')
+        self.assertEqual(a, b)
+        self.assertIn("allOrders(first: $_, orderBy: $_)", a)
+        self.assertNotEqual(a, self.normalized("{ allOrders(first: 5) { edges { node { id } } } }"))
+
+    def test_requests_are_aggregated_per_fingerprint(self):
+        self.post("query Recent { allOrders(first: 5) { edges { node { id } } } }")
+        self.post("query Recent { allOrders(first: 1) { edges { node { id } } } }")
+        self.post("{ allCustomers { edges { node { name } } } }")
+        (key, top), _ = self.fp.store.top(by="count")
+        self.assertEqual(top["count"], 2)
+        self.assertEqual(top["operation_name"], "Recent")
+        self.assertEqual(top["rows"], 3)
+        self.assertGreater(top["sql_queries"], 0)
+        self.assertLessEqual(top["p50_ms"], top["p99_ms"])
+
+    def test_store_is_bounded(self):
+        store = self.fp.OperationStore(max_operations=2)
+        for key in "abc":
+            store.record(key, key, "", "query", 1.0)
+        self.assertEqual([key for key, _ in store.top()], ["b", "c"])
+        self.assertEqual(store.evicted, 1)
+
+    def test_flush_accumulates_into_the_table(self):
+        from crm.models import OperationStat
+
+        for _ in range(2):
+            self.post("query Recent { allOrders { edges { node { id } } } }")
+            self.assertEqual(self.fp.store.flush(), 1)
+        stat = OperationStat.objects.get()
+        self.assertEqual((stat.operation_name, stat.count, stat.rows), ("Recent", 2, 4))
+        out = StringIO()
+        call_command("operation_stats", "--by", "count", stdout=out)
+        self.assertIn(stat.fingerprint, out.getvalue())
+
+    def test_failed_flush_is_logged_and_keeps_the_window(self):
+        import time
+        from django.db import DatabaseError
+        from crm.models import OperationStat
+
+        query = "query Recent { allOrders { edges { node { id } } } }"
+        self.post(query)
+        self.fp.store.last_flush = time.monotonic() - 60
+        with self.settings(OPERATION_STATS_FLUSH_SECONDS=30), \
+                mock.patch.object(OperationStat.objects, "get_or_create", side_effect=DatabaseError("locked")), \
+                self.assertLogs("crm.operation_stats", "ERROR"):
+            response = self.post(query)
+        self.assertEqual(response.status_code, 200)
+        (_, top), = self.fp.store.top()
+        self.assertEqual(top["count"], 2)
+
+        self.assertEqual(self.fp.store.flush(), 1)
+        self.assertEqual(OperationStat.objects.get().count, 2)
+
+    def test_slow_operations_are_logged_with_redacted_variables(self):
+        query = "mutation ($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { order { id } } }"
+        with self.settings(SLOW_OPERATION_MS=0), self.assertLogs("crm.slow_operations", "WARNING") as logs:
+            self.post(query, {"c": "secret-customer", "p": ["1"], "first": 3})
+        self.assertNotIn("secret-customer", logs.output[0])
+        self.assertIn('"first": 3', logs.output[0])
+        self.assertIn('"sql_queries"', logs.output[0])
+
+
+class RequestProfilingTests(TestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from crm import profiling
+
+        self.profiling = profiling
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = self.settings(PROFILE_DIR=self.directory, PROFILE_MAX_PROFILES=2, PROFILE_TOKEN_CACHE="default")
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def post(self, **headers):
+        import json
+        from django.test import Client as HttpClient
+
+        body = json.dumps({"query": "query Recent { allOrders { edges { node { id } } } }"})
+        return HttpClient().post("/graphql/", body, content_type="application/json", headers=headers)
+
+    def test_signed_token_profiles_the_request(self):
+        response = self.post(**{"X-GraphQL-Profile": self.profiling.make_token()})
+        profile_id = response["X-GraphQL-Profile-Id"]
+        [profile] = self.profiling.store.list()
+        self.assertEqual((profile["id"], profile["operation"]), (profile_id, "Recent"))
+        self.assertEqual(len(profile["fingerprint"]), 16)
+
+        out = StringIO()
+        call_command("profiles", "export", profile_id, stdout=out)
+        self.assertIn("function calls", out.getvalue())
+
+    def test_tokens_are_single_use(self):
+        token = self.profiling.make_token()
+        self.assertIn("X-GraphQL-Profile-Id", self.post(**{"X-GraphQL-Profile": token}))
+        self.assertNotIn("X-GraphQL-Profile-Id", self.post(**{"X-GraphQL-Profile": token}))
+        self.assertEqual(len(self.profiling.store.list()), 1)
+
+    def test_header_without_staff_or_valid_token_is_ignored(self):
+        self.assertNotIn("X-GraphQL-Profile-Id", self.post(**{"X-GraphQL-Profile": "1"}))
+        self.assertNotIn("X-GraphQL-Profile-Id", self.post(**{"X-GraphQL-Profile": "profile:forged:sig"}))
+        self.assertEqual(self.profiling.store.list(), [])
+
+    def test_ring_buffer_keeps_the_newest_profiles(self):
+        ids = [self.post(**{"X-GraphQL-Profile": self.profiling.make_token()})["X-GraphQL-Profile-Id"] for _ in range(3)]
+        self.assertEqual([p["id"] for p in self.profiling.store.list()], ids[:0:-1])
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+
+class RequestTimingTests(TestCase):
+
+    def post(self, query, **params):
+        import json
+        from django.test import Client as HttpClient
+
+        path = "/graphql/?" + "&".join(f"{k}={v}" for k, v in params.items())
+        return HttpClient().post(path, json.dumps({"query": query}), content_type="application/json")
+
+    def test_breakdown_is_returned_in_extensions_and_logged(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        Order.objects.create(customer=customer, total_amount=5)
+        with self.assertLogs("crm.requests", "INFO") as logs:
+            response = self.post("query Recent { allOrders { edges { node { id customer { name } } } } }")
+        payload = response.json()
+        timing = payload["extensions"]["timing"]
+        self.assertEqual(set(timing), {"dbTimeMs", "dbQueries", "resolverTimeMs", "serializeTimeMs"})
+        self.assertEqual(timing["dbQueries"], 3)
+        self.assertGreater(timing["resolverTimeMs"], 0)
+        self.assertEqual(len(payload["data"]["allOrders"]["edges"]), 1)
+        self.assertIn('"operation": "Recent"', logs.output[0])
+        self.assertIn('"dbQueries": 3', logs.output[0])
+
+    def test_pretty_and_error_responses_stay_valid_json(self):
+        pretty = self.post("{ allOrders { edges { node { id } } } }", pretty=1)
+        self.assertIn("timing", pretty.json()["extensions"])
+        invalid = self.post("{ nope }")
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(set(invalid.json()), {"errors", "extensions"})
+
+    def test_extensions_can_be_turned_off(self):
+        with self.settings(GRAPHQL_TIMING_EXTENSIONS=False):
+            payload = self.post("{ allOrders { edges { node { id } } } }").json()
+        self.assertNotIn("extensions", payload)
+
+
+class TracingTests(TestCase):
+
+    def setUp(self):
+        from crm import tracing
+
+        self.tracing = tracing
+        override = self.settings(TRACING_EXPORTERS=["memory"], TRACING_SAMPLE_RATE=1.0)
+        override.enable()
+        self.addCleanup(override.disable)
+        tracing.memory_exporter.clear()
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        Order.objects.create(customer=customer, total_amount=5)
+
+    def names(self, spans):
+        return [span.name for span in spans]
+
+    def test_graphql_request_lifecycle_continues_the_incoming_trace(self):
+        import json
+        from django.test import Client as HttpClient
+
+        traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        HttpClient().post(
+            "/graphql/", json.dumps({"query": "query Recent { allOrders { edges { node { customer { name } } } } }"}),
+            content_type="application/json", headers={"traceparent": traceparent},
+        )
+        spans = self.tracing.memory_exporter.trace("4bf92f3577b34da6a3ce929d0e0e4736")
+        by_name = {span.name: span for span in spans}
+        root = by_name["graphql.request"]
+        self.assertEqual(root.parent_id, "00f067aa0ba902b7")
+        self.assertEqual(root.attributes["graphql.operation.name"], "Recent")
+        for phase in ["graphql.parse", "graphql.validate", "graphql.execute", "graphql.serialize"]:
+            self.assertEqual(by_name[phase].parent_id, root.context.span_id)
+        self.assertIn("resolve OrderType.customer", by_name)
+        queries = [span for span in spans if span.name == "db.query"]
+        self.assertTrue(queries)
+        self.assertTrue(all(q.attributes["db.statement"].startswith("SELECT") for q in queries))
+
+    def test_cron_job_and_celery_task_share_a_trace(self):
+        from crm.cron import log_crm_heartbeat
+
+        with self.tracing.span("scheduled report") as parent:
+            log_crm_heartbeat()
+            headers = {}
+            self.tracing._inject_traceparent(headers=headers)
+        self.assertEqual(headers["traceparent"], parent.context.traceparent())
+
+        send_reminder_batch.apply(args=([], "log"), headers=headers)
+        spans = self.tracing.memory_exporter.trace(parent.context.trace_id)
+        by_name = {span.name: span for span in spans}
+        self.assertEqual(by_name["cron.log_crm_heartbeat"].parent_id, parent.context.span_id)
+        task = by_name["celery.task crm.tasks.send_reminder_batch"]
+        self.assertEqual((task.parent_id, task.attributes["celery.state"]), (parent.context.span_id, "SUCCESS"))
+
+    def test_unsampled_and_disabled_tracing_records_nothing(self):
+        with self.settings(TRACING_SAMPLE_RATE=0):
+            with self.tracing.span("root") as root:
+                Customer.objects.count()
+        with self.settings(TRACING_EXPORTERS=[]):
+            with self.tracing.span("root"):
+                Customer.objects.count()
+        self.assertFalse(root.recording)
+        self.assertEqual(list(self.tracing.memory_exporter.spans), [])
+
+    def test_traceparent_parsing(self):
+        context = self.tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00")
+        self.assertFalse(context.sampled)
+        self.assertEqual(context.traceparent(), "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00")
+        self.assertIsNone(self.tracing.parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01"))
+        self.assertIsNone(self.tracing.parse_traceparent("garbage"))
+
+    def test_file_exporter_writes_json_lines(self):
+        import json
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(suffix=".jsonl") as f:
+            with self.settings(TRACING_EXPORTERS=["file"], TRACING_FILE=f.name):
+                with self.tracing.span("outer"):
+                    with self.tracing.span("inner"):
+                        pass
+            lines = [json.loads(line) for line in open(f.name)]
+        self.assertEqual([line["name"] for line in lines], ["inner", "outer"])
+        self.assertEqual(lines[0]["parentSpanId"], lines[1]["spanId"])
+
+
+
+# A second database standing in for a read replica. Its test database is
+# separate from default's, so "replication" is whatever a test copies over.
+REPLICA = "replica_test"
+connections.settings.setdefault(REPLICA, {
+    **connections.settings["default"],
+    "NAME": f"{connections.settings['default']['NAME']}_replica",
+    "TEST": {**connections.settings["default"]["TEST"], "NAME": None},
+})
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    databases = {"default", REPLICA}
+
+    def setUp(self):
+        from crm import db_router
+
+        self.router = db_router
+        override = self.settings(DATABASE_REPLICAS=[REPLICA], REPLICA_MAX_LAG_SECONDS=10)
+        override.enable()
+        self.addCleanup(override.disable)
+        db_router.monitor.reset()
+        self.addCleanup(db_router.monitor.reset)
+        # Only on the "replica": visible iff a read was routed there
+        Customer.objects.using(REPLICA).create(name="Replica Only", email="replica@example.com")
+
+    def replicate_heartbeat(self, age_seconds=0):
+        self.router.write_heartbeat()
+        JobCheckpoint.objects.using(REPLICA).update_or_create(
+            name=self.router.HEARTBEAT_NAME,
+            defaults={"last_timestamp": timezone.now() - timedelta(seconds=age_seconds)},
+        )
+
+    def post(self, client, query):
+        import json
+
+        response = client.post("/graphql/", json.dumps({"query": query}), content_type="application/json")
+        return response, response.json()
+
+    def customer_names(self, client):
+        _, payload = self.post(client, "{ allCustomers { edges { node { name } } } }")
+        return [edge["node"]["name"] for edge in payload["data"]["allCustomers"]["edges"]]
+
+    def test_queries_read_from_a_healthy_replica_and_mutations_write_the_primary(self):
+        from django.test import Client as HttpClient
+
+        self.replicate_heartbeat()
+        client = HttpClient()
+        self.assertEqual(self.customer_names(client), ["Replica Only"])
+
+        response, payload = self.post(client, 'mutation { createCustomer(input: {name: "Ada", email: "ada@example.com"}) { customer { id } } }')
+        self.assertIsNone(payload.get("errors"))
+        self.assertTrue(Customer.objects.using("default").filter(email="ada@example.com").exists())
+        self.assertFalse(Customer.objects.using(REPLICA).filter(email="ada@example.com").exists())
+
+        # The pin cookie keeps this client on the primary: it sees its own write
+        self.assertIn(self.router.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.customer_names(client), ["Ada"])
+        # Other clients are not pinned
+        self.assertEqual(self.customer_names(HttpClient()), ["Replica Only"])
+
+    def test_lagging_or_unreplicated_replica_fails_over_to_the_primary(self):
+        from django.test import Client as HttpClient
+
+        Customer.objects.create(name="Primary", email="primary@example.com")
+        self.assertEqual(self.customer_names(HttpClient()), ["Primary"])
+
+        self.router.monitor.reset()
+        self.replicate_heartbeat(age_seconds=60)
+        self.assertEqual(self.customer_names(HttpClient()), ["Primary"])
+        self.assertEqual(self.router.monitor.status()[REPLICA]["healthy"], False)
+
+        self.router.monitor.reset()
+        self.replicate_heartbeat()
+        self.assertEqual(self.customer_names(HttpClient()), ["Replica Only"])
+
+    def test_health_checks_only_read_and_need_a_fresh_heartbeat(self):
+        from django.db import connection
+        from django.test import Client as HttpClient
+        from django.test.utils import CaptureQueriesContext
+
+        self.replicate_heartbeat()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.customer_names(HttpClient()), ["Replica Only"])
+        self.assertEqual([q["sql"] for q in captured if not q["sql"].startswith("SELECT")], [])
+
+        # The heartbeat task stopped: nothing tells lag from an idle primary
+        JobCheckpoint.objects.filter(name=self.router.HEARTBEAT_NAME).update(
+            last_timestamp=timezone.now() - timedelta(seconds=60),
+        )
+        self.router.monitor.reset()
+        self.assertEqual(self.router.monitor.status()[REPLICA], {"healthy": False, "lag": None, "error": "heartbeat is stale"})
+
+    def test_sqlite_read_only_aliases_are_healthy_without_a_heartbeat(self):
+        with self.settings(DATABASE_REPLICAS=[REPLICA, "sqlite_read"], SQLITE_READ_ONLY_ALIASES=["sqlite_read"]):
+            status = self.router.monitor.refresh()
+        self.assertEqual(status["sqlite_read"], {"healthy": True, "lag": 0.0, "error": None})
+        self.assertEqual(status[REPLICA]["error"], "no heartbeat written yet")
+
+    def test_reads_outside_replica_reads_and_in_transactions_use_the_primary(self):
+        from django.db import transaction
+
+        self.replicate_heartbeat()
+        with self.router.pinned_session():
+            self.assertEqual(Customer.objects.count(), 0)
+            with self.router.replica_reads():
+                self.assertEqual(Customer.objects.count(), 1)
+                with transaction.atomic():
+                    self.assertEqual(Customer.objects.count(), 0)
+                Customer.objects.create(name="Writer", email="writer@example.com")
+                self.assertEqual(Customer.objects.get().name, "Writer")
+            with self.router.replica_reads(read_your_writes=False):
+                self.assertEqual(Customer.objects.get().name, "Replica Only")
+
+
+class ConnectionPoolingTests(TestCase):
+
+    def test_process_type_comes_from_the_environment_or_command_line(self):
+        from crm.db_pool import detect_process_type
+
+        self.assertEqual(detect_process_type(["manage.py", "runserver"], {}), "web")
+        self.assertEqual(detect_process_type(["/venv/bin/celery", "-A", "crm", "worker"], {}), "worker")
+        self.assertEqual(detect_process_type(["/venv/bin/celery", "-A", "crm", "beat"], {}), "scheduler")
+        self.assertEqual(detect_process_type(["manage.py", "run_scheduler"], {}), "scheduler")
+        self.assertEqual(detect_process_type(["gunicorn"], {"CRM_PROCESS_TYPE": "worker"}), "worker")
+
+    def test_postgres_gets_a_pool_sized_per_process_type_and_sqlite_persistent_connections(self):
+        from crm.db_pool import configure_connections
+
+        databases = {
+            "default": {"ENGINE": "django.db.backends.postgresql", "NAME": "crm"},
+            "local": {"ENGINE": "django.db.backends.sqlite3", "NAME": "crm.db"},
+        }
+        configure_connections(databases, "worker", {"web": 10, "worker": 4}, pool_timeout=5, conn_max_age=300)
+        self.assertEqual(databases["default"]["OPTIONS"]["pool"], {"min_size": 2, "max_size": 4, "timeout": 5})
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 0)
+        self.assertEqual(databases["local"]["CONN_MAX_AGE"], 300)
+        self.assertTrue(databases["local"]["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("OPTIONS", databases["local"])
+
+        configure_connections(databases, "scheduler", {"web": 10, "worker": 4})
+        self.assertEqual(databases["default"]["OPTIONS"]["pool"]["max_size"], 4, "explicit pool options are kept")
+        self.assertTrue(connections["default"].settings_dict["CONN_HEALTH_CHECKS"])
+
+    def test_pool_stats_are_exported(self):
+        from prometheus_client import REGISTRY
+        from crm.metrics import record_pool_stats
+
+        def sample(name):
+            return REGISTRY.get_sample_value(name, {"alias": "pooled_test"}) or 0
+
+        requests = sample("crm_db_pool_requests_total")
+        wait = sample("crm_db_pool_wait_seconds_total")
+        record_pool_stats({"pooled_test": {
+            "pool_size": 4, "pool_max": 4, "pool_available": 0, "requests_waiting": 3,
+            "requests_num": 10, "requests_queued": 3, "requests_wait_ms": 250, "requests_errors": 1,
+        }})
+        self.assertEqual(sample("crm_db_pool_requests_total"), requests + 10)
+        self.assertAlmostEqual(sample("crm_db_pool_wait_seconds_total"), wait + 0.25)
+        self.assertEqual(sample("crm_db_pool_waiting"), 3)
+        self.assertEqual(sample("crm_db_pool_available"), 0)
+
+    def test_connection_setup_benchmark(self):
+        from crm import benchmarks
+
+        results = benchmarks.connection_setup(iterations=3)
+        self.assertEqual([r["operation"] for r in results], ["connection_unpooled", "connection_reused"])
+        for result in results:
+            self.assertEqual(result["size"], "connections")
+            self.assertLessEqual(result["p50_ms"], result["max_ms"])
+
+
+class SQLiteTuningTests(TestCase):
+
+    def open(self, alias="tuning_test"):
+        import copy
+        import tempfile
+        from django.db.utils import load_backend
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = copy.deepcopy(connections["default"].settings_dict)
+        settings_dict["NAME"] = os.path.join(directory.name, "tuning.sqlite3")
+        wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        wrapper = self.open()
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 5000)
+        self.assertEqual(self.pragma(wrapper, "temp_store"), 2)  # MEMORY
+
+        with self.settings(SQLITE_PRAGMAS={"synchronous": "FULL", "mmap_size": None}):
+            wrapper.close()
+            self.assertEqual(self.pragma(wrapper, "synchronous"), 2)
+            self.assertEqual(self.pragma(wrapper, "mmap_size"), 0)
+
+    def test_read_only_alias(self):
+        from crm.sqlite_tuning import read_only_config
+
+        config = read_only_config({"ENGINE": "django.db.backends.sqlite3", "NAME": "/srv/crm.db", "TEST": {}})
+        self.assertEqual(config["NAME"], "file:/srv/crm.db?mode=ro")
+        self.assertEqual(config["TEST"]["MIRROR"], "default")
+
+        # BEGIN IMMEDIATE would need the write lock
+        options = {"transaction_mode": "IMMEDIATE", "timeout": 5}
+        config = read_only_config({"ENGINE": "django.db.backends.sqlite3", "NAME": "/srv/crm.db", "OPTIONS": options})
+        self.assertEqual(config["OPTIONS"], {"timeout": 5})
+        self.assertEqual(options["transaction_mode"], "IMMEDIATE")
+
+        wrapper = self.open()
+        wrapper.settings_dict["OPTIONS"]["transaction_mode"] = "IMMEDIATE"
+        with self.settings(SQLITE_READ_ONLY_ALIASES=["tuning_test"]):
+            self.assertEqual(self.pragma(wrapper, "query_only"), 1)
+            self.assertIsNone(wrapper.transaction_mode)
+            with self.assertRaisesMessage(Exception, "readonly"):
+                with wrapper.cursor() as cursor:
+                    cursor.execute("CREATE TABLE t (id integer)")
+
+    def test_maintenance_checkpoints_the_wal(self):
+        from crm.sqlite_tuning import maintain
+
+        wrapper = self.open()
+        with wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (id integer)")
+            cursor.execute("INSERT INTO t VALUES (1)")
+        self.assertEqual(maintain(wrapper), (0, 0, 0))
+        self.assertEqual(os.path.getsize(wrapper.settings_dict["NAME"] + "-wal"), 0)
+        self.assertIsNone(maintain(), "in-memory test databases are skipped")
+
+
+@skipUnless("sqlite_read" in connections, "needs the SQLite read-only alias")
+class ReadAliasQueryCountTests(TransactionTestCase):
+    # Not a TestCase: reads stay on default inside its transaction
+    databases = {"default", "sqlite_read"}
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        pen = Product.objects.create(name="Pen", price=2, stock=10)
+        for _ in range(3):
+            Order.objects.create(customer=customer, total_amount=2).products.add(pen)
+
+    def test_graphql_queries_on_the_read_alias_are_counted(self):
+        import json
+        from django.test import Client as HttpClient
+        from crm.sql_observers import capture_queries
+
+        query = "{ allOrders { edges { node { id customer { name } products { name stock } } } } }"
+        with capture_queries() as captured:
+            payload = HttpClient().post("/graphql/", json.dumps({"query": query}), content_type="application/json").json()
+        self.assertEqual(len(payload["data"]["allOrders"]["edges"]), 3)
+        self.assertIn("sqlite_read", {q["alias"] for q in captured})
+        self.assertGreaterEqual(payload["extensions"]["timing"]["dbQueries"], 3)
+        self.assertEqual(payload["extensions"]["timing"]["dbQueries"], len(captured))
+
+    def test_query_budgets_see_the_read_alias(self):
+        from crm.db_router import replica_reads
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with replica_reads(), query_budget(1):
+                list(Order.objects.prefetch_related("products"))
+
+
+class ConcurrentOrdersBenchmarkTests(TransactionTestCase):
+
+    def test_mixed_load_runs_with_default_and_tuned_pragmas(self):
+        from crm import benchmarks
+
+        call_command("seed_db", "--customers", "5", "--products", "5", "--orders", "5", stdout=StringIO())
+        results = benchmarks.concurrent_orders(threads=1, requests=4)
+        self.assertEqual([r["operation"] for r in results], [
+            "createOrder+allOrders_sqlite_defaults", "createOrder+allOrders_tuned",
+        ])
+        for result in results:
+            self.assertEqual(result["errors"], 0)
+            self.assertGreater(result["throughput_rps"], 0)
+        self.assertEqual(Order.objects.count(), 5 + 2 * 2)
+
+
+class OrderArchiveTests(TestCase):
+
+    def setUp(self):
+        from crm.models import ArchivedOrder
+
+        self.ArchivedOrder = ArchivedOrder
+        self.customer = Customer.objects.create(name="Archie", email="archie@example.com")
+        self.cheap = Product.objects.create(name="Cheap", price=10, stock=5)
+        self.dear = Product.objects.create(name="Dear", price=90, stock=5)
+        self.now = timezone.now()
+        self.old = self.order(self.now - timedelta(days=500), [self.cheap, self.dear])
+        self.older = self.order(self.now - timedelta(days=900), [self.cheap])
+        self.recent = self.order(self.now - timedelta(days=2), [self.dear])
+        OrderReminder.objects.create(order=self.old)
+
+    def order(self, when, products):
+        order = Order.objects.create(customer=self.customer, total_amount=sum(p.price for p in products))
+        order.products.set(products)
+        Order.objects.filter(pk=order.pk).update(order_date=when)
+        return order
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_orders", "--months", "12", *args, stdout=out)
+        return out.getvalue()
+
+    def test_cutoff_is_whole_months(self):
+        from datetime import datetime, timezone as dt_timezone
+        from crm import archive
+
+        now = datetime(2026, 3, 15, 10, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(archive.cutoff(12, now), datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(archive.cutoff(3, now), datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(archive.partition_name(archive.cutoff(3, now)), "crm_order_archive_p202512")
+
+    def test_moves_old_orders_into_compact_rows(self):
+        self.assertIn("[dry run] 2 orders", self.archive("--dry-run"))
+        self.assertEqual(Order.objects.count(), 3)
+
+        out = self.archive("--batch-size", "1")
+        self.assertIn("batch 2", out)
+        self.assertIn("Archived 2 orders", out)
+        self.assertEqual(list(Order.objects.values_list("pk", flat=True)), [self.recent.pk])
+        archived = self.ArchivedOrder.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.product_ids, [self.cheap.pk, self.dear.pk])
+        self.assertEqual(archived.total_amount, 100)
+        self.assertFalse(OrderReminder.objects.exists())
+        self.assertIn("Archived 0 orders", self.archive())
+
+    def test_graphql_reads_the_archive_only_when_asked(self):
+        self.archive()
+        client = Client(schema)
+        query = """
+        query ($archived: Boolean, $since: Date, $product: String) {
+          allOrders(includeArchived: $archived, orderDate_Gte: $since, productName: $product, orderBy: "order_date") {
+            edges { node { id archived totalAmount products { name } } }
+          }
+        }
+        """
+
+        def orders(**variables):
+            result = client.execute(query, variables=variables)
+            self.assertNotIn("errors", result)
+            return [edge["node"] for edge in result["data"]["allOrders"]["edges"]]
+
+        self.assertEqual([o["archived"] for o in orders()], [False])
+        nodes = orders(archived=True)
+        self.assertEqual([o["archived"] for o in nodes], [True, True, False])
+        self.assertEqual([p["name"] for p in nodes[1]["products"]], ["Cheap", "Dear"])
+        since = (self.now - timedelta(days=600)).date().isoformat()
+        self.assertEqual([o["totalAmount"] for o in orders(archived=True, since=since)], [100.0, 90.0])
+        self.assertEqual([o["totalAmount"] for o in orders(archived=True, product="cheap")], [10.0, 100.0])
+
+    def test_reports_and_cleanup_see_archived_orders(self):
+        from crm.reports import order_totals
+
+        self.archive()
+        self.assertEqual(order_totals(), (3, 200))
+
+        call_command("cleanup_inactive_customers", "--days", "30", stdout=StringIO())
+        self.assertTrue(Customer.objects.filter(pk=self.customer.pk).exists())
+        Order.objects.filter(pk=self.recent.pk).delete()
+        call_command("cleanup_inactive_customers", "--days", "30", stdout=StringIO())
+        self.assertFalse(Customer.objects.filter(pk=self.customer.pk).exists())
+        self.assertFalse(self.ArchivedOrder.objects.exists())
+
+
+class InventoryReservationTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        self.pen = Product.objects.create(name="Pen", price=2, stock=2)
+        self.ink = Product.objects.create(name="Ink", price=5, stock=1)
+
+    def order(self, *products):
+        ids = ", ".join(f'"{p.pk}"' for p in products)
+        return Client(schema).execute(f"""
+        mutation {{
+          createOrder(input: {{customerId: "{self.customer.pk}", productIds: [{ids}]}}) {{ order {{ id }} }}
+        }}
+        """)
+
+    def stock(self):
+        from crm import inventory
+
+        return dict(inventory.with_current_stock(Product.objects.all()).values_list("name", "current_stock"))
+
+    def test_orders_reserve_one_unit_of_each_product(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from crm.models import StockMovement
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertNotIn("errors", self.order(self.pen, self.ink))
+        sql = [q["sql"] for q in captured]
+        self.assertEqual(len([q for q in sql if q.startswith("INSERT INTO crm_stockmovement")]), 1)
+        self.assertFalse([q for q in sql if q.startswith('UPDATE "crm_product"')])
+        self.assertEqual(self.stock(), {"Pen": 1, "Ink": 0})
+        # The snapshot only moves on compaction
+        self.assertEqual(dict(Product.objects.values_list("name", "stock")), {"Pen": 2, "Ink": 1})
+        order = Order.objects.get()
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list("product__name", "delta", "reason", "order")),
+            [("Ink", -1, "order", order.pk), ("Pen", -1, "order", order.pk)],
+        )
+
+    def test_out_of_stock_orders_fail_cleanly_and_reserve_nothing(self):
+        result = self.order(self.pen, self.ink)
+        self.assertNotIn("errors", result)
+
+        result = self.order(self.pen, self.ink)
+        error = result["errors"][0]
+        self.assertEqual(error["message"], "Out of stock: Ink")
+        self.assertEqual(error["extensions"], {"code": "OUT_OF_STOCK", "productIds": [str(self.ink.pk)]})
+        self.assertIsNone(result["data"]["createOrder"])
+        self.assertEqual(self.stock(), {"Pen": 1, "Ink": 0})
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_postgresql_orders_lock_every_product_in_id_order(self):
+        from crm import inventory
+
+        with mock.patch.object(inventory, "connection") as connection:
+            connection.vendor = "postgresql"
+            inventory._lock_products([self.ink.pk, self.pen.pk])
+        cursor = connection.cursor.return_value.__enter__.return_value
+        self.assertEqual(
+            [c.args[1][1] for c in cursor.execute.call_args_list],
+            sorted([self.pen.pk, self.ink.pk]),
+        )
+
+    def test_compaction_folds_movements_into_the_snapshot(self):
+        from crm import inventory
+        from crm.models import StockMovement
+
+        self.order(self.pen, self.ink)
+        inventory.restock([self.ink], 5, source="test")
+        self.assertEqual(inventory.compact(batch_size=2), 2)
+        self.assertEqual(self.stock(), {"Pen": 1, "Ink": 5})
+        self.assertEqual(inventory.compact(), 1)
+        self.assertEqual(inventory.compact(), 0)
+
+        self.assertEqual(dict(Product.objects.values_list("name", "stock")), {"Pen": 1, "Ink": 5})
+        self.assertEqual(self.stock(), {"Pen": 1, "Ink": 5})
+        # Compacted movements stay as the audit trail
+        self.assertEqual(StockMovement.objects.filter(compacted_at__isnull=False).count(), 3)
+
+    def test_products_query_reads_current_stock(self):
+        from crm import inventory
+
+        inventory.restock([self.pen], 3)
+        result = Client(schema).execute('query { allProducts(stock_Gte: 5) { edges { node { name stock } } } }')
+        self.assertEqual(result["data"]["allProducts"]["edges"], [{"node": {"name": "Pen", "stock": 5}}])
+
+
+class HotProductBenchmarkTests(TransactionTestCase):
+
+    def test_parallel_orders_never_oversell(self):
+        from crm import benchmarks, inventory
+
+        result = benchmarks.hot_product_orders(threads=2, orders=3)
+        # The in-memory test database locks whole tables, so some orders may
+        # fail with "table is locked" instead of being served
+        self.assertEqual(result["sold"] + result["out_of_stock"] + result["errors"], 6)
+        self.assertLessEqual(result["sold"], result["stock"])
+        self.assertEqual(result["oversold"], 0)
+        product = Product.objects.get()
+        self.assertEqual(inventory.current_stock([product.pk])[product.pk], result["stock"] - result["sold"])
+        self.assertEqual(Order.objects.count(), result["sold"])
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        from crm import counters
+
+        counters.clear_cache()
+        self.counters = counters
+        self.customer = Customer.objects.create(name="Buyer", email="buyer@example.com")
+        self.pen = Product.objects.create(name="Pen", price=2, stock=10)
+        self.ink = Product.objects.create(name="Ink", price=5, stock=10)
+
+    def test_increments_spread_over_shards_and_sum_on_read(self):
+        from crm.models import CounterShard
+
+        with self.settings(COUNTER_SHARDS=4):
+            for _ in range(40):
+                self.counters.increment({"hits": (1, "0.50")})
+        shards = CounterShard.objects.filter(name="hits")
+        self.assertGreater(shards.count(), 1)
+        self.assertLessEqual(shards.count(), 4)
+        self.assertEqual(self.counters.read("hits"), (40, Decimal("20.00")))
+        self.assertEqual(self.counters.read("never written"), (0, 0))
+
+    def test_reads_are_cached_briefly(self):
+        self.assertEqual(self.counters.read("hits"), (0, 0))
+        self.counters.increment({"hits": (1, 0)})
+        self.assertEqual(self.counters.read("hits"), (0, 0))
+        self.assertEqual(self.counters.read("hits", cached=False)[0], 1)
+        with self.settings(COUNTER_CACHE_TTL=0):
+            self.counters.clear_cache()
+            self.counters.increment({"hits": (1, 0)})
+            self.assertEqual(self.counters.read("hits")[0], 2)
+
+    def test_cache_keeps_the_most_recently_read_counters(self):
+        with self.settings(COUNTER_CACHE_SIZE=2):
+            self.counters.read_many(["a", "b"])
+            self.counters.read("a")
+            self.counters.read("c")
+        self.assertEqual(list(self.counters._cache), ["a", "c"])
+
+    def test_orders_count_towards_sales_and_totals(self):
+        for products in ([self.pen, self.ink], [self.pen]):
+            ids = ", ".join(f'"{p.pk}"' for p in products)
+            result = Client(schema).execute(f"""
+            mutation {{
+              createOrder(input: {{customerId: "{self.customer.pk}", productIds: [{ids}]}}) {{ order {{ id }} }}
+            }}
+            """)
+            self.assertNotIn("errors", result)
+
+        result = schema.execute("{ products { name timesOrdered revenue } customers { orderCount totalSpent } }")
+        self.assertIsNone(result.errors)
+        self.assertEqual(
+            sorted((p["name"], p["timesOrdered"], p["revenue"]) for p in result.data["products"]),
+            [("Ink", 1, 5.0), ("Pen", 2, 4.0)],
+        )
+        self.assertEqual(result.data["customers"], [{"orderCount": 2, "totalSpent": 9.0}])
+        self.assertEqual(self.counters.read(self.counters.ORDERS), (2, Decimal("9.00")))
+
+    def test_seed_db_counts_bulk_inserted_orders(self):
+        call_command("seed_db", "--customers", "5", "--products", "4", "--orders", "30", "--seed", "3", stdout=StringIO())
+        orders = Order.objects.aggregate(count=Count("pk"), total=Sum("total_amount"))
+        self.assertEqual(self.counters.read(self.counters.ORDERS, cached=False), (orders["count"], orders["total"]))
+        product = Product.objects.exclude(pk__in=[self.pen.pk, self.ink.pk]).first()
+        self.assertEqual(
+            self.counters.read(self.counters.product_sales(product.pk), cached=False)[0],
+            product.product_orders.count(),
+        )
+
+
+class CounterBenchmarkTests(TransactionTestCase):
+
+    def test_no_increment_is_lost(self):
+        from crm import benchmarks
+
+        results = benchmarks.counter_throughput(threads=2, increments=5)
+        self.assertEqual([r["operation"] for r in results], ["counter_increment_single_row", "counter_increment_sharded"])
+        for result in results:
+            self.assertEqual(result["lost"], 0)
+            self.assertEqual(result["iterations"], 10)
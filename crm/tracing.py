@@ -0,0 +1,284 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from crm.celery import is_crm_task
+
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_MEMORY_SPANS = 10000
+TRACEPARENT = "traceparent"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current = contextvars.ContextVar("crm_current_span", default=None)
+
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value):
+    """SpanContext from a W3C traceparent header, or None if absent or malformed."""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return SpanContext(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+
+def _new_id(hex_digits):
+    return f"{random.getrandbits(hex_digits * 4) or 1:0{hex_digits}x}"
+
+
+class Span:
+    __slots__ = ("name", "context", "parent_id", "kind", "attributes", "start_ns", "end_ns", "status", "_started")
+
+    def __init__(self, name, context, parent_id=None, kind="internal", attributes=None):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self.end_ns = None
+        self.status = "ok"
+
+    @property
+    def recording(self):
+        return self.context.sampled
+
+    def set_attribute(self, key, value):
+        if self.recording:
+            self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.end_ns is not None or not self.recording:
+            return
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._started
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        export(self)
+
+    def to_dict(self):
+        return {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class InMemoryExporter:
+    """Keeps the last `max_spans` finished spans; meant for tests and debugging."""
+
+    def __init__(self, max_spans=DEFAULT_MEMORY_SPANS):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def trace(self, trace_id):
+        return [span for span in self.spans if span.context.trace_id == trace_id]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter:
+    """Appends finished spans as JSON lines; safe across threads and processes (O_APPEND)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = (json.dumps(span.to_dict(), default=str) + "\n").encode()
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+
+memory_exporter = InMemoryExporter()
+_file_exporters = {}
+
+
+def exporters():
+    """Exporters named in TRACING_EXPORTERS ("memory", "file"); tracing is off when empty."""
+    configured = []
+    for name in getattr(settings, "TRACING_EXPORTERS", []):
+        if name == "memory":
+            configured.append(memory_exporter)
+        elif name == "file":
+            path = getattr(settings, "TRACING_FILE", "/tmp/crm_traces.jsonl")
+            configured.append(_file_exporters.setdefault(path, FileExporter(path)))
+    return configured
+
+
+def export(span):
+    for exporter in exporters():
+        exporter.export(span)
+
+
+def enabled():
+    return bool(getattr(settings, "TRACING_EXPORTERS", []))
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, parent=None, kind="internal", attributes=None):
+    """
+    A new span, child of `parent` (a Span or SpanContext) or of the current
+    span. Root spans are sampled at TRACING_SAMPLE_RATE; children follow
+    their parent, and unsampled spans record nothing.
+    """
+    parent = parent if parent is not None else current_span()
+    if isinstance(parent, Span):
+        parent = parent.context
+    if parent is not None:
+        context = SpanContext(parent.trace_id, _new_id(16), parent.sampled and enabled())
+        parent_id = parent.span_id
+    else:
+        sampled = enabled() and random.random() < getattr(settings, "TRACING_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+        context = SpanContext(_new_id(32), _new_id(16), sampled)
+        parent_id = None
+    return Span(name, context, parent_id, kind, attributes if context.sampled else None)
+
+
+@contextmanager
+def span(name, parent=None, kind="internal", attributes=None):
+    """Run the block in a new current span."""
+    new = start_span(name, parent, kind, attributes)
+    token = _current.set(new)
+    try:
+        yield new
+    except BaseException as e:
+        new.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        new.end()
+
+
+def traced(name=None):
+    """Decorator running the function in its own span (a root span when nothing is current)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled() and current_span() is None:
+                return func(*args, **kwargs)
+            with span(name or f"{func.__module__}.{func.__qualname__}"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _recording_parent():
+    parent = _current.get()
+    return parent if parent is not None and parent.context.sampled else None
+
+
+class TracingMiddleware:
+    """Graphene middleware: one span per resolver of a sampled request."""
+
+    def resolve(self, next, root, info, **args):
+        parent = _recording_parent()
+        if parent is None:
+            return next(root, info, **args)
+        with span(f"resolve {info.parent_type.name}.{info.field_name}", parent=parent, attributes={
+            "graphql.field.path": ".".join(str(key) for key in info.path.as_list()),
+        }):
+            return next(root, info, **args)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """execute_wrapper adding a span per SQL query while a sampled span is current."""
+    parent = _recording_parent()
+    if parent is None:
+        return execute(sql, params, many, context)
+    with span("db.query", parent=parent, kind="client", attributes={
+        "db.system": context["connection"].vendor,
+        "db.statement": sql[:1000],
+        "db.executemany": many,
+    }):
+        return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def _install_sql_wrapper(sender, connection, **kwargs):
+    # At the front: execute_wrapper() blocks pop from the end, and a lazy
+    # connect can happen inside one
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, sql_wrapper)
+
+
+@before_task_publish.connect
+def _inject_traceparent(headers=None, **kwargs):
+    current = _current.get()
+    if current is not None and headers is not None:
+        headers.setdefault(TRACEPARENT, current.context.traceparent())
+
+
+_task_spans = {}
+
+
+@task_prerun.connect
+def _start_task_span(task_id=None, task=None, **kwargs):
+    if not is_crm_task(task):
+        return
+    # A published message carries it as a header field; apply(headers=...) nests it
+    header = task.request.get(TRACEPARENT) or (task.request.headers or {}).get(TRACEPARENT)
+    parent = parse_traceparent(header) or _current.get()
+    if parent is None and not enabled():
+        return
+    new = start_span(f"celery.task {task.name}", parent=parent, kind="consumer", attributes={
+        "celery.task_id": task_id,
+        "celery.retries": task.request.retries,
+    })
+    _task_spans[task_id] = (new, _current.set(new))
+
+
+@task_postrun.connect
+def _end_task_span(task_id=None, state=None, **kwargs):
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    new, token = entry
+    new.set_attribute("celery.state", state)
+    if state == "FAILURE":
+        new.status = "error"
+    try:
+        _current.reset(token)
+    except ValueError:
+        # postrun ran in another context than prerun
+        _current.set(None)
+    new.end()
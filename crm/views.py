@@ -1,3 +1,210 @@
-from django.shortcuts import render
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.views.decorators.http import condition, require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, parse, validate, validate_schema
+from crm import db_router, fingerprints, health, metrics, profiling, request_timing, resolver_timing, tracing
+from crm.schema_artifacts import get_artifacts
 
-# Create your views here.
+
+def _schema_etag(request):
+    return get_artifacts().etag
+
+
+@require_GET
+@condition(etag_func=_schema_etag)
+def schema_sdl(request):
+    """SDL of the CRM schema, served from memory; honours If-None-Match."""
+    return HttpResponse(get_artifacts().sdl, content_type="text/plain; charset=utf-8")
+
+
+@require_GET
+@condition(etag_func=_schema_etag)
+def schema_introspection(request):
+    """Introspection result of the CRM schema, as a GraphQL response body."""
+    return JsonResponse({"data": get_artifacts().introspection})
+
+
+@require_GET
+def healthz(request):
+    """Liveness: the process answers requests. Never touches the database."""
+    return JsonResponse({"status": "ok"})
+
+
+@require_GET
+def readyz(request):
+    """Readiness: cached database, migration and broker checks with latencies."""
+    ready, components = health.readiness()
+    return JsonResponse(
+        {"status": "ok" if ready else "unavailable", "components": components},
+        status=200 if ready else 503,
+    )
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that records per-operation metrics and adds `extensions`
+    (time breakdown, resolver tracing) to the response.
+
+    execute_graphql_request follows graphene-django's, but keeps the request
+    (`graphql_query`, `graphql_variables`, `graphql_operation_name`), the
+    parsed `graphql_document` and `graphql_operation`, the outcome
+    (`graphql_result`, `graphql_errors`) and per-phase `graphql_timings`
+    on the HttpRequest for the instrumentation to label by.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        profiler = profiling.RequestProfiler() if profiling.profiling_requested(request) else nullcontext()
+        request.graphql_timings = {}
+        parent = tracing.parse_traceparent(request.headers.get(tracing.TRACEPARENT))
+        with tracing.span("graphql.request", parent=parent, kind="server") as root, \
+                metrics.track_graphql_request(request) as tracker:
+            request.graphql_tracker = tracker
+            with profiler:
+                response = super().dispatch(request, *args, **kwargs)
+            # GraphiQL page loads are not operations
+            tracker.skip = response.get("Content-Type", "").startswith("text/html")
+            if tracker.skip:
+                return response
+            fingerprint = fingerprints.record_request(request, tracker)
+            operation = getattr(request, "graphql_operation", None)
+            root.set_attribute("graphql.operation.name", operation.name.value if operation is not None and operation.name else None)
+            root.set_attribute("graphql.operation.type", operation.operation.value if operation is not None else None)
+            root.set_attribute("graphql.fingerprint", fingerprint)
+            root.set_attribute("http.status_code", response.status_code)
+        request_timing.log_request(request, fingerprint)
+        if isinstance(profiler, profiling.RequestProfiler):
+            response["X-GraphQL-Profile-Id"] = profiler.save(request, fingerprint, tracker)
+        return response
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        # Start the trace clock before parsing, as Apollo tracing expects
+        resolver_timing.get_trace(request)
+        request.graphql_query = query
+        request.graphql_variables = variables
+        request.graphql_operation_name = operation_name
+        result = self._execute(request, query, variables, operation_name, show_graphiql)
+        request.graphql_result = result
+        request.graphql_errors = bool(result is not None and result.errors)
+        return result
+
+    def _execute(self, request, query, variables, operation_name, show_graphiql):
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            with self.phase(request, "parse"):
+                document = parse(query)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        operation = get_operation_ast(document, operation_name)
+        request.graphql_document = document
+        request.graphql_operation = operation
+
+        if request.method.lower() == "get" and operation is not None and operation.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ["POST"], f"Can only perform a {operation.operation.value} operation from a POST request.",
+            ))
+
+        with self.phase(request, "validate"):
+            validation_errors = validate(schema, document, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        try:
+            options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation is not None
+                and operation.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with self.phase(request, "execute"), transaction.atomic():
+                    result = execute(schema, document, **options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            # Queries may be served by a replica; mutations read and write the primary
+            reads = db_router.replica_reads() if operation is not None and operation.operation == OperationType.QUERY else nullcontext()
+            with self.phase(request, "execute"), reads:
+                return execute(schema, document, **options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    @staticmethod
+    @contextmanager
+    def phase(request, name):
+        """
+        Time a phase into `request.graphql_timings[name]` and the SQL inside
+        it into `[name + "_db"]`, in a "graphql.<name>" tracing span.
+        """
+        tracker = getattr(request, "graphql_tracker", None)
+        db_before = tracker.db_seconds if tracker is not None else 0.0
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"graphql.{name}"):
+                yield
+        finally:
+            timings = request.__dict__.setdefault("graphql_timings", {})
+            timings[name] = time.perf_counter() - started
+            if tracker is not None:
+                timings[f"{name}_db"] = tracker.db_seconds - db_before
+
+    def json_encode(self, request, d, pretty=False):
+        if not isinstance(d, dict):
+            return super().json_encode(request, d, pretty)
+        with self.phase(request, "serialize"):
+            body = super().json_encode(request, d, pretty)
+        extensions = {**request_timing.extensions(request), **resolver_timing.extensions(request)}
+        if not extensions:
+            return body
+        if body.startswith("{\n"):
+            # pretty-printed (GraphiQL): re-encode, the extra cost doesn't matter here
+            return super().json_encode(request, {**d, "extensions": extensions}, pretty)
+        # Splice the extensions in rather than encoding the data twice
+        separator = "," if d else ""
+        return f'{body[:-1]}{separator}"extensions":{json.dumps(extensions, separators=(",", ":"))}}}'
+
+
+@require_GET
+def resolver_stats(request):
+    """Per-field resolver latency histograms of this process (DEBUG or staff only)."""
+    if not (settings.DEBUG or request.user.is_staff):
+        raise Http404
+    limit = int(request.GET.get("limit", 50))
+    return JsonResponse({"fields": dict(resolver_timing.stats.top(limit))})
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint; merges all worker processes in multiprocess mode."""
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)